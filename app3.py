@@ -1,117 +1,27 @@
 import streamlit as st
-from transformers import AutoTokenizer, AutoModel
-from sklearn.ensemble import RandomForestClassifier
-import torch
-import numpy as np
-import joblib
-import pandas as pd
-import re
+
+from model_registry import avvia_sorveglianza, registro_modelli
+from evidenze_pdf import estrai_evidenze, testi_evidenze
+from pipeline import valuta_claim
+from regole import CERTIFICAZIONI
+from telemetria import TELEMETRIA
 
 # === CONFIG STREAMLIT ===
 st.set_page_config(page_title="Green Claim Checker", layout="centered")
 
-# === BERT ===
+# === BERT E MODELLI PRE-ALLENATI ===
+# Caricati una sola volta per processo (alla prima sessione), non a ogni rerun.
+# Un bundle nuovo pubblicato dai training viene caricato in background e
+# sostituisce quello attivo senza riavviare l'app.
 @st.cache_resource
-def load_bert():
-    tokenizer = AutoTokenizer.from_pretrained("dbmdz/bert-base-italian-uncased")
-    model = AutoModel.from_pretrained("dbmdz/bert-base-italian-uncased")
-    return tokenizer, model
-
-tokenizer, model = load_bert()
-
-def get_embedding(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-    with torch.no_grad():
-        outputs = model(**inputs)
-    return outputs.last_hidden_state.mean(dim=1).squeeze().numpy()
-
-# === CARICA IL MODELLO DOCUMENTALE PRE-ALLENATO ===
-clf_doc = joblib.load("document_clf2.joblib")
-
-def valuta_claim_documentale(claim_input, support_input): #funzione che sfrutta ML
-    vec = np.concatenate([get_embedding(claim_input), get_embedding(support_input)])
-    print(f"Sto valutando il claim tramite il modello ML \n Claim_input:{claim_input}\n") #Stampa di debug
-    print(f"Supporto documentale: {support_input}\n Vec:{vec}")
-    pred = clf_doc.predict([vec])[0] #analisi della documentazione di supporto
-    proba = clf_doc.predict_proba([vec])[0][pred]
-    if pred == 0:
-        return ("✅ Conforme alla Direttiva UE",
-                "Claim conforme a standard noti e documentato.",
-                proba)
-    else:
-        return ("🟠 Rischio di greenwashing",
-                "Claim potenzialmente vago, non verificabile o fuorviante.",
-                proba)
-
-# === ANALISI SEMANTICA AVANZATA ===
-semantic_clf_5class = joblib.load("semantic_clf_5class2.joblib")
-reverse_map = joblib.load("label_map2.joblib")
-
-def valuta_chiarezza_avanzata(claim_text):
-    emb = get_embedding(claim_text)
-    pred = semantic_clf_5class.predict([emb])[0]
-    categoria = reverse_map[pred]
-    spiegazioni = {
-        "Valido": "✅ Claim chiaro, quantificato e verificabile.",
-        "Ambiguo": "🟡 Claim vago.",
-        "Ingannevole": "🔴 Claim fuorviante o non realistico.",
-        "Irrilevante": "⚪ Claim che non riguarda l'ambiente.",
-        "Marketing": "📢 Claim promozionale o non tecnico."
-    }
-    return categoria, spiegazioni[categoria]
-
-#-------------------------------------------------------------------------------
-
-# === FUNZIONE CHE GENERA CLAIM E DOCUMENTO DA FORM ===
-def genera_claim_e_doc(
-    affermazione, parte_prodotto, percentuale, certificazioni,
-    esistenza_report, riguarda_carbon_neutral, base_neutralita,
-    ha_piano_riduzione, verifica_indipendente, report_pubblico,
-    uso_logo_verde, logo_certificato
-):
-    # === Costruzione del testo del claim ===
-    claim_parts = []
-    # if riguarda_carbon_neutral == "Sì":
-    #     claim_parts.append(affermazione + ":"+ "Prodotto carbon neutral")
-    # else:
-    claim_parts.append(affermazione +":")
-
-    if percentuale:
-        claim_parts.append(f"({percentuale})")
-    if parte_prodotto != "Tutto il prodotto":
-        claim_parts.append(f"relativo a {parte_prodotto.lower()}")
-
-    if certificazioni:
-        claim_parts.append("certificato " + ", ".join(certificazioni))
+def riscalda_modelli():
+    avvia_sorveglianza()
+    return registro_modelli().riscalda()
 
-    claim_test = " ".join(claim_parts)
-
-    # === Costruzione della documentazione di supporto ===
-    doc_parts = []
-    if certificazioni:
-        doc_parts.append("Certificato " + ", ".join(certificazioni)+".")
-
-    if esistenza_report == "Sì":
-        doc_parts.append("È disponibile un report ufficiale.")
-    if riguarda_carbon_neutral == "Sì":
-        if base_neutralita:
-            doc_parts.append(f"Basato su {base_neutralita.lower()}.")
-        if ha_piano_riduzione == "No":
-            doc_parts.append("Nessun piano di riduzione.")
-        if verifica_indipendente == "No":
-            doc_parts.append("Nessuna verifica indipendente.")
-    if report_pubblico == "No":
-        doc_parts.append("Il report non è pubblico.")
-    if uso_logo_verde == "Sì":
-        if logo_certificato == "No":
-            doc_parts.append("Logo verde non certificato.")
-        else:
-            doc_parts.append("Logo ambientale certificato presente.")
-
-    doc_test = " ".join(doc_parts)
-    return claim_test, doc_test #La funzione ritorna il "Claim inserito","Documentazione di supporto"
+riscalda_modelli()
 
 #N.B. Il controllo semantico va fatto esclusivamente sul claim dichiarato dall'utente e non sul "Claim inserito" che è stato modificato dal programma.
+#Tutta la logica di valutazione è in pipeline.py, condivisa con batch_score.py.
 
 # === STREAMLIT UI ===
 st.title("🌿 Verifica Green Claim - Tool AI")
@@ -123,10 +33,7 @@ with st.form("claim_form"):
         "Tutto il prodotto", "Solo l'imballaggio", "Altra parte"
     ])
     percentuale = st.text_input("3. Specifica una percentuale se applicabile (es. 80%)")
-    certificazioni = st.multiselect("4. Quali certificazioni hai?", [
-        "ISO 14001", "ISO 14024", "ISO 14040", "ISO 14064", "ISO 14021",
-        "FSC", "Ecolabel", "EMAS", "PAS 2060", "EN 13432", "ASTM D6400","GHG Protocol"
-    ])
+    certificazioni = st.multiselect("4. Quali certificazioni hai?", CERTIFICAZIONI)
     esistenza_report = st.radio("5. Esiste un report a supporto?", ["Sì", "No"])
     riguarda_carbon_neutral = st.radio("6. Il claim riguarda la neutralità climatica?", ["Sì", "No"])
 
@@ -149,67 +56,52 @@ with st.form("claim_form"):
     submitted = st.form_submit_button("🔎 Analizza Claim")
 
 if submitted:
-    # 1) Genera claim_test e doc_test
-    claim_test, doc_test = genera_claim_e_doc(
-        affermazione, parte_prodotto, percentuale, certificazioni,
-        esistenza_report, riguarda_carbon_neutral, base_neutralita,
-        ha_piano_riduzione, verifica_indipendente, report_pubblico,
-        uso_logo_verde, logo_certificato
-    )
+    # 0) Legge il PDF di supporto (se c'è) e ne estrae i passaggi più vicini al claim.
+    #    Un PDF senza testo estraibile non conta come prova.
+    evidenze = None
+    if uploaded_file is not None:
+        try:
+            evidenze = estrai_evidenze(uploaded_file, affermazione)
+        except Exception as e:
+            st.warning(f"⚠️ Impossibile leggere il PDF caricato: {e}")
+
+    # 1) Genera claim_test e doc_test e valuta il claim
+    esito = valuta_claim({
+        "affermazione": affermazione,
+        "parte_prodotto": parte_prodotto,
+        "percentuale": percentuale,
+        "certificazioni": certificazioni,
+        "esistenza_report": esistenza_report,
+        "riguarda_carbon_neutral": riguarda_carbon_neutral,
+        "base_neutralita": base_neutralita,
+        "ha_piano_riduzione": ha_piano_riduzione,
+        "verifica_indipendente": verifica_indipendente,
+        "report_pubblico": report_pubblico,
+        "uso_logo_verde": uso_logo_verde,
+        "logo_certificato": logo_certificato,
+        "prove_caricate": evidenze is not None and evidenze["passaggi_totali"] > 0,
+        "evidenze": testi_evidenze(evidenze) if evidenze else [],
+    })
+    esito_doc, motivo_doc, conf_doc = esito["esito_doc"], esito["motivo_doc"], esito["conf_doc"]
 
     # 2) Mostra il claim inserito
     st.subheader("📌 Claim inserito")
     st.write(affermazione)
-    # st.write(claim_test)
+    # st.write(esito["claim_test"])
 
     # 3) Mostra la documentazione generata
     st.subheader("📄 Documentazione di supporto")
-    st.write(doc_test)
-
-    # === CONTROLLO DOCUMENTALE (PRIMO LIVELLO) ===
-
-    # 3.a) Logo sì ma non certificato → NON conforme
-    cond_logo_scelto = isinstance(uso_logo_verde, str) and uso_logo_verde.strip().lower().startswith("s")
-    cond_logo_non_cert = isinstance(logo_certificato, str) and logo_certificato.strip().lower().startswith("n")
-
-    if cond_logo_scelto and cond_logo_non_cert:
-        esito_doc = "🟠 Rischio di greenwashing"
-        motivo_doc = "🔴 Hai dichiarato di usare un logo/marchio ambientale, ma NON è certificato da un ente riconosciuto."
-        conf_doc = 1.00
-
-    else:
-        # 3.b) Controlli “riciclabile / carbon neutral / biodegradabile” senza certificazione specifica
-        claim_lower = claim_test.lower()
-        doc_lower   = doc_test.lower()
-
-        errore_cert = False
-
-        # Se il claim parla di “riciclabile” → serve ISO 14021
-        if "riciclabile" in claim_lower:
-            if not ("iso 14021" in doc_lower):
-                errore_cert = True
-                motivo_doc = "🔴 Claim ‘riciclabile’ senza certificazione ISO 14021 nel supporto."
-
-        # Se il claim parla di “carbon neutral” → serve ISO 14064 o PAS 2060
-        if not errore_cert and "carbon neutral" in claim_lower:
-            if not ("iso 14064" in doc_lower or "pas 2060" in doc_lower):
-                errore_cert = True
-                motivo_doc = "🔴 Claim ‘carbon neutral’ senza certificazione ISO 14064 o PAS 2060 nel supporto."
-
-        # Se il claim parla di “biodegradabile” → serve EN 13432
-        if not errore_cert and "biodegradabile" in claim_lower:
-            if not "en 13432" in doc_lower:
-                errore_cert = True
-                motivo_doc = "🔴 Claim ‘biodegradabile’ senza certificazione EN 13432 nel supporto."
-
-        if errore_cert:
-            esito_doc = "🟠 Rischio di greenwashing"
-            conf_doc = 1.00
-        else:
-            # 3.c) Passa al modello documentale vero e proprio (BERT+RF)
-            esito_doc, motivo_doc, conf_doc = valuta_claim_documentale(affermazione, doc_test) #ho modificato claim_test con affermazione.
-
-            
+    st.write(esito["doc_test"])
+    if evidenze is not None:
+        with st.expander(f"📎 Passaggi più rilevanti del PDF ({evidenze['passaggi_totali']} analizzati)"):
+            if evidenze["troncato"]:
+                st.caption(f"Analisi interrotta a pagina {evidenze['ultima_pagina']} per limite di tempo.")
+            for p in evidenze["passaggi"]:
+                st.markdown(f"**Pagina {p['pagina']}** (similarità {p['score']:.2f})")
+                st.write(p["testo"])
+            if evidenze["citazioni"]:
+                st.caption("Certificazioni citate nel PDF: " + ", ".join(
+                    f"{c['termine'].upper()} (pag. {c['pagina']})" for c in evidenze["citazioni"]))
 
     # 4) Visualizza il risultato del controllo documentale
     st.subheader("📊 Valutazione del rischio documentale")
@@ -220,80 +112,32 @@ if submitted:
     else:
         st.success(f"{esito_doc}\n\n📌 Motivazione: {motivo_doc}")
     st.caption(f"🔍 Confidenza documentale: {conf_doc:.2f}")
-
-    # 5) SOLO SE “Conforme” AL DOCUMENTO → PASSA ALL’ANALISI SEMANTICA
-    
-    if "Conforme" in esito_doc:
-        categoria_sem, motivazione_sem = valuta_chiarezza_avanzata(affermazione) #modificato con solo il claim scritto dall'azienda
-        print(f"claim: {affermazione} \n Analisi semantica: {categoria_sem}\n motivazione: {motivazione_sem}")
-        # === ⛔ CONTROLLO AVANZATO: Parole “nonsense” ===
-
-        parole_nonsense = [
-            "magico", "volante", "incantato", "miracolo",
-            "eco love", "super green", "mistico", "futuro perfetto"
-        ]
-        if any(term in claim_test.lower() for term in parole_nonsense):
-            categoria_sem = "Ingannevole"
-            motivazione_sem = "🔴 Claim contiene parole prive di senso ambientale ('nonsense'), classificato come ingannevole."
-            #Blocco del flusso
-            st.subheader("🔍 Analisi semantica avanzata")
-            st.info(f"**{categoria_sem}** — {motivazione_sem}")
-            st.stop()
-
-        #BLOCCO DI CONTROLLO SEMPLICE
-
-        # === 📌 CONTROLLO AVANZATO: Percentuali incoerenti ===
-        def extract_percentuali(text):
-            return [int(x) for x in re.findall(r"(\d{1,3})\s*%", text)]
-
-        percentuali_claim = extract_percentuali(claim_test)
-        try:
-            percentuale_valore = int(re.sub(r"[^\d]", "", percentuale)) if percentuale else None
-        except:
-            percentuale_valore = None
-
-        if percentuali_claim and percentuale_valore is not None:
-            for pc in percentuali_claim:
-                if abs(pc - percentuale_valore) > 5:
-                    categoria_sem = "Ingannevole"
-                    motivazione_sem = "🔴 Percentuale dichiarata nel claim incoerente con quella indicata nel form."
-
-        # === 📌 CONTROLLO: claim con “riduzione” senza riferimento comparativo ===
-        if any(kw in affermazione.lower() for kw in ["riduzione", "ridotte", "abbattimento"]):
-            if not any(term in affermazione.lower() for term in ["rispetto a", "baseline", "modello", "anno", "comparato"]):
-                categoria_sem = "Ingannevole"
-                motivazione_sem = "🔴 Claim sulla riduzione privo di riferimento comparativo, classificato come ingannevole."
-
-        # === 📄 CONTROLLO: parole “eco”, “naturale” senza prove caricate ===
-        if any(term in affermazione.lower() for term in ["eco", "ecologico", "naturale"]):
-            print(affermazione.lower())
-            if uploaded_file is None:
-                categoria_sem = "Ingannevole"
-                motivazione_sem = "🔴 Claim con riferimenti a 'ecologico' o 'naturale' privo di prove scientifiche caricate."
-
-        # === 🔄 CONTROLLO: se base_neutralita = "Riduzioni dirette" ma ha_piano_riduzione = "No" ===
-        if (riguarda_carbon_neutral == "Sì" and
-            base_neutralita == "Riduzioni dirette" and
-            ha_piano_riduzione == "No"):
-            categoria_sem = "Ambiguo"
-            motivazione_sem = "🟡 Hai dichiarato un piano di riduzioni dirette, ma non hai un piano verificato: claim ambiguo."
-
-        # === 📜 CONTROLLO: coerenza claim–certificazioni ===
-    #-----------------------------------------------------------------------------
-        # certificazioni_richieste = {
-        #     "ecologico": ["Ecolabel", "ISO 14024", "EMAS"],
-        #     "carbon": ["ISO 14064", "PAS 2060"],
-        #     "riciclabile": ["FSC", "ISO 14021"],
-        #     "biodegradabile": ["EN 13432", "ASTM D6400"]
-        # }
-        # for keyword, richieste in certificazioni_richieste.items(): 
-        #     if keyword in claim_test.lower():
-        #         if not any(richiesta.lower() in [cert.lower() for cert in certificazioni] for richiesta in richieste):
-        #             categoria_sem = "Ingannevole"
-        #             motivazione_sem = f"🔴 Claim '{keyword}' senza certificazioni coerenti: attese {', '.join(richieste)}."
-
-#-----------------------------------------------------------------------------------------
-
+    if esito["simili_doc"]:
+        with st.expander("🔎 Claim simili nel dataset documentale"):
+            for s in esito["simili_doc"]:
+                etichetta = "Conforme" if s["etichetta"] == 0 else "Rischio"
+                st.write(f"{s['testo']} → **{etichetta}** (similarità {s['score']:.2f})")
+
+    # 5) SOLO SE “Conforme” AL DOCUMENTO → ANALISI SEMANTICA
+    if esito["categoria_sem"] is not None:
         # === Output analisi semantica avanzata ===
         st.subheader("🔍 Analisi semantica del claim")
-        st.info(f"**{categoria_sem}** — {motivazione_sem}")
+        st.info(f"**{esito['categoria_sem']}** — {esito['motivazione_sem']}")
+        if esito["simili_sem"]:
+            with st.expander("🔎 Claim simili nel dataset semantico"):
+                for s in esito["simili_sem"]:
+                    st.write(f"{s['testo']} → **{s['etichetta']}** (similarità {s['score']:.2f})")
+
+registro = registro_modelli()
+st.sidebar.caption(
+    (f"Modelli: bundle v{registro.versione:04d}" if registro.versione else "Modelli: file joblib locali")
+    + f" · encoder {registro.model_id}"
+)
+
+# === PANNELLO OPZIONALE CON I TEMPI PER STADIO (in fondo: include la valutazione appena fatta) ===
+if st.sidebar.checkbox("⏱️ Mostra tempi per stadio"):
+    st.sidebar.dataframe(
+        [{"stadio": stadio, "chiamate": m["chiamate"], "media ms": round(m["media_ms"], 2), "p99 ms": m["p99_ms"]}
+         for stadio, m in TELEMETRIA.esporta_json().items()],
+        hide_index=True,
+    )
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+from itertools import islice
+
+import pandas as pd
+
+from evidenze_pdf import estrai_evidenze, testi_evidenze
+from pipeline import FormNonValido, form_da_record, valuta_batch
+from telemetria import TELEMETRIA
+
+# === SCORING IN BATCH DA RIGA DI COMANDO ===
+# Legge i campi del form da CSV/JSONL a blocchi, li passa alla pipeline di
+# app3.py e scrive i risultati in modo incrementale (JSONL o Parquet).
+# Dopo ogni blocco salva un checkpoint: rilanciando lo stesso comando
+# l'elaborazione riprende dall'ultima riga completata.
+#
+#   python batch_score.py catalogo.csv -o risultati.jsonl
+#   python batch_score.py catalogo.jsonl -o risultati_parquet --formato parquet
+
+def _leggi_blocchi(path, chunk_size, salta):
+    # Generatore di liste di dict (un dict per riga), saltando le prime `salta` righe
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            righe = (json.loads(line) for line in f if line.strip())
+            righe = islice(righe, salta, None)
+            while True:
+                blocco = list(islice(righe, chunk_size))
+                if not blocco:
+                    return
+                yield blocco
+    else:
+        # Le righe già elaborate sono lette e scartate a blocchi: skiprows con
+        # un range diventerebbe un set di indici grande quanto il checkpoint
+        reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+        for df in reader:
+            if salta >= len(df):
+                salta -= len(df)
+                continue
+            if salta:
+                df, salta = df.iloc[salta:], 0
+            yield df.to_dict(orient="records")
+
+
+# === CHECKPOINT ===
+def _path_checkpoint(output):
+    return output.rstrip("/\\") + ".checkpoint.json"
+
+
+def leggi_checkpoint(output):
+    path = _path_checkpoint(output)
+    if not os.path.exists(path):
+        return {"righe": 0, "offset": 0, "parti": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def scrivi_checkpoint(output, stato):
+    # Scrittura atomica: un'interruzione non lascia mai un checkpoint a metà
+    path = _path_checkpoint(output)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(stato, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# === SCRITTURA RISULTATI ===
+def _form_con_evidenze(riga):
+    # Colonna opzionale "pdf": path del PDF di supporto, letto come in app3.py.
+    # Ritorna (form, errore_form, errore_pdf). Nessuna riga interrompe il run:
+    # - campi del tipo sbagliato → form None, la riga non viene valutata;
+    # - PDF mancante, cifrato o corrotto → valutata come senza prove caricate.
+    try:
+        form = form_da_record(riga)
+    except FormNonValido as e:
+        return None, str(e), None
+    if not riga.get("pdf"):
+        return form, None, None
+    try:
+        evidenze = estrai_evidenze(riga["pdf"], form["affermazione"])
+    except Exception as e:
+        form["prove_caricate"] = False
+        return form, None, f"{type(e).__name__}: {e}"
+    form["prove_caricate"] = evidenze["passaggi_totali"] > 0
+    form["evidenze"] = testi_evidenze(evidenze)
+    return form, None, None
+
+
+def _scrivi_jsonl(output, record, stato):
+    with open(output, "a+b") as f:
+        # Scarta eventuali righe scritte dopo l'ultimo checkpoint
+        f.truncate(stato["offset"])
+        f.seek(stato["offset"])
+        for r in record:
+            f.write((json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+        stato["offset"] = f.tell()
+
+
+def _scrivi_parquet(output, record, stato):
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, f"part-{stato['parti']:05d}.parquet")
+    pd.DataFrame.from_records(record).to_parquet(path, index=False)
+    stato["parti"] += 1
+
+
+def scora_file(input_path, output, formato="jsonl", chunk_size=256, ricomincia=False):
+    if ricomincia and os.path.exists(_path_checkpoint(output)):
+        os.remove(_path_checkpoint(output))
+    stato = leggi_checkpoint(output)
+    scrivi = _scrivi_parquet if formato == "parquet" else _scrivi_jsonl
+
+    for blocco in _leggi_blocchi(input_path, chunk_size, stato["righe"]):
+        preparati = [_form_con_evidenze(r) for r in blocco]
+        validi = [form for form, _, _ in preparati if form is not None]
+        risultati = iter(valuta_batch(validi) if validi else [])
+        record = []
+        for n, (riga, (form, errore_form, errore_pdf)) in enumerate(zip(blocco, preparati)):
+            risultato = next(risultati) if form is not None else {}
+            record.append({"riga": stato["righe"] + n, "id": riga.get("id"), **risultato,
+                           "errore_form": errore_form, "errore_pdf": errore_pdf})
+        scrivi(output, record, stato)
+        stato["righe"] += len(blocco)
+        scrivi_checkpoint(output, stato)
+        print(f"Righe elaborate: {stato['righe']}", flush=True)
+    return stato["righe"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valutazione in batch di green claim da CSV/JSONL")
+    parser.add_argument("input", help="file .csv o .jsonl con i campi del form")
+    parser.add_argument("-o", "--output", required=True, help="file .jsonl o cartella Parquet")
+    parser.add_argument("--formato", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--chunk-size", type=int, default=256, help="righe valutate per blocco")
+    parser.add_argument("--ricomincia", action="store_true", help="ignora il checkpoint esistente")
+    parser.add_argument("--metriche", help="salva i tempi per stadio in questo file JSON")
+    args = parser.parse_args()
+
+    totale = scora_file(args.input, args.output, args.formato, args.chunk_size, args.ricomincia)
+    print(f"✅ Completato: {totale} righe valutate, risultati in '{args.output}'")
+    if args.metriche:
+        with open(args.metriche, "w", encoding="utf-8") as f:
+            json.dump(TELEMETRIA.esporta_json(), f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmark_workloads import SCALE, genera_form, genera_testi
+
+# === BENCHMARK DELLA PIPELINE ===
+# Misura ogni stadio della pipeline su workload sintetici e scrive i risultati
+# in un JSON con formato stabile (SCHEMA), confrontabile tra commit:
+#
+#   python benchmark.py esegui --scala 1k -o bench_base.json
+#   python benchmark.py esegui --scala 10k --stadi regole end_to_end_batch -o bench_nuovo.json
+#   python benchmark.py confronta bench_base.json bench_nuovo.json --soglia 0.10
+#
+# Per ogni stadio: numero di elementi, throughput (elementi/s), latenza p50/p99
+# per chiamata (una chiamata = un elemento negli stadi "singolo", un blocco di
+# --blocco elementi negli stadi "batch"), picco di RSS durante lo stadio e
+# crescita rispetto all'RSS di inizio stadio (per il training: picco del
+# processo figlio). L'RSS è campionato con psutil se installato, altrimenti da
+# /proc (solo Linux); dove non si può misurare resta null.
+
+SCHEMA = 1
+DIR_PROGETTO = os.path.dirname(os.path.abspath(__file__))
+
+
+def _rss_mb(pid=None):
+    # RSS attuale (non il picco) del processo indicato; None se non misurabile
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            pagine = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pagine * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class _PiccoRss:
+    # Campiona l'RSS in un thread per tutta la durata dello stadio.
+    # ru_maxrss non basta: è il massimo dall'avvio del processo (e per i figli
+    # il massimo tra tutti i figli), quindi ogni stadio erediterebbe i picchi
+    # di quelli precedenti.
+    def __init__(self, intervallo=0.005):
+        self.intervallo = intervallo
+        self.pid = None
+        self.base = _rss_mb()
+        self.picco = self.base
+        self._fine = threading.Event()
+        self._thread = threading.Thread(target=self._ciclo, daemon=True)
+
+    def segui(self, pid):
+        # Da qui in poi si misura il processo figlio (stadi di training)
+        self.pid, self.base, self.picco = pid, 0.0, None
+
+    def _campiona(self):
+        rss = _rss_mb(self.pid)
+        if rss is not None:
+            self.picco = rss if self.picco is None else max(self.picco, rss)
+
+    def _ciclo(self):
+        while not self._fine.wait(self.intervallo):
+            self._campiona()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *errore):
+        if self.pid is None:
+            self._campiona()
+        self._fine.set()
+        self._thread.join()
+
+
+def _statistiche(latenze, n_elementi, rss):
+    latenze = np.asarray(latenze)
+    totale = float(latenze.sum())
+    misurato = rss.picco is not None and rss.base is not None
+    return {
+        "n": n_elementi,
+        "secondi": totale,
+        "throughput": n_elementi / totale if totale else None,
+        "p50_ms": float(np.percentile(latenze, 50) * 1000),
+        "p99_ms": float(np.percentile(latenze, 99) * 1000),
+        "peak_rss_mb": rss.picco if misurato else None,
+        "delta_rss_mb": rss.picco - rss.base if misurato else None,
+    }
+
+
+def _misura(chiamate):
+    # chiamate: iterabile di funzioni senza argomenti; ritorna le latenze in secondi
+    latenze = []
+    for chiamata in chiamate:
+        inizio = time.perf_counter()
+        chiamata()
+        latenze.append(time.perf_counter() - inizio)
+    return latenze
+
+
+def _blocchi(elementi, dimensione):
+    return [elementi[i:i + dimensione] for i in range(0, len(elementi), dimensione)]
+
+
+# === STADI ===
+def stadio_embedding_singolo(ctx):
+    from embedding import embed_batch
+    testi = ctx["testi"][:ctx["max_singoli"]]
+    return _misura(lambda t=t: embed_batch([t], use_cache=False) for t in testi), len(testi)
+
+
+def stadio_embedding_batch(ctx):
+    from embedding import embed_batch
+    blocchi = _blocchi(ctx["testi"], ctx["blocco"])
+    return _misura(lambda b=b: embed_batch(b, use_cache=False) for b in blocchi), len(ctx["testi"])
+
+
+def stadio_genera_claim_e_doc(ctx):
+    from pipeline import genera_claim_e_doc, normalizza_form
+    forms = [normalizza_form(f) for f in ctx["forms"]]
+    campi = ["affermazione", "parte_prodotto", "percentuale", "certificazioni",
+             "esistenza_report", "riguarda_carbon_neutral", "base_neutralita",
+             "ha_piano_riduzione", "verifica_indipendente", "report_pubblico",
+             "uso_logo_verde", "logo_certificato"]
+    return _misura(lambda f=f: genera_claim_e_doc(*(f[c] for c in campi)) for f in forms), len(forms)
+
+
+def stadio_regole(ctx):
+    from pipeline import genera_claim_e_doc, normalizza_form
+    from rule_engine import MOTORE
+    records = []
+    for form in ctx["forms"]:
+        form = normalizza_form(form)
+        claim_test, doc_test = genera_claim_e_doc(
+            form["affermazione"], form["parte_prodotto"], form["percentuale"], form["certificazioni"],
+            form["esistenza_report"], form["riguarda_carbon_neutral"], form["base_neutralita"],
+            form["ha_piano_riduzione"], form["verifica_indipendente"], form["report_pubblico"],
+            form["uso_logo_verde"], form["logo_certificato"])
+        records.append({**form, "claim_test": claim_test, "doc_test": doc_test})
+    blocchi = _blocchi(records, ctx["blocco"])
+    return _misura(lambda b=b: MOTORE.valuta(b) for b in blocchi), len(records)
+
+
+def _stadio_classificatore(ctx, nome, dim, singolo):
+    from model_registry import registro_modelli
+    registro = registro_modelli()
+    clf = registro.get(nome)
+    rng = np.random.default_rng(ctx["seed"])
+    n = ctx["max_singoli"] if singolo else ctx["n"]
+    dimensione = 1 if singolo else ctx["blocco"]
+    # Vettori generati (e proiettati, se il modello usa una proiezione) fuori dalla misura
+    blocchi = [rng.normal(0, 0.3, (min(dimensione, n - i), dim)).astype(np.float32)
+               for i in range(0, n, dimensione)]
+    proiezione = "proiezione_doc" if nome == "clf_doc" else "proiezione_sem"
+    if registro.ha(proiezione):
+        blocchi = [registro.get(proiezione).trasforma(X) for X in blocchi]
+    return _misura(lambda X=X: clf.predict_proba(X) for X in blocchi), n
+
+
+def stadio_clf_doc_singolo(ctx):
+    return _stadio_classificatore(ctx, "clf_doc", 1536, singolo=True)
+
+
+def stadio_clf_doc_batch(ctx):
+    return _stadio_classificatore(ctx, "clf_doc", 1536, singolo=False)
+
+
+def stadio_semantic_clf_singolo(ctx):
+    return _stadio_classificatore(ctx, "semantic_clf", 768, singolo=True)
+
+
+def stadio_semantic_clf_batch(ctx):
+    return _stadio_classificatore(ctx, "semantic_clf", 768, singolo=False)
+
+
+def stadio_end_to_end_singolo(ctx):
+    from pipeline import valuta_claim
+    forms = ctx["forms"][:ctx["max_singoli"]]
+    return _misura(lambda f=f: valuta_claim(f) for f in forms), len(forms)
+
+
+def stadio_end_to_end_batch(ctx):
+    from pipeline import valuta_batch
+    blocchi = _blocchi(ctx["forms"], ctx["blocco"])
+    return _misura(lambda b=b: valuta_batch(b) for b in blocchi), len(ctx["forms"])
+
+
+def _stadio_training(ctx, script, csv):
+    # Lo script gira in una cartella temporanea con una copia dei CSV: i modelli
+    # del progetto non vengono sovrascritti e cache/feature store partono vuoti
+    with tempfile.TemporaryDirectory() as tmp:
+        for nome in csv:
+            shutil.copy(os.path.join(DIR_PROGETTO, nome), tmp)
+        env = {**os.environ, "GREEN_CLAIMS_EMBED_CACHE": "", "GREEN_CLAIMS_FEATURE_DIR": os.path.join(tmp, "feature_store")}
+        inizio = time.perf_counter()
+        processo = subprocess.Popen([sys.executable, os.path.join(DIR_PROGETTO, script)], cwd=tmp, env=env,
+                                    stdout=subprocess.DEVNULL)
+        ctx["rss"].segui(processo.pid)
+        if processo.wait():
+            raise subprocess.CalledProcessError(processo.returncode, processo.args)
+        latenze = [time.perf_counter() - inizio]
+    return latenze, 1
+
+
+def stadio_train_doc(ctx):
+    return _stadio_training(ctx, "train_doc_model2.py", ["green_claims_training_dataset_doc2.csv"])
+
+
+def stadio_train_semantico(ctx):
+    return _stadio_training(ctx, "train_semantic_model2.py", ["green_claims_semantic_dataset_extended.csv"])
+
+
+STADI = {
+    "embedding_singolo": stadio_embedding_singolo,
+    "embedding_batch": stadio_embedding_batch,
+    "genera_claim_e_doc": stadio_genera_claim_e_doc,
+    "regole": stadio_regole,
+    "clf_doc_singolo": stadio_clf_doc_singolo,
+    "clf_doc_batch": stadio_clf_doc_batch,
+    "semantic_clf_singolo": stadio_semantic_clf_singolo,
+    "semantic_clf_batch": stadio_semantic_clf_batch,
+    "end_to_end_singolo": stadio_end_to_end_singolo,
+    "end_to_end_batch": stadio_end_to_end_batch,
+    "train_doc": stadio_train_doc,
+    "train_semantico": stadio_train_semantico,
+}
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIR_PROGETTO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def esegui(stadi, scala, blocco, max_singoli, seed):
+    n = SCALE[scala]
+    ctx = {
+        "n": n,
+        "blocco": blocco,
+        "max_singoli": min(max_singoli, n),
+        "seed": seed,
+        "testi": genera_testi(n, seed),
+        "forms": list(genera_form(n, seed)),
+    }
+    risultati = {
+        "schema": SCHEMA,
+        "commit": _commit(),
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "piattaforma": platform.platform(),
+        "scala": scala,
+        "blocco": blocco,
+        "seed": seed,
+        "stadi": {},
+    }
+    for nome in stadi:
+        print(f"▶ {nome}...", flush=True)
+        with _PiccoRss() as rss:
+            ctx["rss"] = rss
+            latenze, n_elementi = STADI[nome](ctx)
+        risultati["stadi"][nome] = _statistiche(latenze, n_elementi, rss)
+    return risultati
+
+
+def stampa(risultati):
+    print(f"\nCommit {risultati['commit']} · scala {risultati['scala']} · blocco {risultati['blocco']}")
+    print(f"{'stadio':<24}{'n':>8}{'elem/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'RSS MB':>9}{'Δ MB':>8}")
+    for nome, s in risultati["stadi"].items():
+        rss = f"{s['peak_rss_mb']:.0f}" if s["peak_rss_mb"] is not None else "-"
+        delta = f"{s['delta_rss_mb']:+.0f}" if s.get("delta_rss_mb") is not None else "-"
+        thr = f"{s['throughput']:.1f}" if s["throughput"] is not None else "-"
+        print(f"{nome:<24}{s['n']:>8}{thr:>12}{s['p50_ms']:>10.2f}{s['p99_ms']:>10.2f}{rss:>9}{delta:>8}")
+
+
+def confronta(base, nuovo, soglia):
+    # Regressione: throughput più basso o p99 più alto oltre la soglia relativa
+    regressioni = []
+    print(f"{'stadio':<24}{'elem/s':>22}{'p99 ms':>22}")
+    for nome, s_nuovo in nuovo["stadi"].items():
+        s_base = base["stadi"].get(nome)
+        if s_base is None:
+            continue
+        # Throughput None (tempo totale nullo): il confronto si fa solo sul p99
+        thr_base, thr_nuovo = s_base["throughput"], s_nuovo["throughput"]
+        d_thr = thr_nuovo / thr_base - 1 if thr_base and thr_nuovo is not None else None
+        d_p99 = s_nuovo["p99_ms"] / s_base["p99_ms"] - 1 if s_base["p99_ms"] else 0.0
+        segno = "❌" if (d_thr is not None and d_thr < -soglia) or d_p99 > soglia else "  "
+        if segno == "❌":
+            regressioni.append(nome)
+        thr = f"{thr_nuovo:12.1f}" if thr_nuovo is not None else f"{'-':>12}"
+        d_thr = f"{d_thr:+6.1%}" if d_thr is not None else f"{'-':>6}"
+        print(f"{segno}{nome:<22}{thr} ({d_thr}){s_nuovo['p99_ms']:>12.2f} ({d_p99:+6.1%})")
+    return regressioni
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark degli stadi della pipeline dei green claim")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_esegui = sub.add_parser("esegui", help="esegue i benchmark")
+    p_esegui.add_argument("--stadi", nargs="+", choices=list(STADI), default=list(STADI))
+    p_esegui.add_argument("--scala", choices=list(SCALE), default="1k")
+    p_esegui.add_argument("--blocco", type=int, default=256, help="elementi per chiamata negli stadi batch")
+    p_esegui.add_argument("--max-singoli", type=int, default=200, help="elementi misurati negli stadi 'singolo'")
+    p_esegui.add_argument("--seed", type=int, default=42)
+    p_esegui.add_argument("-o", "--output", help="file JSON dei risultati")
+
+    p_confronta = sub.add_parser("confronta", help="confronta due file di risultati")
+    p_confronta.add_argument("base")
+    p_confronta.add_argument("nuovo")
+    p_confronta.add_argument("--soglia", type=float, default=0.10, help="variazione relativa tollerata")
+    args = parser.parse_args()
+
+    if args.comando == "confronta":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.nuovo, encoding="utf-8") as f:
+            nuovo = json.load(f)
+        regressioni = confronta(base, nuovo, args.soglia)
+        if regressioni:
+            print(f"\n❌ Regressioni: {', '.join(regressioni)}")
+            raise SystemExit(1)
+        print("\n✅ Nessuna regressione oltre la soglia")
+        return
+
+    # Cache degli embedding solo in memoria: i risultati non dipendono da
+    # cosa c'è nella cache su disco della macchina
+    os.environ.setdefault("GREEN_CLAIMS_EMBED_CACHE", "")
+    risultati = esegui(args.stadi, args.scala, args.blocco, args.max_singoli, args.seed)
+    stampa(risultati)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(risultati, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
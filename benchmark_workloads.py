@@ -0,0 +1,70 @@
+import random
+from itertools import cycle, islice
+
+import pandas as pd
+
+from regole import CERTIFICAZIONI
+
+# === WORKLOAD SINTETICI PER I BENCHMARK ===
+# Form e testi di claim generati da template (come in estendi_dataset.py),
+# più i testi reali dei CSV del progetto. Con lo stesso seed i workload sono
+# identici tra un commit e l'altro, quindi i risultati sono confrontabili.
+
+SCALE = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+AFFERMAZIONI = [
+    "Packaging {p}% riciclabile",
+    "Prodotto carbon neutral",
+    "Imballaggio biodegradabile",
+    "Riduce le emissioni di CO₂ del {p}% rispetto al modello precedente",
+    "Riduce le emissioni di CO₂ del {p}%",
+    "Packaging con {p}% plastica riciclata",
+    "Prodotto ecologico e naturale",
+    "Bottiglia in plastica {p}% riciclata certificata",
+    "Packaging compostabile",
+    "Prodotto 100% sostenibile",
+    "Prodotto super green e magico",
+    "Emissioni ridotte del {p}% rispetto all'anno 2020",
+]
+PARTI = ["Tutto il prodotto", "Solo l'imballaggio", "Altra parte"]
+SI_NO = ["Sì", "No"]
+
+
+def genera_form(n, seed=42):
+    # Generatore di n form con la stessa struttura di quelli di app3.py
+    rng = random.Random(seed)
+    for _ in range(n):
+        p = rng.randrange(5, 100, 5)
+        carbon = rng.choice(SI_NO)
+        logo = rng.choice(SI_NO)
+        yield {
+            "affermazione": rng.choice(AFFERMAZIONI).format(p=p),
+            "parte_prodotto": rng.choice(PARTI),
+            "percentuale": f"{p}%" if rng.random() < 0.5 else "",
+            "certificazioni": rng.sample(CERTIFICAZIONI, rng.randint(0, 3)),
+            "esistenza_report": rng.choice(SI_NO),
+            "riguarda_carbon_neutral": carbon,
+            "base_neutralita": rng.choice(["Riduzioni dirette", "Compensazioni", "Entrambi"]) if carbon == "Sì" else None,
+            "ha_piano_riduzione": rng.choice(SI_NO) if carbon == "Sì" else None,
+            "verifica_indipendente": rng.choice(SI_NO),
+            "report_pubblico": rng.choice(SI_NO),
+            "uso_logo_verde": logo,
+            "logo_certificato": rng.choice(SI_NO) if logo == "Sì" else None,
+            "prove_caricate": rng.random() < 0.5,
+        }
+
+
+def testi_dataset():
+    # Testi reali dei CSV: claim semantici, claim e support documentali
+    df_doc = pd.read_csv("green_claims_training_dataset_doc2.csv")
+    df_sem = pd.read_csv("green_claims_semantic_dataset_extended.csv", encoding="ISO-8859-1")
+    return df_sem["claim"].tolist() + df_doc["Claim"].tolist() + df_doc["Support"].tolist()
+
+
+def genera_testi(n, seed=42):
+    # n testi: prima quelli dei CSV (ripetuti se serve), poi varianti da template
+    reali = testi_dataset()
+    n_reali = min(n // 2, len(reali) * 4)
+    testi = list(islice(cycle(reali), n_reali))
+    testi += [form["affermazione"] for form in genera_form(n - n_reali, seed)]
+    return testi
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+from embedding import BACKEND, MODEL_ID, impronta_modello
+
+# === BUNDLE VERSIONATI DEI MODELLI ===
+# I training script pubblicano i modelli in una cartella versionata
+# (bundles/v0001, bundles/v0002, ...) con un manifest.json che lega insieme
+# encoder, pooling, dimensione delle feature, label map e checksum di ogni file.
+# bundles/CORRENTE contiene la versione attiva: viene cambiata solo dopo che il
+# bundle nuovo è stato scritto per intero, quindi chi legge vede sempre un
+# bundle completo. Il registro dei modelli (model_registry.py) carica il bundle
+# attivo e passa al nuovo senza riavvii.
+#
+# I due training script sono indipendenti: ognuno crea una versione nuova
+# partendo dall'ultima e sostituendo solo i propri artefatti. Un lock file in
+# bundles/ serializza le pubblicazioni, così due training lanciati insieme non
+# scelgono lo stesso numero di versione né partono da una base vecchia.
+
+BUNDLE_DIR = os.environ.get("GREEN_CLAIMS_BUNDLE_DIR", "bundles")
+FORMATO = 1
+POOLING = "mean"  # embedding.py: media sui token non di padding
+OBBLIGATORI = ("clf_doc", "semantic_clf", "label_map")
+# Oltre questa attesa un lock rimasto da un training interrotto viene rimosso
+ATTESA_LOCK_S = float(os.environ.get("GREEN_CLAIMS_BUNDLE_LOCK_S", "600"))
+
+
+class BundleNonValido(ValueError):
+    pass
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for blocco in iter(lambda: f.read(1 << 20), b""):
+            h.update(blocco)
+    return h.hexdigest()
+
+
+def _file_artefatto(cartella, relativo):
+    # Un artefatto è un file (joblib) o una cartella (indici kNN)
+    path = os.path.join(cartella, relativo)
+    if os.path.isdir(path):
+        return sorted(
+            os.path.relpath(os.path.join(radice, nome), cartella).replace(os.sep, "/")
+            for radice, _, nomi in os.walk(path) for nome in nomi
+        )
+    return [relativo]
+
+
+def _versioni(base=BUNDLE_DIR):
+    if not os.path.isdir(base):
+        return []
+    return sorted(int(nome[1:]) for nome in os.listdir(base) if nome.startswith("v") and nome[1:].isdigit())
+
+
+def _cartella_versione(versione, base=BUNDLE_DIR):
+    return os.path.join(base, f"v{versione:04d}")
+
+
+def versione_corrente(base=BUNDLE_DIR):
+    path = os.path.join(base, "CORRENTE")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return int(f.read().strip())
+
+
+def leggi_manifest(cartella):
+    with open(os.path.join(cartella, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def valida_bundle(cartella, verifica_checksum=True):
+    # Ritorna il manifest se il bundle è completo e integro, altrimenti BundleNonValido
+    try:
+        manifest = leggi_manifest(cartella)
+    except (OSError, json.JSONDecodeError) as e:
+        raise BundleNonValido(f"{cartella}: manifest illeggibile ({e})") from e
+    if manifest.get("formato") != FORMATO:
+        raise BundleNonValido(f"{cartella}: formato {manifest.get('formato')!r} non supportato")
+    if manifest["encoder"].get("pooling") != POOLING:
+        raise BundleNonValido(f"{cartella}: pooling {manifest['encoder'].get('pooling')!r} diverso da {POOLING!r}")
+    mancanti = [nome for nome in OBBLIGATORI if nome not in manifest["artefatti"]]
+    if mancanti:
+        raise BundleNonValido(f"{cartella}: artefatti mancanti {mancanti}")
+    for relativo, atteso in manifest["checksum"].items():
+        path = os.path.join(cartella, relativo)
+        if not os.path.exists(path):
+            raise BundleNonValido(f"{cartella}: file mancante {relativo}")
+        if verifica_checksum and _sha256(path) != atteso:
+            raise BundleNonValido(f"{cartella}: checksum diverso per {relativo}")
+    return manifest
+
+
+def carica_bundle(versione=None, base=BUNDLE_DIR):
+    # (cartella, manifest) del bundle indicato o di quello attivo; None se non ce ne sono
+    if versione is None:
+        versione = versione_corrente(base)
+        if versione is None:
+            return None
+    cartella = _cartella_versione(versione, base)
+    return cartella, valida_bundle(cartella)
+
+
+def _scrivi_atomico(path, testo):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(testo)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _lock_pubblicazione(base, attesa_max=ATTESA_LOCK_S):
+    # Lock file creato in modo esclusivo (funziona anche su Windows)
+    path = os.path.join(base, ".lock")
+    avvisato = False
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            pass
+        try:
+            eta = time.time() - os.path.getmtime(path)
+        except OSError:
+            continue  # rilasciato nel frattempo
+        if eta > attesa_max:
+            print(f"⚠️ Lock '{path}' vecchio di {eta:.0f}s (training interrotto?): rimosso")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        if not avvisato:
+            print(f"⏳ Un'altra pubblicazione è in corso, attendo il lock '{path}'")
+            avvisato = True
+        time.sleep(0.5)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+    finally:
+        os.close(fd)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def pubblica_bundle(artefatti, label_map=None, feature=None, dim_encoder=None,
+                    model_id=MODEL_ID, backend=BACKEND, base=BUNDLE_DIR):
+    # artefatti: {nome: path di file o cartella} prodotti da questo training;
+    #            None rimuove l'artefatto dal bundle (es. proiezione non più usata)
+    # feature:   {nome_classificatore: numero di feature in ingresso}
+    os.makedirs(base, exist_ok=True)
+    # Scelta della versione, copia e attivazione sotto lo stesso lock
+    with _lock_pubblicazione(base):
+        return _pubblica(artefatti, label_map, feature, dim_encoder, model_id, backend, base)
+
+
+def impronta_encoder(manifest):
+    # I manifest scritti prima dell'impronta hanno solo il model_id
+    return manifest["encoder"].get("impronta") or manifest["encoder"]["model_id"]
+
+
+def _pubblica(artefatti, label_map, feature, dim_encoder, model_id, backend, base):
+    versioni = _versioni(base)
+    precedente, manifest = None, None
+    # Model id più impronta dei pesi: un encoder locale riallenato nella stessa
+    # cartella (es. encoder_distillato) conta come un encoder diverso
+    impronta = impronta_modello(model_id)
+    if versioni:
+        precedente = _cartella_versione(versioni[-1], base)
+        manifest = leggi_manifest(precedente)
+        if impronta_encoder(manifest) != impronta:
+            # Gli artefatti allenati con un altro encoder non sono riusabili
+            print(f"⚠️ Encoder cambiato ({impronta_encoder(manifest)} → {impronta}): "
+                  "il bundle riparte senza gli artefatti precedenti")
+            precedente, manifest = None, None
+    if manifest is None:
+        manifest = {"artefatti": {}, "feature": {}, "label_map": None, "encoder": {}}
+
+    versione = (versioni[-1] if versioni else 0) + 1
+    cartella = _cartella_versione(versione, base)
+    tmp = os.path.join(base, f".tmp-v{versione:04d}-{os.getpid()}")
+    os.makedirs(tmp)
+    try:
+        _scrivi_versione(tmp, artefatti, manifest, precedente, versione, label_map, feature,
+                         dim_encoder, model_id, backend)
+        os.replace(tmp, cartella)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    # Si attiva solo un bundle completo (al primo giro serve l'altro training)
+    try:
+        valida_bundle(cartella)
+    except BundleNonValido as e:
+        print(f"⚠️ Bundle v{versione:04d} salvato ma non attivato: {e}")
+        return cartella
+    _scrivi_atomico(os.path.join(base, "CORRENTE"), str(versione))
+    print(f"✅ Bundle v{versione:04d} pubblicato e attivato in '{cartella}'")
+    return cartella
+
+
+def _scrivi_versione(tmp, artefatti, manifest, precedente, versione, label_map, feature,
+                     dim_encoder, model_id, backend):
+    # Copia gli artefatti (nuovi + ereditati dalla versione precedente) e scrive il manifest
+    percorsi = {}
+    for nome, relativo in manifest["artefatti"].items():
+        if nome not in artefatti:
+            percorsi[nome] = os.path.join(precedente, relativo)
+    percorsi.update({nome: path for nome, path in artefatti.items() if path is not None})
+
+    nuovi_artefatti = {}
+    for nome, sorgente in sorted(percorsi.items()):
+        relativo = nome + (".joblib" if os.path.isfile(sorgente) else "")
+        if os.path.isdir(sorgente):
+            shutil.copytree(sorgente, os.path.join(tmp, relativo))
+        else:
+            shutil.copy2(sorgente, os.path.join(tmp, relativo))
+        nuovi_artefatti[nome] = relativo
+
+    nuovo = {
+        "formato": FORMATO,
+        "versione": versione,
+        "creato_il": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "encoder": {
+            "model_id": model_id,
+            "impronta": impronta_modello(model_id),
+            "backend_training": backend,
+            "pooling": POOLING,
+            "dim": dim_encoder or manifest["encoder"].get("dim"),
+        },
+        "feature": {
+            nome: dim for nome, dim in {**manifest["feature"], **(feature or {})}.items()
+            if nome in nuovi_artefatti
+        },
+        "label_map": {str(k): v for k, v in label_map.items()} if label_map is not None else manifest["label_map"],
+        "artefatti": nuovi_artefatti,
+        "checksum": {
+            relativo: _sha256(os.path.join(tmp, relativo))
+            for nome in nuovi_artefatti for relativo in _file_artefatto(tmp, nuovi_artefatti[nome])
+        },
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(nuovo, f, ensure_ascii=False, indent=2)
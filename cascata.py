@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+from sklearn.pipeline import make_pipeline
+
+# === CASCATA: PRIMO STADIO ECONOMICO PRIMA DI BERT ===
+# Un modello lineare su TF-IDF di n-grammi di caratteri, allenato dai training
+# script sugli stessi CSV, risponde da solo quando è abbastanza sicuro; solo
+# i casi incerti passano a BERT + RandomForest.
+# La soglia di confidenza è calibrata su predizioni out-of-fold: è la più
+# bassa per cui le risposte date dal primo stadio hanno almeno l'accuratezza
+# obiettivo (GREEN_CLAIMS_CASCATA_ACCURATEZZA, default 0.98). Se non ce n'è
+# una affidabile il primo stadio non risponde mai.
+#
+# GREEN_CLAIMS_CASCATA=0 disattiva la cascata all'inferenza.
+#
+#   python cascata.py confronta --json cascata.json
+
+ATTIVA = os.environ.get("GREEN_CLAIMS_CASCATA", "1") != "0"
+ACCURATEZZA = float(os.environ.get("GREEN_CLAIMS_CASCATA_ACCURATEZZA", "0.98"))
+MIN_RIGHE_CALIBRAZIONE = 20  # con meno risposte out-of-fold la soglia non è affidabile
+
+PATH_DOC = "cascata_doc.joblib"
+PATH_SEM = "cascata_sem.joblib"
+
+
+def testo_documentale(claim, supporto):
+    # Claim e supporto in un solo testo, come coppia per il modello documentale
+    return f"{claim} | {supporto}"
+
+
+def _nuovo_modello():
+    return make_pipeline(
+        TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 5), sublinear_tf=True, lowercase=True),
+        LogisticRegression(max_iter=2000, C=10.0),
+    )
+
+
+def calibra_soglia(conf, corretti, accuratezza=ACCURATEZZA):
+    # Soglia più bassa tale che le righe con confidenza >= soglia abbiano
+    # accuratezza >= obiettivo; inf se nessuna soglia la garantisce
+    ordine = np.argsort(-conf, kind="stable")
+    conf, corretti = conf[ordine], corretti[ordine]
+    accuratezza_cumulata = np.cumsum(corretti) / np.arange(1, len(corretti) + 1)
+    validi = np.flatnonzero(accuratezza_cumulata >= accuratezza)
+    validi = validi[validi + 1 >= MIN_RIGHE_CALIBRAZIONE]
+    if not len(validi):
+        return float("inf")
+    k = validi[-1]
+    # A parità di confidenza rispondono tutte o nessuna: si resta sopra il
+    # primo valore escluso
+    if k + 1 < len(conf) and conf[k + 1] == conf[k]:
+        return float(np.nextafter(conf[k], np.inf))
+    return float(conf[k])
+
+
+class ModelloRapido:
+    def __init__(self, modello, soglia, meta=None):
+        self.modello = modello
+        self.soglia = soglia
+        self.meta = meta or {}
+        self.classes_ = modello.classes_
+
+    @classmethod
+    def allena(cls, testi, etichette, accuratezza=ACCURATEZZA, seed=42):
+        testi, etichette = list(testi), np.asarray(etichette)
+        n_fold = min(5, int(np.unique(etichette, return_counts=True)[1].min()))
+        if n_fold >= 2:
+            proba = cross_val_predict(_nuovo_modello(), testi, etichette, method="predict_proba",
+                                      cv=StratifiedKFold(n_fold, shuffle=True, random_state=seed))
+            classi = np.unique(etichette)
+            conf = proba.max(axis=1)
+            corretti = classi[proba.argmax(axis=1)] == etichette
+            soglia = calibra_soglia(conf, corretti, accuratezza)
+        else:
+            conf, corretti, soglia = np.zeros(0), np.zeros(0, dtype=bool), float("inf")
+        sopra = conf >= soglia
+        meta = {
+            "righe": len(testi),
+            "accuratezza_obiettivo": accuratezza,
+            "soglia": soglia,
+            # Stime out-of-fold di quante richieste il primo stadio chiude da solo
+            "copertura": float(sopra.mean()) if len(sopra) else 0.0,
+            "accuratezza_risposte": float(corretti[sopra].mean()) if sopra.any() else None,
+        }
+        return cls(_nuovo_modello().fit(testi, etichette), soglia, meta)
+
+    def decidi(self, testi):
+        # (classi, confidenze, sicuri): `sicuri` indica le righe a cui il primo stadio risponde
+        proba = self.modello.predict_proba(list(testi))
+        idx = proba.argmax(axis=1)
+        conf = proba[np.arange(len(idx)), idx]
+        return self.classes_[idx], conf, conf >= self.soglia
+
+
+def stampa_allenamento(nome, rapido):
+    m = rapido.meta
+    if m["soglia"] == float("inf"):
+        print(f"⚠️ Cascata {nome}: nessuna soglia affidabile, tutte le richieste passeranno a BERT")
+        return
+    print(f"✅ Cascata {nome}: soglia {m['soglia']:.3f}, risponde da sola al {m['copertura']:.0%} "
+          f"(accuratezza out-of-fold {m['accuratezza_risposte']:.1%}), il {1 - m['copertura']:.0%} passa a BERT")
+
+
+# === CONFRONTO CON IL PERCORSO COMPLETO ===
+def _confronta_stadio(rapido, testi, pred_completo, secondi_completo):
+    inizio = time.perf_counter()
+    classi, _, sicuri = rapido.decidi(testi)
+    secondi_rapido = time.perf_counter() - inizio
+    accordo_risposte = (classi[sicuri] == pred_completo[sicuri]).mean() if sicuri.any() else None
+    n = len(testi)
+    return {
+        "righe": n,
+        "passano_a_bert": float(1 - sicuri.mean()),
+        "accordo_risposte": float(accordo_risposte) if accordo_risposte is not None else None,
+        # Cascata completa: risposte del primo stadio + percorso completo per le altre
+        "accordo_totale": float(np.where(sicuri, classi == pred_completo, True).mean()),
+        "ms_per_claim_rapido": secondi_rapido / n * 1000,
+        "ms_per_claim_completo": secondi_completo / n * 1000,
+        "ms_per_claim_cascata": (secondi_rapido + secondi_completo * (1 - sicuri.mean())) / n * 1000,
+    }
+
+
+def confronta():
+    # Percorso completo (BERT + foreste del registro) contro la cascata sui testi dei CSV.
+    # Sono gli stessi testi del training: per una stima su dati nuovi vale la
+    # copertura out-of-fold stampata dai training script.
+    from embedding import embed_batch
+    from model_registry import registro_modelli
+
+    registro = registro_modelli()
+    df_doc = pd.read_csv("green_claims_training_dataset_doc2.csv")
+    df_sem = pd.read_csv("green_claims_semantic_dataset_extended.csv", encoding="ISO-8859-1")
+    claims, support, sem = df_doc["Claim"].tolist(), df_doc["Support"].tolist(), df_sem["claim"].tolist()
+    report = {}
+
+    inizio = time.perf_counter()
+    emb = embed_batch(claims + support, model_id=registro.model_id, use_cache=False)
+    X = np.hstack([emb[:len(claims)], emb[len(claims):]])
+    if registro.ha("proiezione_doc"):
+        X = registro.get("proiezione_doc").trasforma(X)
+    pred = registro.get("clf_doc").predict(X)
+    secondi = time.perf_counter() - inizio
+    if registro.ha("cascata_doc"):
+        report["documentale"] = _confronta_stadio(
+            registro.get("cascata_doc"), [testo_documentale(c, s) for c, s in zip(claims, support)], pred, secondi)
+
+    inizio = time.perf_counter()
+    X = embed_batch(sem, model_id=registro.model_id, use_cache=False)
+    if registro.ha("proiezione_sem"):
+        X = registro.get("proiezione_sem").trasforma(X)
+    pred = registro.get("semantic_clf").predict(X)
+    secondi = time.perf_counter() - inizio
+    if registro.ha("cascata_sem"):
+        report["semantico"] = _confronta_stadio(registro.get("cascata_sem"), sem, pred, secondi)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cascata TF-IDF → BERT: quante richieste passano a BERT e accordo con il percorso completo")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_confronta = sub.add_parser("confronta", help="confronta la cascata con il percorso completo sui CSV del progetto")
+    p_confronta.add_argument("--json", help="salva il report anche in questo file JSON")
+    args = parser.parse_args()
+
+    report = confronta()
+    if not report:
+        print("❌ Nessun modello della cascata: esegui prima i training script")
+        raise SystemExit(1)
+    for nome, r in report.items():
+        accordo = f"{r['accordo_risposte']:.1%}" if r["accordo_risposte"] is not None else "—"
+        print(f"{nome}: {r['passano_a_bert']:.0%} passa a BERT, accordo sulle risposte del primo stadio {accordo}, "
+              f"accordo totale {r['accordo_totale']:.1%}")
+        print(f"  ms per claim: primo stadio {r['ms_per_claim_rapido']:.3f}, completo {r['ms_per_claim_completo']:.2f}, "
+              f"cascata {r['ms_per_claim_cascata']:.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
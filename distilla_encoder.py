@@ -0,0 +1,219 @@
+import argparse
+import copy
+import json
+import os
+import random
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import torch
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import cross_val_predict
+from transformers import AutoModel, AutoTokenizer
+
+from benchmark_workloads import genera_form
+from embedding import embed_batch, load_encoder
+from parita_backend import _con_proiezione, _coseno, carica_testi
+from proiezione import PATH_DOC, PATH_SEM
+
+# === ENCODER DISTILLATO ===
+# Lo studente è un BERT con pochi layer (default 4) che impara a riprodurre
+# l'embedding mean-pooled del teacher (dbmdz/bert-base-italian-uncased) sui
+# testi del progetto: claim e support dei CSV più i claim/documenti generati
+# dalla pipeline su form sintetici. Embedding e layer di partenza sono copiati
+# dal teacher (layer equispaziati), poi si minimizza MSE + (1 - coseno).
+#
+# Lo studente è salvato come un normale modello transformers, quindi si usa
+# come encoder ovunque con GREEN_CLAIMS_ENCODER=encoder_distillato (app3.py,
+# training script, batch, servizio). I modelli vanno riallenati con lo studente.
+#
+#   python distilla_encoder.py allena --layer 4 --epoche 3
+#   python distilla_encoder.py confronta --json distillazione.json
+
+TEACHER = "dbmdz/bert-base-italian-uncased"
+CARTELLA_STUDENTE = "encoder_distillato"
+
+
+def testi_distillazione(n_sintetici=5000, seed=42):
+    # Testi reali dei CSV + claim/documento che la pipeline genera dai form
+    from pipeline import genera_claim_e_doc
+    claims, support, sem = carica_testi()
+    testi = claims + support + sem
+    for form in genera_form(n_sintetici, seed):
+        claim_test, doc_test = genera_claim_e_doc(
+            form["affermazione"], form["parte_prodotto"], form["percentuale"], form["certificazioni"],
+            form["esistenza_report"], form["riguarda_carbon_neutral"], form["base_neutralita"],
+            form["ha_piano_riduzione"], form["verifica_indipendente"], form["report_pubblico"],
+            form["uso_logo_verde"], form["logo_certificato"])
+        testi += [form["affermazione"], claim_test, doc_test]
+    return list(dict.fromkeys(testi))
+
+
+def crea_studente(teacher, n_layer):
+    # Stessa architettura del teacher con n_layer layer, inizializzati dai
+    # layer del teacher presi a intervalli regolari (il primo e l'ultimo inclusi)
+    config = copy.deepcopy(teacher.config)
+    n_teacher = config.num_hidden_layers
+    config.num_hidden_layers = n_layer
+    studente = AutoModel.from_config(config)
+    scelti = [int(i) for i in np.linspace(0, n_teacher - 1, n_layer).round()]
+    pesi = {}
+    for nome, valore in teacher.state_dict().items():
+        if nome.startswith("encoder.layer."):
+            indice = int(nome.split(".")[2])
+            if indice not in scelti:
+                continue
+            nome = nome.replace(f"encoder.layer.{indice}.", f"encoder.layer.{scelti.index(indice)}.", 1)
+        pesi[nome] = valore
+    studente.load_state_dict(pesi)
+    return studente, scelti
+
+
+def _mean_pooling(hidden, mask):
+    # Come embedding._encode_batch: media solo sui token reali
+    mask = mask.unsqueeze(-1).to(hidden.dtype)
+    return (hidden * mask).sum(dim=1) / mask.sum(dim=1)
+
+
+def allena(teacher_id=TEACHER, n_layer=4, epoche=3, batch_size=32, lr=5e-5, n_sintetici=5000,
+           uscita=CARTELLA_STUDENTE, seed=42):
+    torch.manual_seed(seed)
+    testi = testi_distillazione(n_sintetici, seed)
+    # Target del teacher dalla cache degli embedding: rieseguire la distillazione costa solo lo studente
+    inizio = time.perf_counter()
+    target = embed_batch(testi, model_id=teacher_id, backend="pytorch")
+    print(f"Target del teacher: {len(testi)} testi in {time.perf_counter() - inizio:.1f}s")
+
+    tokenizer = AutoTokenizer.from_pretrained(teacher_id)
+    teacher = AutoModel.from_pretrained(teacher_id)
+    studente, scelti = crea_studente(teacher, n_layer)
+    del teacher
+    print(f"Studente: {n_layer} layer (dai layer {scelti} del teacher)")
+
+    ottimizzatore = torch.optim.AdamW(studente.parameters(), lr=lr)
+    rng = random.Random(seed)
+    indici = list(range(len(testi)))
+    studente.train()
+    for epoca in range(1, epoche + 1):
+        rng.shuffle(indici)
+        perdite = []
+        for start in range(0, len(indici), batch_size):
+            idx = indici[start:start + batch_size]
+            inputs = tokenizer([testi[i] for i in idx], padding=True, truncation=True, return_tensors="pt")
+            emb = _mean_pooling(studente(**inputs).last_hidden_state, inputs["attention_mask"])
+            atteso = torch.from_numpy(target[idx])
+            perdita = torch.nn.functional.mse_loss(emb, atteso) + \
+                (1 - torch.nn.functional.cosine_similarity(emb, atteso)).mean()
+            ottimizzatore.zero_grad()
+            perdita.backward()
+            ottimizzatore.step()
+            perdite.append(perdita.item())
+        print(f"Epoca {epoca}/{epoche}: perdita media {np.mean(perdite):.4f}")
+
+    studente.eval()
+    studente.save_pretrained(uscita)
+    tokenizer.save_pretrained(uscita)
+    with open(os.path.join(uscita, "distillazione.json"), "w", encoding="utf-8") as f:
+        json.dump({"teacher": teacher_id, "layer": n_layer, "layer_teacher": scelti, "epoche": epoche,
+                   "testi": len(testi), "lr": lr, "seed": seed}, f, ensure_ascii=False, indent=2)
+    print(f"✅ Encoder distillato salvato in '{uscita}' (GREEN_CLAIMS_ENCODER={uscita})")
+
+
+# === CONFRONTO STUDENTE / TEACHER ===
+def _misura(testi, model_id):
+    # Embedding senza cache (si misura l'encoder vero), secondi e MB dei pesi
+    inizio = time.perf_counter()
+    emb = embed_batch(testi, model_id=model_id, backend="pytorch", use_cache=False)
+    secondi = time.perf_counter() - inizio
+    _, encoder = load_encoder(model_id, "pytorch")
+    mb = sum(p.numel() * p.element_size() for p in encoder.model.parameters()) / (1024 * 1024)
+    return emb, secondi, mb
+
+
+def _accordo(pred_a, pred_b):
+    return float((np.asarray(pred_a) == np.asarray(pred_b)).mean())
+
+
+def confronta(studente=CARTELLA_STUDENTE, teacher_id=TEACHER):
+    claims, support, sem = carica_testi()
+    testi = claims + support + sem
+    n = len(claims)
+    emb_t, sec_t, mb_t = _misura(testi, teacher_id)
+    emb_s, sec_s, mb_s = _misura(testi, studente)
+
+    X_doc_t, X_doc_s = np.hstack([emb_t[:n], emb_t[n:2 * n]]), np.hstack([emb_s[:n], emb_s[n:2 * n]])
+    X_sem_t, X_sem_s = emb_t[2 * n:], emb_s[2 * n:]
+    y_doc = pd.read_csv("green_claims_training_dataset_doc2.csv")["Label"].values
+    label_map = {"Valido": 0, "Ambiguo": 1, "Ingannevole": 2, "Irrilevante": 3, "Marketing": 4}
+    y_sem = pd.read_csv("green_claims_semantic_dataset_extended.csv", encoding="ISO-8859-1")["categoria"].map(label_map).values
+
+    # 1) modelli attuali (allenati sul teacher) usati così come sono sullo studente
+    clf_doc = _con_proiezione(joblib.load("document_clf2.joblib"), PATH_DOC)
+    clf_sem = _con_proiezione(joblib.load("semantic_clf_5class2.joblib"), PATH_SEM)
+    # 2) foreste riallenate sullo studente (come dopo un training con GREEN_CLAIMS_ENCODER=studente),
+    #    predizioni out-of-fold confrontate con quelle del teacher
+    def oof(X, y):
+        return cross_val_predict(RandomForestClassifier(n_estimators=100, random_state=42), X, y, cv=5)
+
+    return {
+        "teacher": {"model_id": teacher_id, "secondi": sec_t, "mb_pesi": mb_t},
+        "studente": {"model_id": studente, "secondi": sec_s, "mb_pesi": mb_s},
+        "speedup": sec_t / sec_s if sec_s else None,
+        "coseno_medio": float(_coseno(emb_t, emb_s).mean()),
+        "coseno_p1": float(np.percentile(_coseno(emb_t, emb_s), 1)),
+        "accordo_modelli_attuali": {
+            "documentale": _accordo(clf_doc.predict(X_doc_t), clf_doc.predict(X_doc_s)),
+            "semantico": _accordo(clf_sem.predict(X_sem_t), clf_sem.predict(X_sem_s)),
+        },
+        "accordo_riallenati": {
+            "documentale": _accordo(oof(X_doc_t, y_doc), oof(X_doc_s, y_doc)),
+            "semantico": _accordo(oof(X_sem_t, y_sem), oof(X_sem_s, y_sem)),
+        },
+        "testi": len(testi),
+    }
+
+
+def stampa_report(report):
+    t, s = report["teacher"], report["studente"]
+    print(f"Teacher  {t['model_id']}: {t['secondi']:.2f}s, {t['mb_pesi']:.0f} MB di pesi")
+    print(f"Studente {s['model_id']}: {s['secondi']:.2f}s, {s['mb_pesi']:.0f} MB di pesi")
+    print(f"Speedup: {report['speedup']:.1f}x su {report['testi']} testi")
+    print(f"Coseno con il teacher: medio {report['coseno_medio']:.4f}, 1° percentile {report['coseno_p1']:.4f}")
+    for nome, chiave in (("Modelli attuali", "accordo_modelli_attuali"), ("Modelli riallenati", "accordo_riallenati")):
+        accordo = report[chiave]
+        print(f"{nome}: accordo documentale {accordo['documentale']:.1%}, semantico {accordo['semantico']:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distillazione di un encoder BERT piccolo per i green claim")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_allena = sub.add_parser("allena", help="allena lo studente sugli embedding del teacher")
+    p_allena.add_argument("--teacher", default=TEACHER)
+    p_allena.add_argument("--layer", type=int, default=4)
+    p_allena.add_argument("--epoche", type=int, default=3)
+    p_allena.add_argument("--batch-size", type=int, default=32)
+    p_allena.add_argument("--lr", type=float, default=5e-5)
+    p_allena.add_argument("--sintetici", type=int, default=5000, help="form sintetici da cui generare testi")
+    p_allena.add_argument("-o", "--output", default=CARTELLA_STUDENTE)
+
+    p_confronta = sub.add_parser("confronta", help="latenza, memoria e accordo dei classificatori rispetto al teacher")
+    p_confronta.add_argument("--studente", default=CARTELLA_STUDENTE)
+    p_confronta.add_argument("--teacher", default=TEACHER)
+    p_confronta.add_argument("--json", help="salva il report anche in questo file JSON")
+    args = parser.parse_args()
+
+    if args.comando == "allena":
+        allena(args.teacher, args.layer, args.epoche, args.batch_size, args.lr, args.sintetici, args.output)
+        return
+    report = confronta(args.studente, args.teacher)
+    stampa_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import hashlib
+import os
+from functools import lru_cache
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+
+from embedding_cache import chiave_embedding, get_cache
+from telemetria import span
+
+# === CONFIG ENCODER ===
+# Encoder, backend e dimensione dei batch sono configurabili da variabile
+# d'ambiente, così app e script di training usano sempre lo stesso modello.
+MODEL_ID = os.environ.get("GREEN_CLAIMS_ENCODER", "dbmdz/bert-base-italian-uncased")
+BATCH_SIZE = int(os.environ.get("GREEN_CLAIMS_BATCH_SIZE", "32"))
+
+# Backend disponibili:
+#   "pytorch" → modello fp32 eager (default, quello usato finora)
+#   "int8"    → quantizzazione dinamica int8 dei layer Linear di PyTorch
+#   "onnx"    → export ONNX dei pesi in cache locale, eseguito con ONNX Runtime
+BACKENDS = ("pytorch", "int8", "onnx")
+BACKEND = os.environ.get("GREEN_CLAIMS_BACKEND", "pytorch")
+ONNX_DIR = os.environ.get("GREEN_CLAIMS_ONNX_DIR", "onnx")
+
+
+class _EncoderTorch:
+    def __init__(self, model):
+        self.model = model
+        self.hidden_size = model.config.hidden_size
+
+    def __call__(self, bucket):
+        with torch.inference_mode():
+            inputs = {k: torch.from_numpy(v) for k, v in bucket.items()}
+            return self.model(**inputs).last_hidden_state.numpy()
+
+
+class _EncoderOnnx:
+    def __init__(self, session, hidden_size):
+        self.session = session
+        self.hidden_size = hidden_size
+        self._input_names = [i.name for i in session.get_inputs()]
+
+    def __call__(self, bucket):
+        feed = {name: bucket[name] for name in self._input_names}
+        return self.session.run(["last_hidden_state"], feed)[0]
+
+
+# Impronta dei pesi degli encoder in cartelle locali: {cartella: (stato dei file, impronta)}
+_impronte = {}
+
+
+def impronta_modello(model_id):
+    # Per un encoder salvato in una cartella locale (es. encoder_distillato)
+    # il path non basta: riallenandolo cambiano i pesi ma non il nome. Si usa
+    # il path più un hash di config.json e dei file dei pesi, ricalcolato
+    # solo se cambiano data o dimensione dei file. Gli id dell'hub restano come sono.
+    if not os.path.isdir(model_id):
+        return model_id
+    file = sorted(
+        os.path.join(model_id, nome) for nome in os.listdir(model_id)
+        if nome == "config.json" or nome.endswith((".safetensors", ".bin"))
+    )
+    stato = tuple((path, os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in file)
+    salvata = _impronte.get(model_id)
+    if salvata is None or salvata[0] != stato:
+        h = hashlib.sha256()
+        for path in file:
+            h.update(os.path.basename(path).encode("utf-8"))
+            with open(path, "rb") as f:
+                for blocco in iter(lambda: f.read(1 << 20), b""):
+                    h.update(blocco)
+        salvata = _impronte[model_id] = (stato, f"{model_id}#{h.hexdigest()[:16]}")
+    return salvata[1]
+
+
+def _path_onnx(model_id):
+    return os.path.join(ONNX_DIR, impronta_modello(model_id).replace("/", "__").replace("\\", "__"), "model.onnx")
+
+
+def esporta_onnx(model_id=MODEL_ID):
+    # Export (una tantum) dei pesi in cache locale verso ONNX, con assi
+    # dinamici su batch e lunghezza della sequenza
+    path = _path_onnx(model_id)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModel.from_pretrained(model_id)
+    model.eval()
+    esempio = tokenizer(["esempio di claim", "packaging riciclabile al 100%"], padding=True, return_tensors="pt")
+    nomi = list(esempio.keys())
+    assi = {nome: {0: "batch", 1: "seq"} for nome in nomi}
+    assi["last_hidden_state"] = {0: "batch", 1: "seq"}
+    tmp = path + ".tmp"
+    # no_grad e non inference_mode: l'export traccia il grafo e non accetta
+    # i tensori di inferenza
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (dict(esempio),), tmp,
+            input_names=nomi, output_names=["last_hidden_state"],
+            dynamic_axes=assi, opset_version=14,
+        )
+    os.replace(tmp, path)
+    return path
+
+
+def load_encoder(model_id=MODEL_ID, backend=BACKEND):
+    # Un solo tokenizer/encoder per processo e per (model_id, backend, pesi)
+    return _carica_encoder(model_id, backend, impronta_modello(model_id))
+
+
+@lru_cache(maxsize=None)
+def _carica_encoder(model_id, backend, impronta):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend encoder sconosciuto: {backend!r} (disponibili: {', '.join(BACKENDS)})")
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+
+    if backend == "onnx":
+        import onnxruntime as ort
+        from transformers import AutoConfig
+        session = ort.InferenceSession(esporta_onnx(model_id), providers=["CPUExecutionProvider"])
+        return tokenizer, _EncoderOnnx(session, AutoConfig.from_pretrained(model_id).hidden_size)
+
+    model = AutoModel.from_pretrained(model_id)
+    model.eval()
+    if backend == "int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return tokenizer, _EncoderTorch(model)
+
+
+def _id_cache(model_id, backend):
+    # Backend diversi danno embedding (leggermente) diversi: chiavi di cache separate.
+    # Per gli encoder locali l'impronta dei pesi invalida la cache a ogni riallenamento.
+    id_modello = impronta_modello(model_id)
+    return id_modello if backend == "pytorch" else f"{id_modello}@{backend}"
+
+
+def _encode_batch(texts, batch_size, model_id, backend) -> np.ndarray:
+    # Embedding (mean pooling) di una lista di testi.
+    # I testi vengono ordinati per numero di token e raggruppati in bucket di
+    # `batch_size`: ogni bucket è paddato solo fino al suo testo più lungo.
+    # Il risultato mantiene l'ordine originale degli input.
+    tokenizer, encoder = load_encoder(model_id, backend)
+    if not texts:
+        return np.zeros((0, encoder.hidden_size), dtype=np.float32)
+
+    with span("tokenizzazione", elementi=len(texts)):
+        encoded = tokenizer(texts, truncation=True)
+    ordine = sorted(range(len(texts)), key=lambda i: len(encoded["input_ids"][i]))
+
+    out = np.empty((len(texts), encoder.hidden_size), dtype=np.float32)
+    for start in range(0, len(ordine), batch_size):
+        idx = ordine[start:start + batch_size]
+        bucket = tokenizer.pad(
+            {k: [v[i] for i in idx] for k, v in encoded.items()},
+            return_tensors="np",
+        )
+        bucket = {k: np.asarray(v, dtype=np.int64) for k, v in bucket.items()}
+        with span("encoder_forward", elementi=len(idx)):
+            hidden = encoder(bucket)
+        # Media solo sui token reali: il padding non deve spostare l'embedding
+        mask = bucket["attention_mask"][:, :, None].astype(hidden.dtype)
+        out[idx] = (hidden * mask).sum(axis=1) / mask.sum(axis=1)
+    return out
+
+
+def embed_batch(texts, batch_size=BATCH_SIZE, model_id=MODEL_ID, backend=BACKEND, use_cache=True) -> np.ndarray:
+    # Come _encode_batch, ma passando dalla cache: solo i testi mai visti
+    # (deduplicati) arrivano al modello.
+    texts = list(texts)
+    if not texts or not use_cache:
+        return _encode_batch(texts, batch_size, model_id, backend)
+
+    cache = get_cache()
+    id_cache = _id_cache(model_id, backend)
+    with span("cache_embedding", elementi=len(texts)):
+        keys = [chiave_embedding(id_cache, t) for t in texts]
+        trovati = cache.get_many(dict.fromkeys(keys))
+
+    da_calcolare = {}
+    for key, text in zip(keys, texts):
+        if key not in trovati and key not in da_calcolare:
+            da_calcolare[key] = text
+    if da_calcolare:
+        nuovi = _encode_batch(list(da_calcolare.values()), batch_size, model_id, backend)
+        items = list(zip(da_calcolare.keys(), nuovi))
+        cache.put_many(items)
+        trovati.update(items)
+
+    return np.vstack([trovati[key] for key in keys])
+
+
+def get_embedding(text, model_id=MODEL_ID, backend=BACKEND) -> np.ndarray:
+    # Compatibilità con i chiamanti a testo singolo
+    return embed_batch([text], model_id=model_id, backend=backend)[0]
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# === CACHE DEGLI EMBEDDING ===
+# Due livelli: LRU in memoria (per processo) e SQLite su disco (condiviso tra
+# app e script di training). La chiave è l'hash di model_id + testo normalizzato.
+CACHE_PATH = os.environ.get("GREEN_CLAIMS_EMBED_CACHE", "embedding_cache.sqlite")
+LRU_SIZE = int(os.environ.get("GREEN_CLAIMS_EMBED_LRU", "10000"))
+
+_SQLITE_MAX_PARAMS = 500
+
+
+def normalizza_testo(text):
+    # Il modello è uncased: maiuscole e spazi multipli non cambiano l'embedding
+    text = unicodedata.normalize("NFC", str(text))
+    return " ".join(text.split()).lower()
+
+
+def chiave_embedding(model_id, text):
+    h = hashlib.sha256()
+    h.update(model_id.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(normalizza_testo(text).encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=CACHE_PATH, lru_size=LRU_SIZE):
+        self.path = path
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    def _lru_put(self, key, vec):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys):
+        # Ritorna {key: vettore} per le sole chiavi presenti in cache
+        trovati = {}
+        with self._lock:
+            mancanti = []
+            for key in keys:
+                vec = self._lru.get(key)
+                if vec is not None:
+                    self._lru.move_to_end(key)
+                    trovati[key] = vec
+                    self.hits_memoria += 1
+                else:
+                    mancanti.append(key)
+
+            if self._conn is not None and mancanti:
+                for start in range(0, len(mancanti), _SQLITE_MAX_PARAMS):
+                    chunk = mancanti[start:start + _SQLITE_MAX_PARAMS]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vec = np.frombuffer(blob, dtype=np.float32)
+                        trovati[key] = vec
+                        self._lru_put(key, vec)
+                        self.hits_disco += 1
+
+            self.misses += len(mancanti) - sum(1 for k in mancanti if k in trovati)
+        return trovati
+
+    def put_many(self, items):
+        # items: lista di (key, vettore float32)
+        with self._lock:
+            for key, vec in items:
+                self._lru_put(key, np.asarray(vec, dtype=np.float32))
+            if self._conn is not None and items:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)",
+                    [(key, np.asarray(vec, dtype=np.float32).tobytes()) for key, vec in items],
+                )
+                self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            richieste = self.hits_memoria + self.hits_disco + self.misses
+            return {
+                "hits_memoria": self.hits_memoria,
+                "hits_disco": self.hits_disco,
+                "misses": self.misses,
+                "hit_rate": (self.hits_memoria + self.hits_disco) / richieste if richieste else 0.0,
+                "voci_memoria": len(self._lru),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    # Cache condivisa di processo, creata al primo uso
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
@@ -0,0 +1,140 @@
+import os
+import re
+import time
+
+import numpy as np
+from pypdf import PdfReader
+
+from embedding import embed_batch
+from model_registry import registro_modelli
+from regole import REGOLE
+from telemetria import span
+
+# === EVIDENZE DA PDF ===
+# Il PDF caricato a supporto del claim viene letto pagina per pagina, diviso
+# in passaggi (finestre di parole con sovrapposizione) e ogni blocco di
+# passaggi viene confrontato con il claim tramite gli embedding BERT.
+# In memoria restano solo il blocco corrente e i top-k passaggi migliori,
+# quindi anche un report LCA di centinaia di pagine ha memoria limitata.
+# Se il tempo a disposizione finisce, l'elaborazione si ferma e il risultato
+# è marcato come troncato.
+# Oltre ai top-k, ogni passaggio letto viene cercato (regex) per i termini che
+# le regole documentali richiedono nel campo "evidenze" (es. "iso 14021"): il
+# primo passaggio che cita ciascun termine resta tra le evidenze, così una
+# certificazione conta anche se la pagina che la cita non è tra le più simili.
+
+PAROLE_PER_PASSAGGIO = 120
+SOVRAPPOSIZIONE = 30
+PASSAGGI_PER_BLOCCO = 32
+BUDGET_SECONDI = float(os.environ.get("GREEN_CLAIMS_PDF_BUDGET_S", "20"))
+
+
+def _campi_richiesti(regola):
+    richiesto = regola.get("campo_richiesto", regola["campo"])
+    return [richiesto] if isinstance(richiesto, str) else richiesto
+
+
+TERMINI_EVIDENZE = sorted({
+    termine.lower()
+    for regola in REGOLE if regola.get("attiva", True) and "evidenze" in _campi_richiesti(regola)
+    for termine in regola.get("richiede", [])
+}, key=len, reverse=True)
+_REGEX_TERMINI = re.compile("|".join(re.escape(t) for t in TERMINI_EVIDENZE)) if TERMINI_EVIDENZE else None
+
+
+def _passaggi_pagina(testo, parole_per_passaggio=PAROLE_PER_PASSAGGIO, sovrapposizione=SOVRAPPOSIZIONE):
+    parole = testo.split()
+    passo = parole_per_passaggio - sovrapposizione
+    for inizio in range(0, max(len(parole) - sovrapposizione, 1), passo):
+        passaggio = " ".join(parole[inizio:inizio + parole_per_passaggio])
+        if passaggio:
+            yield passaggio
+
+
+def passaggi_pdf(file, scadenza=None):
+    # Generatore di (numero_pagina, passaggio); si ferma alla scadenza
+    # (time.monotonic()) se indicata. `file` è un path o un file-like.
+    reader = PdfReader(file)
+    for numero, pagina in enumerate(reader.pages, start=1):
+        if scadenza is not None and time.monotonic() > scadenza:
+            return
+        with span("pdf_estrazione_pagina"):
+            testo = pagina.extract_text() or ""
+        for passaggio in _passaggi_pagina(testo):
+            yield numero, passaggio
+
+
+def _normalizza(X):
+    norme = np.linalg.norm(X, axis=-1, keepdims=True)
+    norme[norme == 0] = 1.0
+    return X / norme
+
+
+def testi_evidenze(evidenze):
+    # Testi da passare alla pipeline nel campo "evidenze": i top-k più i
+    # passaggi che citano i termini cercati dalle regole
+    testi = [p["testo"] for p in evidenze["passaggi"]] + [c["testo"] for c in evidenze["citazioni"]]
+    return list(dict.fromkeys(testi))
+
+
+def estrai_evidenze(file, claim, k=3, budget_secondi=BUDGET_SECONDI):
+    # Ritorna i k passaggi del PDF più simili al claim (similarità coseno) e,
+    # per ogni termine di TERMINI_EVIDENZE, il primo passaggio che lo cita
+    inizio = time.monotonic()
+    scadenza = inizio + budget_secondi
+    # Stesso encoder del bundle attivo: nessun secondo BERT solo per il PDF
+    model_id = registro_modelli().model_id
+    query = _normalizza(embed_batch([claim], model_id=model_id)[0])
+    citazioni = {}  # termine → (pagina, testo)
+
+    migliori_score = np.empty(0, dtype=np.float32)
+    migliori = []  # (pagina, testo) allineati a migliori_score
+    n_passaggi = 0
+    ultima_pagina = 0
+    troncato = False
+
+    def elabora(blocco):
+        nonlocal migliori_score, migliori
+        with span("pdf_embedding_passaggi", elementi=len(blocco)):
+            emb = embed_batch([testo for _, testo in blocco], model_id=model_id, use_cache=False)
+        score = _normalizza(emb) @ query
+        # Top-k su (migliori finora + blocco corrente)
+        tutti_score = np.concatenate([migliori_score, score])
+        tutti = migliori + blocco
+        top = np.argsort(-tutti_score, kind="stable")[:k]
+        migliori_score = tutti_score[top]
+        migliori = [tutti[i] for i in top]
+
+    blocco = []
+    for pagina, passaggio in passaggi_pdf(file, scadenza):
+        ultima_pagina = pagina
+        blocco.append((pagina, passaggio))
+        n_passaggi += 1
+        if _REGEX_TERMINI is not None:
+            for termine in set(_REGEX_TERMINI.findall(passaggio.lower())):
+                citazioni.setdefault(termine, (pagina, passaggio))
+        if len(blocco) == PASSAGGI_PER_BLOCCO:
+            elabora(blocco)
+            blocco = []
+            if time.monotonic() > scadenza:
+                troncato = True
+                break
+    if blocco:
+        elabora(blocco)
+    if not troncato and time.monotonic() > scadenza:
+        troncato = True
+
+    return {
+        "passaggi": [
+            {"pagina": pagina, "testo": testo, "score": float(s)}
+            for (pagina, testo), s in zip(migliori, migliori_score)
+        ],
+        "citazioni": [
+            {"termine": termine, "pagina": pagina, "testo": testo}
+            for termine, (pagina, testo) in sorted(citazioni.items(), key=lambda c: c[1][0])
+        ],
+        "passaggi_totali": n_passaggi,
+        "ultima_pagina": ultima_pagina,
+        "troncato": troncato,
+        "secondi": time.monotonic() - inizio,
+    }
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from embedding import BACKEND, MODEL_ID, impronta_modello
+
+# === FEATURE STORE INCREMENTALE PER IL TRAINING ===
+# Per ogni dataset ed encoder tiene su disco la matrice delle feature
+# (features.npy, letta come memmap) e un manifest con l'hash di ogni riga.
+# A ogni training vengono calcolati gli embedding solo delle righe nuove o
+# modificate; le altre sono copiate dalla matrice precedente.
+
+FEATURE_DIR = os.environ.get("GREEN_CLAIMS_FEATURE_DIR", "feature_store")
+# float32 = stessi valori che la pipeline passa alle foreste all'inferenza.
+# float16 dimezza disco e memoria, ma le foreste vengono allenate su embedding
+# arrotondati mentre all'inferenza ricevono float32 (senza proiezione nessuno
+# arrotonda dall'altra parte): le soglie cambiano e con loro l'accuratezza.
+FEATURE_DTYPE = os.environ.get("GREEN_CLAIMS_FEATURE_DTYPE", "float32")
+_BLOCCO_COPIA = 8192
+
+
+def hash_riga(campi):
+    h = hashlib.sha256()
+    for campo in campi:
+        h.update(str(campo).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def _cartella(nome_dataset, model_id, backend):
+    # Con un encoder locale (es. encoder_distillato) la cartella cambia a ogni riallenamento dei pesi
+    encoder = f"{impronta_modello(model_id)}@{backend}".replace("/", "__").replace("\\", "__")
+    return os.path.join(FEATURE_DIR, f"{nome_dataset}__{encoder}")
+
+
+def _scrivi_json_atomico(path, dati):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dati, f)
+    os.replace(tmp, path)
+
+
+def carica_feature(nome_dataset, model_id=MODEL_ID, backend=BACKEND):
+    # Matrice già calcolata da un training precedente (memmap in sola lettura)
+    path_feature = os.path.join(_cartella(nome_dataset, model_id, backend), "features.npy")
+    if not os.path.exists(path_feature):
+        raise FileNotFoundError(f"Feature '{nome_dataset}' non trovate in {path_feature}: esegui prima il training")
+    return np.load(path_feature, mmap_mode="r")
+
+
+def aggiorna_feature(nome_dataset, righe, calcola_embedding, model_id=MODEL_ID, backend=BACKEND, dtype=FEATURE_DTYPE):
+    # righe: lista di tuple di testi (una per riga del dataset)
+    # calcola_embedding: funzione lista di righe → matrice (n_righe, dim)
+    # Ritorna la matrice delle feature come memmap in sola lettura.
+    cartella = _cartella(nome_dataset, model_id, backend)
+    path_feature = os.path.join(cartella, "features.npy")
+    path_manifest = os.path.join(cartella, "manifest.json")
+    os.makedirs(cartella, exist_ok=True)
+
+    hashes = [hash_riga(r) for r in righe]
+
+    vecchio, vecchi_hash = None, []
+    if os.path.exists(path_manifest) and os.path.exists(path_feature):
+        with open(path_manifest, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("dtype") == dtype:
+            vecchio = np.load(path_feature, mmap_mode="r")
+            vecchi_hash = manifest["righe"]
+            if vecchi_hash == hashes:
+                print(f"Feature '{nome_dataset}': nessuna riga modificata ({len(hashes)} righe)")
+                return vecchio
+
+    posizione_vecchia = {h: i for i, h in enumerate(vecchi_hash)}
+    da_calcolare = {}
+    for i, h in enumerate(hashes):
+        if h not in posizione_vecchia and h not in da_calcolare:
+            da_calcolare[h] = i
+    print(f"Feature '{nome_dataset}': {len(da_calcolare)} righe da calcolare, "
+          f"{len(hashes) - len(da_calcolare)} riusate")
+
+    nuovi = calcola_embedding([righe[i] for i in da_calcolare.values()]) if da_calcolare else None
+    if vecchio is not None:
+        dim = vecchio.shape[1]
+    else:
+        dim = nuovi.shape[1]
+    nuova_posizione = {h: j for j, h in enumerate(da_calcolare)}
+
+    tmp = path_feature + ".tmp.npy"
+    matrice = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(len(hashes), dim))
+    for start in range(0, len(hashes), _BLOCCO_COPIA):
+        blocco = hashes[start:start + _BLOCCO_COPIA]
+        riusate = [(k, posizione_vecchia[h]) for k, h in enumerate(blocco) if h in posizione_vecchia]
+        calcolate = [(k, nuova_posizione[h]) for k, h in enumerate(blocco) if h not in posizione_vecchia]
+        if riusate:
+            dest, orig = zip(*riusate)
+            matrice[start + np.array(dest)] = vecchio[np.array(orig)]
+        if calcolate:
+            dest, orig = zip(*calcolate)
+            matrice[start + np.array(dest)] = nuovi[np.array(orig)]
+    matrice.flush()
+    del matrice, vecchio
+
+    os.replace(tmp, path_feature)
+    _scrivi_json_atomico(path_manifest, {
+        "dataset": nome_dataset,
+        "model_id": model_id,
+        "backend": backend,
+        "dim": int(dim),
+        "dtype": dtype,
+        "righe": hashes,
+    })
+    return np.load(path_feature, mmap_mode="r")
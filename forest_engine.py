@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import shutil
+
+import joblib
+import numpy as np
+
+# === FORESTA "APPIATTITA" PER L'INFERENZA ===
+# Tutti gli alberi di una RandomForestClassifier addestrata vengono copiati in
+# un unico array di nodi. La valutazione avanza in parallelo (NumPy) su tutti
+# gli alberi e su tutte le righe del batch, un livello di profondità per volta,
+# e ritorna classe e probabilità in un solo passaggio.
+# Espone classes_, predict_proba e predict come sklearn, quindi la pipeline
+# la usa senza modifiche.
+# La foresta compilata viene salvata accanto al joblib (<modello>.joblib.flat/,
+# un .npy per array): dal secondo caricamento non si rilegge il pickle e,
+# con mmap_mode="r", i nodi sono mappati in memoria invece che copiati.
+
+ARRAY = ("left", "right", "feature", "threshold", "value", "radici", "classes_")
+
+
+class FlatForest:
+    def __init__(self, left, right, feature, threshold, value, radici, classes, profondita):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.radici = radici
+        self.classes_ = classes
+        self.profondita = profondita
+        self.n_features_in_ = None
+
+    @classmethod
+    def da_sklearn(cls, forest):
+        left, right, feature, threshold, value, radici = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            nodi = np.arange(n) + offset
+            foglia = tree.children_left == -1
+            # Le foglie puntano a sé stesse con soglia +inf: ulteriori passi
+            # di discesa non le spostano, quindi non servono controlli per riga
+            left.append(np.where(foglia, nodi, tree.children_left + offset))
+            right.append(np.where(foglia, nodi, tree.children_right + offset))
+            feature.append(np.where(foglia, 0, tree.feature))
+            threshold.append(np.where(foglia, np.inf, tree.threshold))
+            # Stessa normalizzazione di DecisionTreeClassifier.predict_proba
+            v = tree.value[:, 0, :].astype(np.float64)
+            somma = v.sum(axis=1, keepdims=True)
+            somma[somma == 0.0] = 1.0
+            value.append(v / somma)
+            radici.append(offset)
+            offset += n
+
+        flat = cls(
+            left=np.concatenate(left).astype(np.intp),
+            right=np.concatenate(right).astype(np.intp),
+            feature=np.concatenate(feature).astype(np.intp),
+            threshold=np.concatenate(threshold),
+            value=np.concatenate(value),
+            radici=np.asarray(radici, dtype=np.intp),
+            classes=forest.classes_,
+            profondita=max(e.tree_.max_depth for e in forest.estimators_),
+        )
+        flat.n_features_in_ = getattr(forest, "n_features_in_", None)
+        return flat
+
+    def salva(self, cartella, sorgente=None):
+        # Scrittura in una cartella temporanea e poi rinomina: chi carica in
+        # parallelo vede la cartella completa o non la vede
+        tmp = f"{cartella}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for nome in ARRAY:
+            np.save(os.path.join(tmp, f"{nome}.npy"), getattr(self, nome), allow_pickle=False)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"profondita": int(self.profondita), "n_features_in_": self.n_features_in_,
+                       "sorgente": sorgente}, f)
+        shutil.rmtree(cartella, ignore_errors=True)
+        try:
+            os.replace(tmp, cartella)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    @classmethod
+    def carica(cls, cartella, mmap_mode=None):
+        array = {nome: np.load(os.path.join(cartella, f"{nome}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+                 for nome in ARRAY}
+        with open(os.path.join(cartella, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        flat = cls(
+            left=array["left"], right=array["right"], feature=array["feature"], threshold=array["threshold"],
+            value=array["value"], radici=array["radici"], classes=np.asarray(array["classes_"]),
+            profondita=meta["profondita"],
+        )
+        flat.n_features_in_ = meta["n_features_in_"]
+        return flat
+
+    def foglie(self, X):
+        # Indice della foglia raggiunta da ogni riga in ogni albero: (n_righe, n_alberi)
+        # Come sklearn, i valori sono confrontati in float32
+        X = np.asarray(X, dtype=np.float32)
+        righe = np.arange(X.shape[0])[:, None]
+        nodi = np.broadcast_to(self.radici, (X.shape[0], len(self.radici)))
+        for _ in range(self.profondita):
+            valori = X[righe, self.feature[nodi]]
+            nodi = np.where(valori <= self.threshold[nodi], self.left[nodi], self.right[nodi])
+        return nodi
+
+    def predict_proba(self, X):
+        nodi = self.foglie(X)
+        # Somma albero per albero, nello stesso ordine di sklearn, per avere
+        # esattamente le stesse probabilità
+        proba = np.zeros((nodi.shape[0], self.value.shape[1]))
+        for t in range(nodi.shape[1]):
+            proba += self.value[nodi[:, t]]
+        proba /= nodi.shape[1]
+        return proba
+
+    def valuta(self, X):
+        # Classe e probabilità in un solo passaggio
+        proba = self.predict_proba(X)
+        return self.classes_[proba.argmax(axis=1)], proba
+
+    def predict(self, X):
+        return self.valuta(X)[0]
+
+
+def _firma(path):
+    # Il joblib d'origine è cambiato se cambiano dimensione o data di modifica
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def carica_foresta(path, mmap_mode=None):
+    # Usa la foresta compilata accanto al joblib se è aggiornata, altrimenti
+    # la ricompila e prova a salvarla (la cartella può essere in sola lettura)
+    cartella = path + ".flat"
+    try:
+        with open(os.path.join(cartella, "meta.json"), encoding="utf-8") as f:
+            aggiornata = json.load(f).get("sorgente") == _firma(path)
+    except (OSError, ValueError):
+        aggiornata = False
+    if aggiornata:
+        return FlatForest.carica(cartella, mmap_mode=mmap_mode)
+    flat = FlatForest.da_sklearn(joblib.load(path))
+    try:
+        flat.salva(cartella, sorgente=_firma(path))
+    except OSError as e:
+        print(f"⚠️ Foresta compilata non salvata in '{cartella}': {e}")
+        return flat
+    return FlatForest.carica(cartella, mmap_mode=mmap_mode)
+
+
+# === VERIFICA DI PARITÀ CON SKLEARN ===
+def verifica_parita(forest, X):
+    # Confronta FlatForest e sklearn sulle stesse righe; ritorna il numero di
+    # differenze (0 = output identici)
+    flat = FlatForest.da_sklearn(forest)
+    classi, proba = flat.valuta(X)
+    diff_classi = int((classi != forest.predict(X)).sum())
+    diff_proba = int((proba != forest.predict_proba(X)).any(axis=1).sum())
+    return diff_classi, diff_proba
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica che FlatForest dia gli stessi output di sklearn")
+    parser.add_argument("modelli", nargs="*", default=["document_clf2.joblib", "semantic_clf_5class2.joblib"])
+    parser.add_argument("--righe", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    errori = 0
+    for path in args.modelli:
+        forest = joblib.load(path)
+        # Righe casuali attorno alle soglie effettivamente usate dagli alberi,
+        # così ogni nodo viene attraversato in entrambe le direzioni
+        soglie = np.concatenate([e.tree_.threshold[e.tree_.children_left != -1] for e in forest.estimators_])
+        X = rng.choice(soglie, size=(args.righe, forest.n_features_in_)) + rng.normal(0, 1e-3, (args.righe, forest.n_features_in_))
+        diff_classi, diff_proba = verifica_parita(forest, X)
+        errori += diff_classi + diff_proba
+        stato = "✅" if diff_classi == diff_proba == 0 else "❌"
+        print(f"{stato} {path}: {diff_classi} classi e {diff_proba} probabilità diverse su {args.righe} righe")
+    raise SystemExit(1 if errori else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import random
+import string
+import time
+
+from template_sintetici import (
+    BASI_NEUTRALITA, CERTIFICAZIONI, PARTI, SI_NO, SLOT, SUPPORTI, TEMPLATE_DOC, TEMPLATE_SEM
+)
+
+# === GENERATORE DI DATI SINTETICI IN STREAMING ===
+# Genera milioni di form (come quelli di app3.py), coppie Claim/Support o
+# claim con categoria a partire dalle tabelle di template_sintetici.py.
+# Le righe sono prodotte una alla volta e scritte in shard CSV o Parquet:
+# la memoria non dipende dal numero di righe. I duplicati sono scartati con
+# un filtro di Bloom di dimensione fissa (qualche riga unica può essere
+# scartata per errore, con probabilità --errore-dedup). Stesso seed → stessi file.
+#
+#   python genera_sintetici.py form --righe 5000000 --output sintetici/form
+#   python genera_sintetici.py doc --righe 1000000 --formato parquet --output sintetici/doc
+#   python genera_sintetici.py sem --righe 200000 --righe-per-shard 0 --output sintetici/sem
+
+COLONNE = {
+    "form": ["affermazione", "parte_prodotto", "percentuale", "certificazioni", "esistenza_report",
+             "riguarda_carbon_neutral", "base_neutralita", "ha_piano_riduzione", "verifica_indipendente",
+             "report_pubblico", "uso_logo_verde", "logo_certificato", "prove_caricate"],
+    "doc": ["Claim", "Support", "Label"],
+    "sem": ["claim", "categoria", "spiegazione"],
+}
+# Dopo tanti duplicati di fila lo spazio dei template è esaurito
+MAX_DUPLICATI_DI_FILA = 10_000
+RIGHE_PER_GRUPPO = 65_536  # row group Parquet / flush CSV
+
+
+class FiltroBloom:
+    def __init__(self, capacita, errore=1e-4):
+        self.n_bit = max(8, math.ceil(-capacita * math.log(errore) / math.log(2) ** 2))
+        self.n_hash = max(1, round(self.n_bit / capacita * math.log(2)))
+        self.bit = bytearray((self.n_bit + 7) // 8)
+
+    def aggiungi(self, chiave):
+        # True se la chiave è nuova (e la registra), False se già vista
+        digest = hashlib.blake2b(chiave.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        nuova = False
+        for i in range(self.n_hash):
+            pos = (h1 + i * h2) % self.n_bit
+            byte, maschera = pos >> 3, 1 << (pos & 7)
+            if not self.bit[byte] & maschera:
+                self.bit[byte] |= maschera
+                nuova = True
+        return nuova
+
+    @property
+    def byte(self):
+        return len(self.bit)
+
+
+def _riempi(rng, testo, **fissi):
+    # Sostituisce ogni segnaposto con un valore a caso di SLOT (o con quelli fissati)
+    valori = dict(fissi)
+    for _, nome, _, _ in string.Formatter().parse(testo):
+        if nome and nome not in valori:
+            valori[nome] = rng.choice(SLOT[nome])
+    return testo.format(**valori), valori
+
+
+def _claim_doc(rng):
+    template = rng.choice(TEMPLATE_DOC)
+    testo, valori = _riempi(rng, rng.choice(template["testi"]))
+    return template, testo, valori
+
+
+def genera_doc(rng):
+    while True:
+        template, claim, _ = _claim_doc(rng)
+        supporto = rng.choice(SUPPORTI)
+        valide = template["certificazioni_valide"]
+        if supporto["tipo"] == "valida" and valide:
+            cert = rng.choice(valide)
+        else:
+            cert = rng.choice([c for c in CERTIFICAZIONI if c not in valide])
+        cert2 = rng.choice([c for c in CERTIFICAZIONI if c != cert])
+        support, _ = _riempi(rng, supporto["testo"], cert=cert, cert2=cert2)
+        conforme = supporto["tipo"] == "valida" and bool(valide)
+        yield {"Claim": claim, "Support": support, "Label": 0 if conforme else 1}
+
+
+def genera_sem(rng):
+    while True:
+        template = rng.choice(TEMPLATE_SEM)
+        fissi = {"cert": rng.choice(template["certificazioni"])} if "certificazioni" in template else {}
+        claim, _ = _riempi(rng, template["testo"], **fissi)
+        yield {"claim": claim, "categoria": template["categoria"], "spiegazione": template["spiegazione"]}
+
+
+def genera_form(rng):
+    # Campi coerenti con il form: certificazioni pertinenti in metà dei casi,
+    # domande sulla neutralità solo se il claim la riguarda (come in app3.py)
+    while True:
+        template, affermazione, valori = _claim_doc(rng)
+        certificazioni = rng.sample(CERTIFICAZIONI, rng.randint(0, 2))
+        if template["certificazioni_valide"] and rng.random() < 0.5:
+            certificazioni.append(rng.choice(template["certificazioni_valide"]))
+        carbon = "Sì" if template["famiglia"] == "carbon_neutral" or rng.random() < 0.1 else "No"
+        logo = rng.choice(SI_NO)
+        yield {
+            "affermazione": affermazione,
+            "parte_prodotto": rng.choice(PARTI),
+            "percentuale": f"{valori['p']}%" if "p" in valori and rng.random() < 0.7 else "",
+            "certificazioni": ";".join(dict.fromkeys(certificazioni)),
+            "esistenza_report": rng.choice(SI_NO),
+            "riguarda_carbon_neutral": carbon,
+            "base_neutralita": rng.choice(BASI_NEUTRALITA) if carbon == "Sì" else "",
+            "ha_piano_riduzione": rng.choice(SI_NO) if carbon == "Sì" else "",
+            "verifica_indipendente": rng.choice(SI_NO),
+            "report_pubblico": rng.choice(SI_NO),
+            "uso_logo_verde": logo,
+            "logo_certificato": rng.choice(SI_NO) if logo == "Sì" else "",
+            "prove_caricate": rng.random() < 0.3,
+        }
+
+
+GENERATORI = {"form": genera_form, "doc": genera_doc, "sem": genera_sem}
+
+
+def righe_uniche(tipo, n, seed=42, errore=1e-4, statistiche=None):
+    # Generatore di al più n righe distinte del tipo indicato
+    rng = random.Random(seed)
+    filtro = FiltroBloom(n, errore)
+    colonne = COLONNE[tipo]
+    prodotte = duplicati = di_fila = 0
+    for riga in GENERATORI[tipo](rng):
+        if prodotte >= n:
+            break
+        if not filtro.aggiungi("\x1f".join(str(riga[c]) for c in colonne)):
+            duplicati += 1
+            di_fila += 1
+            if di_fila >= MAX_DUPLICATI_DI_FILA:
+                print(f"⚠️ Combinazioni dei template esaurite dopo {prodotte} righe uniche")
+                break
+            continue
+        di_fila = 0
+        prodotte += 1
+        yield riga
+    if statistiche is not None:
+        statistiche.update({"righe": prodotte, "duplicati_scartati": duplicati, "byte_filtro": filtro.byte})
+
+
+# === SCRITTURA IN SHARD ===
+class _ShardCsv:
+    estensione = "csv"
+
+    def __init__(self, path, colonne):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=colonne)
+        self.writer.writeheader()
+
+    def scrivi(self, righe):
+        self.writer.writerows(righe)
+
+    def chiudi(self):
+        self.file.close()
+
+
+class _ShardParquet:
+    estensione = "parquet"
+
+    def __init__(self, path, colonne):
+        import pyarrow.parquet as pq
+        self.path = path
+        self.colonne = colonne
+        self.writer = None
+        self._pq = pq
+
+    def scrivi(self, righe):
+        import pyarrow as pa
+        tabella = pa.Table.from_pylist(righe)
+        if self.writer is None:
+            self.writer = self._pq.ParquetWriter(self.path, tabella.schema)
+        self.writer.write_table(tabella)
+
+    def chiudi(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def scrivi_shard(righe, output, tipo, formato="csv", righe_per_shard=1_000_000):
+    # righe_per_shard = 0 → un solo file. Ritorna la lista degli shard scritti.
+    os.makedirs(output, exist_ok=True)
+    classe = _ShardCsv if formato == "csv" else _ShardParquet
+    shard, corrente, nel_corrente, gruppo = [], None, 0, []
+
+    def svuota():
+        if gruppo:
+            corrente.scrivi(gruppo)
+            gruppo.clear()
+
+    for riga in righe:
+        if corrente is None or (righe_per_shard and nel_corrente >= righe_per_shard):
+            if corrente is not None:
+                svuota()
+                corrente.chiudi()
+            path = os.path.join(output, f"{tipo}-{len(shard):05d}.{classe.estensione}")
+            corrente, nel_corrente = classe(path, COLONNE[tipo]), 0
+            shard.append(path)
+        gruppo.append(riga)
+        nel_corrente += 1
+        if len(gruppo) >= RIGHE_PER_GRUPPO:
+            svuota()
+    if corrente is not None:
+        svuota()
+        corrente.chiudi()
+    return shard
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera form e claim sintetici in streaming, in shard CSV/Parquet")
+    parser.add_argument("tipo", choices=list(GENERATORI))
+    parser.add_argument("--righe", type=int, default=1_000_000)
+    parser.add_argument("--output", required=True, help="cartella degli shard")
+    parser.add_argument("--formato", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--righe-per-shard", type=int, default=1_000_000, help="0 = un solo file")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--errore-dedup", type=float, default=1e-4,
+                        help="probabilità che una riga nuova sia scartata come duplicato")
+    args = parser.parse_args()
+
+    inizio = time.perf_counter()
+    statistiche = {}
+    righe = righe_uniche(args.tipo, args.righe, args.seed, args.errore_dedup, statistiche)
+    shard = scrivi_shard(righe, args.output, args.tipo, args.formato, args.righe_per_shard)
+    secondi = time.perf_counter() - inizio
+
+    manifest = {
+        "tipo": args.tipo, "seed": args.seed, "formato": args.formato, "errore_dedup": args.errore_dedup,
+        **statistiche, "shard": [os.path.basename(p) for p in shard], "secondi": secondi,
+    }
+    with open(os.path.join(args.output, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"✅ {statistiche['righe']} righe '{args.tipo}' in {len(shard)} shard ({secondi:.1f}s, "
+          f"{statistiche['righe'] / max(secondi, 1e-9):.0f} righe/s); "
+          f"{statistiche['duplicati_scartati']} duplicati scartati")
+
+
+if __name__ == "__main__":
+    main()
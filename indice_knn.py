@@ -0,0 +1,121 @@
+import json
+import os
+
+import numpy as np
+
+# === INDICE DEI CLAIM ETICHETTATI (NEAREST NEIGHBOUR) ===
+# Matrice degli embedding normalizzati dei claim di training, salvata accanto
+# ai modelli joblib. All'inferenza i k claim più simili si ottengono con un
+# prodotto matrice-vettore: servono come spiegazione ("assomiglia a questi
+# claim del dataset") e come classificatore kNN di riserva.
+# La matrice può essere salvata in float16 o int8 (con una scala per riga) ed
+# è caricata come memmap: resta piccola e veloce anche con centinaia di
+# migliaia di claim.
+# Espone classes_ / predict_proba / predict come sklearn, così può prendere il
+# posto di una RandomForest nella pipeline.
+
+DTYPES = ("float32", "float16", "int8")
+DTYPE = os.environ.get("GREEN_CLAIMS_KNN_DTYPE", "float16")
+K = int(os.environ.get("GREEN_CLAIMS_KNN_K", "5"))
+RIGHE_PER_BLOCCO = 65536  # limita la memoria temporanea del prodotto
+
+
+def _normalizza(X):
+    X = np.asarray(X, dtype=np.float32)
+    norme = np.linalg.norm(X, axis=-1, keepdims=True)
+    norme[norme == 0] = 1.0
+    return X / norme
+
+
+class IndiceKNN:
+    def __init__(self, matrice, scale, etichette, testi, meta=None, k=K):
+        self.matrice = matrice
+        self.scale = scale
+        self.etichette = etichette
+        self.testi = testi
+        self.meta = meta or {}
+        self.k = k
+        self.classes_ = np.unique(etichette)
+
+    @classmethod
+    def costruisci(cls, embedding, etichette, testi, dtype=DTYPE, meta=None):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype non supportato: {dtype!r} (disponibili: {', '.join(DTYPES)})")
+        X = _normalizza(embedding)
+        scale = None
+        if dtype == "int8":
+            scale = np.abs(X).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            matrice = np.round(X / scale[:, None]).astype(np.int8)
+            scale = scale.astype(np.float32)
+        else:
+            matrice = X.astype(dtype)
+        return cls(matrice, scale, np.asarray(etichette), list(testi),
+                   {**(meta or {}), "dtype": dtype, "dim": int(X.shape[1]), "n": int(X.shape[0])})
+
+    def salva(self, cartella):
+        os.makedirs(cartella, exist_ok=True)
+        np.save(os.path.join(cartella, "matrice.npy"), self.matrice)
+        if self.scale is not None:
+            np.save(os.path.join(cartella, "scale.npy"), self.scale)
+        np.save(os.path.join(cartella, "etichette.npy"), self.etichette)
+        with open(os.path.join(cartella, "testi.json"), "w", encoding="utf-8") as f:
+            json.dump(self.testi, f, ensure_ascii=False)
+        with open(os.path.join(cartella, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def carica(cls, cartella, mmap_mode="r", k=K):
+        path_scale = os.path.join(cartella, "scale.npy")
+        with open(os.path.join(cartella, "testi.json"), encoding="utf-8") as f:
+            testi = json.load(f)
+        with open(os.path.join(cartella, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            matrice=np.load(os.path.join(cartella, "matrice.npy"), mmap_mode=mmap_mode),
+            scale=np.load(path_scale) if os.path.exists(path_scale) else None,
+            etichette=np.load(os.path.join(cartella, "etichette.npy")),
+            testi=testi,
+            meta=meta,
+            k=k,
+        )
+
+    def _top_k(self, Q, k):
+        # Indici e similarità coseno dei k vicini di ogni riga di Q, ordinati
+        n = self.matrice.shape[0]
+        k = min(k, n)
+        migliori_s = np.empty((Q.shape[0], 0), dtype=np.float32)
+        migliori_i = np.empty((Q.shape[0], 0), dtype=np.intp)
+        for inizio in range(0, n, RIGHE_PER_BLOCCO):
+            blocco = np.asarray(self.matrice[inizio:inizio + RIGHE_PER_BLOCCO], dtype=np.float32)
+            S = Q @ blocco.T
+            if self.scale is not None:
+                S *= self.scale[inizio:inizio + len(blocco)]
+            cand_s = np.hstack([migliori_s, S])
+            cand_i = np.hstack([migliori_i, np.broadcast_to(np.arange(inizio, inizio + len(blocco)), S.shape)])
+            part = np.argpartition(-cand_s, k - 1, axis=1)[:, :k]
+            migliori_s = np.take_along_axis(cand_s, part, axis=1)
+            migliori_i = np.take_along_axis(cand_i, part, axis=1)
+        ordine = np.argsort(-migliori_s, axis=1)
+        return np.take_along_axis(migliori_i, ordine, axis=1), np.take_along_axis(migliori_s, ordine, axis=1)
+
+    def cerca(self, X, k=None):
+        # Per ogni riga di X: lista dei k claim etichettati più simili
+        indici, score = self._top_k(_normalizza(np.atleast_2d(X)), k or self.k)
+        return [
+            [{"testo": self.testi[i], "etichetta": self.etichette[i].item(), "score": float(s)}
+             for i, s in zip(riga_i, riga_s)]
+            for riga_i, riga_s in zip(indici, score)
+        ]
+
+    def predict_proba(self, X):
+        # Voto dei k vicini pesato per similarità (pesi negativi ignorati)
+        indici, score = self._top_k(_normalizza(np.atleast_2d(X)), self.k)
+        pesi = np.clip(score, 0, None) + 1e-9
+        classi = np.searchsorted(self.classes_, self.etichette[indici])
+        proba = np.zeros((len(indici), len(self.classes_)))
+        np.add.at(proba, (np.arange(len(indici))[:, None], classi), pesi)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
@@ -0,0 +1,270 @@
+import os
+import threading
+import time
+
+import joblib
+
+from bundle_modelli import OBBLIGATORI, BundleNonValido, _versioni, carica_bundle, impronta_encoder, versione_corrente
+from embedding import BACKEND, MODEL_ID, impronta_modello, load_encoder
+from cascata import ATTIVA as CASCATA_ATTIVA
+from cascata import PATH_DOC as PATH_CASCATA_DOC
+from cascata import PATH_SEM as PATH_CASCATA_SEM
+from forest_engine import carica_foresta
+from indice_knn import IndiceKNN
+from proiezione import PATH_DOC, PATH_SEM
+
+# === REGISTRO DEI MODELLI ===
+# Ogni artefatto viene caricato una sola volta per processo, al primo uso
+# (o in anticipo con riscalda()). I rerun di Streamlit e le richieste del
+# servizio HTTP riusano sempre gli stessi oggetti in memoria.
+# Se esiste un bundle versionato (bundle_modelli.py) i modelli vengono da lì,
+# altrimenti dai file joblib sciolti nella cartella del progetto.
+
+# "r" → gli array numpy grandi (es. i nodi delle foreste compilate, salvati in
+# <modello>.joblib.flat/ da forest_engine) sono mappati in memoria invece che
+# copiati; vuoto → caricamento normale
+MMAP_MODE = os.environ.get("GREEN_CLAIMS_MMAP") or None
+
+# "flat" → le RandomForest sono compilate in forest_engine.FlatForest
+# (stessi output, valutazione vettoriale); "sklearn" → oggetti originali
+FOREST_ENGINE = os.environ.get("GREEN_CLAIMS_FOREST", "flat")
+
+# "rf" → classificatori RandomForest; "knn" → voto dei vicini negli indici
+# knn_documentale/ e knn_semantico/ (classificatore di riserva)
+CLASSIFICATORE = os.environ.get("GREEN_CLAIMS_CLASSIFICATORE", "rf")
+
+# Ogni quanti secondi la sorveglianza controlla se è stato pubblicato un bundle nuovo
+SORVEGLIANZA_S = float(os.environ.get("GREEN_CLAIMS_SORVEGLIANZA_S", "10"))
+
+# Artefatti sciolti usati quando non c'è nessun bundle
+FILE_SCIOLTI = {
+    "clf_doc": "document_clf2.joblib",
+    "semantic_clf": "semantic_clf_5class2.joblib",
+    "label_map": "label_map2.joblib",
+    "proiezione_doc": PATH_DOC,
+    "proiezione_sem": PATH_SEM,
+    "knn_doc": "knn_documentale",
+    "knn_sem": "knn_semantico",
+    "cascata_doc": PATH_CASCATA_DOC,
+    "cascata_sem": PATH_CASCATA_SEM,
+}
+
+# Classificatore → (proiezione che lo precede, quanti embedding dell'encoder
+# compongono le sue feature: claim + support per il documentale)
+INGRESSI = {"clf_doc": ("proiezione_doc", 2), "semantic_clf": ("proiezione_sem", 1)}
+
+
+class ModelRegistry:
+    def __init__(self, versione=None, model_id=MODEL_ID, backend=BACKEND):
+        self.versione = versione  # None = file sciolti
+        self.model_id = model_id
+        self.backend = backend
+        self._caricatori = {}
+        self._oggetti = {}
+        self._metriche = {}
+        self._lock = threading.Lock()
+        self._lock_nome = {}
+
+    def registra(self, nome, caricatore, dimensione=None):
+        # `caricatore` è una funzione senza argomenti; `dimensione` il path
+        # del file da cui leggere i byte per le metriche (se c'è)
+        with self._lock:
+            self._caricatori[nome] = (caricatore, dimensione)
+            self._lock_nome[nome] = threading.Lock()
+            self._oggetti.pop(nome, None)
+
+    def registra_joblib(self, nome, path, mmap_mode=MMAP_MODE):
+        self.registra(nome, lambda: joblib.load(path, mmap_mode=mmap_mode), dimensione=path)
+
+    def registra_foresta(self, nome, path, mmap_mode=MMAP_MODE, engine=FOREST_ENGINE):
+        if engine == "flat":
+            self.registra(nome, lambda: carica_foresta(path, mmap_mode=mmap_mode), dimensione=path)
+        else:
+            self.registra_joblib(nome, path, mmap_mode=mmap_mode)
+
+    def registra_knn(self, nome, cartella):
+        self.registra(nome, lambda: IndiceKNN.carica(cartella), dimensione=os.path.join(cartella, "matrice.npy"))
+
+    def ha(self, nome):
+        return nome in self._caricatori
+
+    def get(self, nome):
+        oggetto = self._oggetti.get(nome)
+        if oggetto is not None:
+            return oggetto
+        if nome not in self._caricatori:
+            raise KeyError(f"Modello non registrato: {nome!r}")
+        # Lock per artefatto: due richieste concorrenti non caricano due volte
+        with self._lock_nome[nome]:
+            if nome not in self._oggetti:
+                caricatore, path = self._caricatori[nome]
+                inizio = time.perf_counter()
+                oggetto = caricatore()
+                self._metriche[nome] = {
+                    "secondi_caricamento": time.perf_counter() - inizio,
+                    "byte": os.path.getsize(path) if path and os.path.exists(path) else None,
+                    "caricato_alle": time.time(),
+                }
+                self._oggetti[nome] = oggetto
+        return self._oggetti[nome]
+
+    def riscalda(self, nomi=None):
+        # Carica subito gli artefatti indicati (default: tutti)
+        for nome in nomi if nomi is not None else list(self._caricatori):
+            self.get(nome)
+        return self.metriche()
+
+    def metriche(self):
+        return {
+            nome: {"caricato": nome in self._oggetti, **self._metriche.get(nome, {})}
+            for nome in self._caricatori
+        }
+
+
+def _registro_da_percorsi(percorsi, versione=None, model_id=MODEL_ID, backend=BACKEND):
+    # percorsi: {nome artefatto: path}; quelli opzionali possono mancare
+    registro = ModelRegistry(versione, model_id, backend)
+    registro.registra("encoder", lambda: load_encoder(model_id, backend))
+    if CLASSIFICATORE == "knn":
+        registro.registra_knn("clf_doc", percorsi["knn_doc"])
+        registro.registra_knn("semantic_clf", percorsi["knn_sem"])
+    else:
+        registro.registra_foresta("clf_doc", percorsi["clf_doc"])
+        registro.registra_foresta("semantic_clf", percorsi["semantic_clf"])
+        # Proiezioni delle feature: presenti solo se il training le ha usate
+        for nome in ("proiezione_doc", "proiezione_sem"):
+            if nome in percorsi:
+                registro.registra_joblib(nome, percorsi[nome], mmap_mode=None)
+    registro.registra_joblib("label_map", percorsi["label_map"])
+    # Indici dei claim simili: presenti solo dopo un training che li ha generati
+    for nome in ("knn_doc", "knn_sem"):
+        if nome in percorsi:
+            registro.registra_knn(nome, percorsi[nome])
+    # Primo stadio della cascata (cascata.py): se manca, tutto passa da BERT
+    for nome in ("cascata_doc", "cascata_sem"):
+        if CASCATA_ATTIVA and nome in percorsi:
+            registro.registra_joblib(nome, percorsi[nome], mmap_mode=None)
+    return registro
+
+
+def _registro_da_bundle(cartella, manifest):
+    percorsi = {nome: os.path.join(cartella, relativo) for nome, relativo in manifest["artefatti"].items()}
+    # Il backend resta quello scelto per l'inferenza; l'encoder è quello del training
+    return _registro_da_percorsi(percorsi, manifest["versione"], manifest["encoder"]["model_id"], BACKEND)
+
+
+def verifica_dimensioni(registro, manifest):
+    # Da chiamare dopo riscalda(): encoder, proiezioni e classificatori del
+    # bundle devono concordare con le dimensioni dichiarate nel manifest, e i
+    # pesi dell'encoder devono essere quelli usati nel training
+    versione = f"v{manifest['versione']:04d}"
+    if impronta_modello(registro.model_id) != impronta_encoder(manifest):
+        raise BundleNonValido(f"{versione}: i pesi di {registro.model_id} ({impronta_modello(registro.model_id)}) "
+                              f"non sono quelli del training ({impronta_encoder(manifest)})")
+    dim = manifest["encoder"].get("dim")
+    _, encoder = registro.get("encoder")
+    if dim is not None and encoder.hidden_size != dim:
+        raise BundleNonValido(f"{versione}: l'encoder produce {encoder.hidden_size} dimensioni, il manifest ne dichiara {dim}")
+    for nome, attese in manifest["feature"].items():
+        # I classificatori kNN non hanno n_features_in_: i controlli valgono per le foreste
+        if not registro.ha(nome) or getattr(registro.get(nome), "n_features_in_", None) is None:
+            continue
+        ingresso = registro.get(nome).n_features_in_
+        if ingresso != attese:
+            raise BundleNonValido(f"{versione}: {nome} si aspetta {ingresso} feature, il manifest ne dichiara {attese}")
+        nome_proiezione, copie = INGRESSI.get(nome, (None, 1))
+        if registro.ha(nome_proiezione):
+            proiezione = registro.get(nome_proiezione)
+            if proiezione.dim_uscita != attese:
+                raise BundleNonValido(f"{versione}: {nome_proiezione} produce {proiezione.dim_uscita} feature, "
+                                      f"{nome} ne vuole {attese}")
+            attese = proiezione.dim_ingresso
+        if nome in INGRESSI and attese != encoder.hidden_size * copie:
+            raise BundleNonValido(f"{versione}: {nome} vuole {attese} feature dall'encoder, "
+                                  f"che ne produce {encoder.hidden_size * copie}")
+
+
+def _registro_default():
+    # Bundle attivo; se è rotto la versione valida più recente, poi i file
+    # sciolti: un bundle corrotto non deve impedire l'avvio di app e servizio
+    try:
+        corrente = versione_corrente()
+    except (OSError, ValueError) as e:
+        print(f"❌ File CORRENTE dei bundle illeggibile: {e}")
+        corrente = None
+    candidate = ([corrente] if corrente is not None else []) + \
+        [v for v in reversed(_versioni()) if v != corrente]
+    for versione in candidate:
+        try:
+            return _registro_da_bundle(*carica_bundle(versione))
+        except (BundleNonValido, KeyError, TypeError) as e:
+            _versioni_scartate.add(versione)
+            print(f"❌ Bundle v{versione:04d} scartato: {e}")
+    obbligatori = OBBLIGATORI + (("knn_doc", "knn_sem") if CLASSIFICATORE == "knn" else ())
+    return _registro_da_percorsi({
+        nome: path for nome, path in FILE_SCIOLTI.items() if nome in obbligatori or os.path.exists(path)
+    })
+
+
+_lock_scambio = threading.Lock()
+_sorveglianza = None
+_versioni_scartate = set()
+_registro = _registro_default()
+
+
+def registro_modelli():
+    # Chi serve una richiesta deve prendere il registro una volta sola e usare
+    # sempre quello: uno scambio a metà richiesta non la tocca
+    return _registro
+
+
+def attiva_bundle(versione=None):
+    # Carica e riscalda il bundle indicato (default: quello attivo su disco)
+    # mentre le richieste continuano sul registro vecchio, poi lo scambia
+    global _registro
+    bundle = carica_bundle(versione)
+    if bundle is None:
+        raise BundleNonValido("Nessun bundle pubblicato")
+    nuovo = _registro_da_bundle(*bundle)
+    nuovo.riscalda()
+    verifica_dimensioni(nuovo, bundle[1])
+    with _lock_scambio:
+        _registro = nuovo
+    return nuovo
+
+
+def controlla_aggiornamenti():
+    # True se è stato attivato un bundle nuovo
+    versione = versione_corrente()
+    if versione is None or versione == _registro.versione or versione in _versioni_scartate:
+        return False
+    try:
+        attiva_bundle(versione)
+    except Exception as e:
+        # Bundle incoerente, pickle illeggibile, encoder non caricabile...:
+        # resta sul bundle attuale e la versione rotta non viene ritentata
+        _versioni_scartate.add(versione)
+        print(f"❌ Bundle v{versione:04d} non attivato: {type(e).__name__}: {e}")
+        return False
+    print(f"🔄 Modelli aggiornati al bundle v{versione:04d}")
+    return True
+
+
+def avvia_sorveglianza(intervallo=SORVEGLIANZA_S):
+    # Thread di background che attiva i bundle nuovi appena pubblicati
+    global _sorveglianza
+    with _lock_scambio:
+        if _sorveglianza is not None:
+            return _sorveglianza
+
+        def ciclo():
+            while True:
+                time.sleep(intervallo)
+                try:
+                    controlla_aggiornamenti()
+                except Exception as e:  # la sorveglianza non deve mai morire
+                    print(f"❌ Errore nel controllo dei bundle: {e}")
+
+        _sorveglianza = threading.Thread(target=ciclo, name="sorveglianza-bundle", daemon=True)
+        _sorveglianza.start()
+    return _sorveglianza
@@ -0,0 +1,131 @@
+import argparse
+import json
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+from embedding import BACKENDS, MODEL_ID, embed_batch
+from proiezione import PATH_DOC, PATH_SEM, carica_proiezione
+
+# === PARITÀ TRA BACKEND DELL'ENCODER ===
+# Calcola gli embedding dei dataset del progetto con ogni backend e li
+# confronta con il riferimento PyTorch fp32: drift coseno degli embedding e
+# predizioni che cambiano per document_clf2.joblib e semantic_clf_5class2.joblib.
+#
+#   python parita_backend.py --backend int8 onnx
+#   python parita_backend.py --json parita.json
+
+
+def carica_testi():
+    df_doc = pd.read_csv("green_claims_training_dataset_doc2.csv")
+    df_sem = pd.read_csv("green_claims_semantic_dataset_extended.csv", encoding="ISO-8859-1")
+    return df_doc["Claim"].tolist(), df_doc["Support"].tolist(), df_sem["claim"].tolist()
+
+
+def _embedding(claims, support, sem, backend):
+    # Un'unica chiamata per backend; la cache è disattivata per misurare il backend vero
+    inizio = time.perf_counter()
+    emb = embed_batch(claims + support + sem, model_id=MODEL_ID, backend=backend, use_cache=False)
+    secondi = time.perf_counter() - inizio
+    n_doc = len(claims)
+    return emb[:n_doc], emb[n_doc:2 * n_doc], emb[2 * n_doc:], secondi
+
+
+def _coseno(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def _flip(clf, X_rif, X, testi):
+    pred_rif = clf.predict(X_rif)
+    pred = clf.predict(X)
+    diversi = np.flatnonzero(pred_rif != pred)
+    return {
+        "flip": int(len(diversi)),
+        "totale": int(len(pred)),
+        "esempi": [
+            {"testo": testi[i], "riferimento": pred_rif[i].item(), "backend": pred[i].item()}
+            for i in diversi[:20]
+        ],
+    }
+
+
+def _con_proiezione(clf, path):
+    # Se il modello è stato allenato su feature proiettate, la proiezione va
+    # applicata prima della foresta (come fa la pipeline)
+    proiezione = carica_proiezione(path)
+    return clf if proiezione is None else make_pipeline(
+        FunctionTransformer(proiezione.trasforma), clf)
+
+
+def confronta_backend(backends):
+    claims, support, sem = carica_testi()
+    clf_doc = _con_proiezione(joblib.load("document_clf2.joblib"), PATH_DOC)
+    clf_sem = _con_proiezione(joblib.load("semantic_clf_5class2.joblib"), PATH_SEM)
+    reverse_map = joblib.load("label_map2.joblib")
+
+    rif_c, rif_s, rif_sem, sec_rif = _embedding(claims, support, sem, "pytorch")
+    X_doc_rif = np.hstack([rif_c, rif_s])
+    testi_doc = [f"{c} | {s}" for c, s in zip(claims, support)]
+
+    report = {"pytorch": {"secondi": sec_rif}}
+    for backend in backends:
+        if backend == "pytorch":
+            continue
+        emb_c, emb_s, emb_sem, secondi = _embedding(claims, support, sem, backend)
+        cos = np.concatenate([_coseno(rif_c, emb_c), _coseno(rif_s, emb_s), _coseno(rif_sem, emb_sem)])
+        drift = 1.0 - cos
+        flip_sem = _flip(clf_sem, rif_sem, emb_sem, sem)
+        for esempio in flip_sem["esempi"]:
+            esempio["riferimento"] = reverse_map[esempio["riferimento"]]
+            esempio["backend"] = reverse_map[esempio["backend"]]
+        report[backend] = {
+            "secondi": secondi,
+            "speedup": sec_rif / secondi if secondi else None,
+            "drift_coseno": {
+                "medio": float(drift.mean()),
+                "p99": float(np.percentile(drift, 99)),
+                "max": float(drift.max()),
+            },
+            "documentale": _flip(clf_doc, X_doc_rif, np.hstack([emb_c, emb_s]), testi_doc),
+            "semantico": flip_sem,
+        }
+    return report
+
+
+def stampa_report(report):
+    print(f"Riferimento pytorch: {report['pytorch']['secondi']:.2f}s")
+    for backend, r in report.items():
+        if backend == "pytorch":
+            continue
+        d = r["drift_coseno"]
+        print(f"\n=== {backend} ===")
+        print(f"Tempo: {r['secondi']:.2f}s (speedup x{r['speedup']:.2f})")
+        print(f"Drift coseno: medio {d['medio']:.2e}, p99 {d['p99']:.2e}, max {d['max']:.2e}")
+        for nome in ("documentale", "semantico"):
+            flip = r[nome]
+            print(f"Predizioni cambiate ({nome}): {flip['flip']}/{flip['totale']}")
+            for esempio in flip["esempi"]:
+                print(f"   - {esempio['testo']}: {esempio['riferimento']} → {esempio['backend']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronto di accuratezza tra backend dell'encoder")
+    parser.add_argument("--backend", nargs="+", choices=BACKENDS, default=[b for b in BACKENDS if b != "pytorch"])
+    parser.add_argument("--json", help="salva il report anche in questo file JSON")
+    args = parser.parse_args()
+
+    report = confronta_backend(args.backend)
+    stampa_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+import os
+import re
+
+import numpy as np
+
+from cascata import testo_documentale
+from embedding import embed_batch
+from model_registry import registro_modelli
+from rule_engine import MOTORE
+from telemetria import span
+
+# === PIPELINE DI VALUTAZIONE DEL CLAIM ===
+# Tutta la logica di decisione di app3.py, indipendente da Streamlit, così da
+# poterla usare anche dalla CLI di scoring in batch.
+
+# Valori di default dei campi del form quando un campo manca (batch, servizio).
+# Non sono quelli della UI, dove i radio partono da "Sì": una domanda senza
+# risposta vale come prova assente ("No").
+FORM_DEFAULTS = {
+    "affermazione": "",
+    "parte_prodotto": "Tutto il prodotto",
+    "percentuale": "",
+    "certificazioni": [],
+    "esistenza_report": "No",
+    "riguarda_carbon_neutral": "No",
+    "base_neutralita": None,
+    "ha_piano_riduzione": None,
+    "verifica_indipendente": "No",
+    "report_pubblico": "No",
+    "uso_logo_verde": "No",
+    "logo_certificato": None,
+    "prove_caricate": False,
+    "evidenze": [],  # passaggi del PDF di supporto (evidenze_pdf.estrai_evidenze)
+}
+
+# Quanti claim etichettati simili riportare nei risultati (0 = nessuno)
+K_SIMILI = int(os.environ.get("GREEN_CLAIMS_SIMILI", "3"))
+
+SPIEGAZIONI = {
+    "Valido": "✅ Claim chiaro, quantificato e verificabile.",
+    "Ambiguo": "🟡 Claim vago.",
+    "Ingannevole": "🔴 Claim fuorviante o non realistico.",
+    "Irrilevante": "⚪ Claim che non riguarda l'ambiente.",
+    "Marketing": "📢 Claim promozionale o non tecnico."
+}
+
+
+# === FUNZIONE CHE GENERA CLAIM E DOCUMENTO DA FORM ===
+def genera_claim_e_doc(
+    affermazione, parte_prodotto, percentuale, certificazioni,
+    esistenza_report, riguarda_carbon_neutral, base_neutralita,
+    ha_piano_riduzione, verifica_indipendente, report_pubblico,
+    uso_logo_verde, logo_certificato
+):
+    # === Costruzione del testo del claim ===
+    claim_parts = []
+    # if riguarda_carbon_neutral == "Sì":
+    #     claim_parts.append(affermazione + ":"+ "Prodotto carbon neutral")
+    # else:
+    claim_parts.append(affermazione +":")
+
+    if percentuale:
+        claim_parts.append(f"({percentuale})")
+    if parte_prodotto != "Tutto il prodotto":
+        claim_parts.append(f"relativo a {parte_prodotto.lower()}")
+
+    if certificazioni:
+        claim_parts.append("certificato " + ", ".join(certificazioni))
+
+    claim_test = " ".join(claim_parts)
+
+    # === Costruzione della documentazione di supporto ===
+    doc_parts = []
+    if certificazioni:
+        doc_parts.append("Certificato " + ", ".join(certificazioni)+".")
+
+    if esistenza_report == "Sì":
+        doc_parts.append("È disponibile un report ufficiale.")
+    if riguarda_carbon_neutral == "Sì":
+        if base_neutralita:
+            doc_parts.append(f"Basato su {base_neutralita.lower()}.")
+        if ha_piano_riduzione == "No":
+            doc_parts.append("Nessun piano di riduzione.")
+        if verifica_indipendente == "No":
+            doc_parts.append("Nessuna verifica indipendente.")
+    if report_pubblico == "No":
+        doc_parts.append("Il report non è pubblico.")
+    if uso_logo_verde == "Sì":
+        if logo_certificato == "No":
+            doc_parts.append("Logo verde non certificato.")
+        else:
+            doc_parts.append("Logo ambientale certificato presente.")
+
+    doc_test = " ".join(doc_parts)
+    return claim_test, doc_test #La funzione ritorna il "Claim inserito","Documentazione di supporto"
+
+#N.B. Il controllo semantico va fatto esclusivamente sul claim dichiarato dall'utente e non sul "Claim inserito" che è stato modificato dal programma.
+
+
+# === MODELLI ML (lavorano su matrici di embedding, una riga per claim) ===
+# Le funzioni che seguono ricevono il registro preso all'inizio della
+# richiesta: se nel frattempo viene attivato un bundle nuovo, la richiesta
+# finisce con i modelli con cui è partita.
+def _proietta(registro, nome, X):
+    # Applica la proiezione salvata col modello, se il training ne ha usata una
+    if not registro.ha(nome):
+        return X
+    with span(nome, elementi=len(X)):
+        return registro.get(nome).trasforma(X)
+
+
+def _esiti_documentali(registro, emb_claim, emb_support):
+    clf_doc = registro.get("clf_doc")
+    X = _proietta(registro, "proiezione_doc", np.hstack([emb_claim, emb_support]))
+    with span("clf_doc", elementi=len(X)):
+        proba = clf_doc.predict_proba(X) #un solo passaggio sulla foresta per classe e confidenza
+    idx = proba.argmax(axis=1)
+    return [_esito_documentale(pred, proba[riga, i])
+            for riga, (i, pred) in enumerate(zip(idx, clf_doc.classes_[idx]))]
+
+
+def _esito_documentale(pred, conf):
+    if pred == 0:
+        return ("✅ Conforme alla Direttiva UE",
+                "Claim conforme a standard noti e documentato.",
+                float(conf))
+    return ("🟠 Rischio di greenwashing",
+            "Claim potenzialmente vago, non verificabile o fuorviante.",
+            float(conf))
+
+
+def _categorie_semantiche(registro, emb):
+    semantic_clf_5class = registro.get("semantic_clf")
+    reverse_map = registro.get("label_map")
+    X = _proietta(registro, "proiezione_sem", emb)
+    with span("semantic_clf", elementi=len(X)):
+        proba = semantic_clf_5class.predict_proba(X)
+    idx = proba.argmax(axis=1)
+    return [_categoria_semantica(reverse_map, pred, proba[riga, i])
+            for riga, (i, pred) in enumerate(zip(idx, semantic_clf_5class.classes_[idx]))]
+
+
+def _categoria_semantica(reverse_map, pred, conf):
+    categoria = reverse_map[pred]
+    return categoria, SPIEGAZIONI[categoria], float(conf)
+
+
+def _primo_stadio(registro, nome, testi):
+    # Cascata: (classi, confidenze, sicuri) del modello TF-IDF "cascata_doc" /
+    # "cascata_sem"; solo le righe non sicure passano a BERT + RandomForest
+    if not registro.ha(nome) or not testi:
+        return None, None, np.zeros(len(testi), dtype=bool)
+    with span(nome, elementi=len(testi)):
+        return registro.get(nome).decidi(testi)
+
+
+def claim_simili(registro, nome_indice, X, k=K_SIMILI):
+    # Top-k claim etichettati più simili (indici knn_doc / knn_sem), se l'indice esiste
+    if not k or not registro.ha(nome_indice):
+        return [[] for _ in range(len(X))]
+    with span(nome_indice, elementi=len(X)):
+        simili = registro.get(nome_indice).cerca(X, k)
+    if nome_indice == "knn_sem":
+        reverse_map = registro.get("label_map")
+        for lista in simili:
+            for s in lista:
+                s["etichetta"] = reverse_map[s["etichetta"]]
+    return simili
+
+
+def valuta_claim_documentale(claim_input, support_input, con_simili=False): #funzione che sfrutta ML
+    registro = registro_modelli()
+    classi, conf, sicuri = _primo_stadio(registro, "cascata_doc", [testo_documentale(claim_input, support_input)])
+    if sicuri[0]:
+        esito = _esito_documentale(classi[0], conf[0])
+        return (esito, []) if con_simili else esito
+    emb = embed_batch([claim_input, support_input], model_id=registro.model_id) #claim e supporto in un solo forward
+    esito = _esiti_documentali(registro, emb[:1], emb[1:])[0]
+    if con_simili:
+        return esito, claim_simili(registro, "knn_doc", emb.reshape(1, -1))[0]
+    return esito
+
+
+def valuta_chiarezza_avanzata(claim_text, con_simili=False):
+    registro = registro_modelli()
+    classi, conf, sicuri = _primo_stadio(registro, "cascata_sem", [claim_text])
+    if sicuri[0]:
+        categoria, spiegazione, _ = _categoria_semantica(registro.get("label_map"), classi[0], conf[0])
+        return ((categoria, spiegazione), []) if con_simili else (categoria, spiegazione)
+    emb = embed_batch([claim_text], model_id=registro.model_id)
+    categoria, spiegazione, _ = _categorie_semantiche(registro, emb)[0]
+    if con_simili:
+        return (categoria, spiegazione), claim_simili(registro, "knn_sem", emb)[0]
+    return categoria, spiegazione
+
+
+# === CONTROLLO DOCUMENTALE (PRIMO LIVELLO) ===
+def controllo_documentale_regole(uso_logo_verde, logo_certificato, regole_scattate):
+    # Ritorna (esito, motivo, confidenza) se una regola decide, altrimenti None
+
+    # Logo sì ma non certificato → NON conforme
+    cond_logo_scelto = isinstance(uso_logo_verde, str) and uso_logo_verde.strip().lower().startswith("s")
+    cond_logo_non_cert = isinstance(logo_certificato, str) and logo_certificato.strip().lower().startswith("n")
+
+    if cond_logo_scelto and cond_logo_non_cert:
+        return ("🟠 Rischio di greenwashing",
+                "🔴 Hai dichiarato di usare un logo/marchio ambientale, ma NON è certificato da un ente riconosciuto.",
+                1.00)
+
+    # Controlli “riciclabile / carbon neutral / biodegradabile” senza certificazione
+    # specifica (tabella in regole.py): decide la prima regola che scatta
+    for regola in regole_scattate:
+        if regola["livello"] == "documentale":
+            return "🟠 Rischio di greenwashing", regola["motivo"], 1.00
+    return None
+
+
+# === CONTROLLI SEMANTICI SUCCESSIVI AL MODELLO ===
+def regola_bloccante(regole_scattate):
+    # Es. parole “nonsense”: la categoria è decisa senza interrogare il modello
+    for regola in regole_scattate:
+        if regola["livello"] == "semantico" and regola["blocca"]:
+            return regola
+    return None
+
+
+def extract_percentuali(text):
+    return [int(x) for x in re.findall(r"(\d{1,3})\s*%", text)]
+
+
+def controlli_semantici(form, claim_test, categoria_sem, motivazione_sem, conf_sem, regole_scattate):
+    percentuale = form["percentuale"]
+
+    # === 📌 CONTROLLO AVANZATO: Percentuali incoerenti ===
+    percentuali_claim = extract_percentuali(claim_test)
+    try:
+        percentuale_valore = int(re.sub(r"[^\d]", "", percentuale)) if percentuale else None
+    except:
+        percentuale_valore = None
+
+    if percentuali_claim and percentuale_valore is not None:
+        for pc in percentuali_claim:
+            if abs(pc - percentuale_valore) > 5:
+                categoria_sem = "Ingannevole"
+                motivazione_sem = "🔴 Percentuale dichiarata nel claim incoerente con quella indicata nel form."
+                conf_sem = 1.00
+
+    # === 📌 REGOLE SU PAROLE CHIAVE (riduzione senza confronto, eco/naturale senza prove, ...) ===
+    for regola in regole_scattate:
+        if regola["livello"] == "semantico":
+            categoria_sem = regola["categoria"]
+            motivazione_sem = regola["motivo"]
+            conf_sem = 1.00
+
+    # === 🔄 CONTROLLO: se base_neutralita = "Riduzioni dirette" ma ha_piano_riduzione = "No" ===
+    if (form["riguarda_carbon_neutral"] == "Sì" and
+        form["base_neutralita"] == "Riduzioni dirette" and
+        form["ha_piano_riduzione"] == "No"):
+        categoria_sem = "Ambiguo"
+        motivazione_sem = "🟡 Hai dichiarato un piano di riduzioni dirette, ma non hai un piano verificato: claim ambiguo."
+        conf_sem = 1.00
+
+    return categoria_sem, motivazione_sem, conf_sem
+
+
+# === VALUTAZIONE COMPLETA ===
+def _vero(valore):
+    if isinstance(valore, bool):
+        return valore
+    return str(valore).strip().lower() in ("sì", "si", "s", "true", "1", "yes")
+
+
+class FormNonValido(ValueError):
+    pass
+
+
+# Campi testuali del form: stringa (o assenti)
+CAMPI_TESTO = (
+    "affermazione", "parte_prodotto", "esistenza_report", "riguarda_carbon_neutral", "base_neutralita",
+    "ha_piano_riduzione", "verifica_indipendente", "report_pubblico", "uso_logo_verde", "logo_certificato",
+)
+
+
+def _valida_tipi(form):
+    # Un campo del tipo sbagliato farebbe fallire genera_claim_e_doc (e con
+    # lui tutto il batch): meglio rifiutare il form subito
+    for campo in CAMPI_TESTO:
+        valore = form.get(campo)
+        if valore is not None and not isinstance(valore, str):
+            raise FormNonValido(f"'{campo}' deve essere una stringa")
+    percentuale = form.get("percentuale")
+    if percentuale is not None and (isinstance(percentuale, bool) or not isinstance(percentuale, (str, int, float))):
+        raise FormNonValido("'percentuale' deve essere una stringa o un numero")
+    for campo in ("certificazioni", "evidenze"):
+        valori = form.get(campo)
+        if valori is not None and (not isinstance(valori, (list, tuple)) or not all(isinstance(v, str) for v in valori)):
+            raise FormNonValido(f"'{campo}' deve essere una lista di stringhe")
+
+
+def form_da_record(record):
+    # Converte un record esterno (riga CSV/JSONL, body JSON) nei campi del form:
+    # campi vuoti → default, certificazioni anche come stringa separata da ";".
+    # FormNonValido se un campo ha un tipo sbagliato.
+    form = {}
+    for campo in FORM_DEFAULTS:
+        valore = record.get(campo)
+        if valore is None or valore == "":
+            continue
+        form[campo] = valore
+    certificazioni = form.get("certificazioni", [])
+    if isinstance(certificazioni, str):
+        certificazioni = [c.strip() for c in certificazioni.replace(";", ",").split(",") if c.strip()]
+    form["certificazioni"] = certificazioni
+    _valida_tipi(form)
+    form["certificazioni"] = list(certificazioni)
+    form["prove_caricate"] = _vero(form.get("prove_caricate", False))
+    return form
+
+
+def normalizza_form(form):
+    form = {**FORM_DEFAULTS, **{k: v for k, v in form.items() if v is not None}}
+    _valida_tipi(form)
+    form["percentuale"] = str(form["percentuale"]) if form["percentuale"] else ""
+    return form
+
+
+def valuta_batch(forms):
+    # Valuta una lista di form (dict con i campi di FORM_DEFAULTS) e ritorna,
+    # nello stesso ordine, un dict di risultati per ciascuno.
+    # Gli embedding di tutti i claim che arrivano al modello ML sono calcolati
+    # insieme, in un'unica chiamata a embed_batch.
+    registro = registro_modelli()
+    with span("genera_claim_e_doc", elementi=len(forms)):
+        forms = [normalizza_form(f) for f in forms]
+        testi = [genera_claim_e_doc(
+            form["affermazione"], form["parte_prodotto"], form["percentuale"], form["certificazioni"],
+            form["esistenza_report"], form["riguarda_carbon_neutral"], form["base_neutralita"],
+            form["ha_piano_riduzione"], form["verifica_indipendente"], form["report_pubblico"],
+            form["uso_logo_verde"], form["logo_certificato"]
+        ) for form in forms]
+
+    # Tutte le regole su parole chiave, per tutto il batch, in una sola scansione
+    with span("regole", elementi=len(forms)):
+        regole = MOTORE.valuta([
+            {**form, "claim_test": claim_test, "doc_test": doc_test}
+            for form, (claim_test, doc_test) in zip(forms, testi)
+        ])
+
+    risultati = []
+    da_modello = []
+    for i, (form, (claim_test, doc_test)) in enumerate(zip(forms, testi)):
+        risultato = {
+            "claim_test": claim_test,
+            "doc_test": doc_test,
+            "esito_doc": None,
+            "motivo_doc": None,
+            "conf_doc": None,
+            "categoria_sem": None,
+            "motivazione_sem": None,
+            "conf_sem": None,
+            "regole": [{"id": r["id"], "motivo": r["motivo"]} for r in regole[i]],
+            "simili_doc": [],
+            "simili_sem": [],
+        }
+        esito_regole = controllo_documentale_regole(
+            form["uso_logo_verde"], form["logo_certificato"], regole[i]
+        )
+        if esito_regole is not None:
+            risultato["esito_doc"], risultato["motivo_doc"], risultato["conf_doc"] = esito_regole
+        else:
+            da_modello.append(i)
+        risultati.append(risultato)
+
+    if not da_modello:
+        return risultati
+
+    # Passa al modello documentale vero e proprio, sul claim scritto dall'azienda:
+    # prima il primo stadio TF-IDF, poi BERT+RF solo per i casi incerti
+    classi, conf, sicuri = _primo_stadio(registro, "cascata_doc", [
+        testo_documentale(forms[i]["affermazione"], risultati[i]["doc_test"]) for i in da_modello
+    ])
+    for k in np.flatnonzero(sicuri):
+        i = da_modello[k]
+        risultati[i]["esito_doc"], risultati[i]["motivo_doc"], risultati[i]["conf_doc"] = \
+            _esito_documentale(classi[k], conf[k])
+    incerti = [i for i, sicuro in zip(da_modello, sicuri) if not sicuro]
+
+    emb_claim = {}  # riga del batch → embedding del claim, riusato dall'analisi semantica
+    if incerti:
+        n = len(incerti)
+        with span("embedding", elementi=2 * n):
+            emb = embed_batch(
+                [forms[i]["affermazione"] for i in incerti] +
+                [risultati[i]["doc_test"] for i in incerti],
+                model_id=registro.model_id,
+            )
+        for i, esito in zip(incerti, _esiti_documentali(registro, emb[:n], emb[n:])):
+            risultati[i]["esito_doc"], risultati[i]["motivo_doc"], risultati[i]["conf_doc"] = esito
+        for i, simili in zip(incerti, claim_simili(registro, "knn_doc", np.hstack([emb[:n], emb[n:]]))):
+            risultati[i]["simili_doc"] = simili
+        emb_claim = dict(zip(incerti, emb[:n]))
+
+    # SOLO SE “Conforme” AL DOCUMENTO → PASSA ALL’ANALISI SEMANTICA
+    conformi = []
+    for i in da_modello:
+        risultato = risultati[i]
+        if "Conforme" not in risultato["esito_doc"]:
+            continue
+        # === ⛔ CONTROLLO AVANZATO: Parole “nonsense” (blocca il flusso) ===
+        bloccante = regola_bloccante(regole[i])
+        if bloccante is not None:
+            risultato["categoria_sem"] = bloccante["categoria"]
+            risultato["motivazione_sem"] = bloccante["motivo"]
+            risultato["conf_sem"] = 1.00
+        else:
+            conformi.append(i)
+
+    if conformi:
+        categorie = {}
+        classi, conf, sicuri = _primo_stadio(registro, "cascata_sem", [forms[i]["affermazione"] for i in conformi])
+        if sicuri.any():
+            reverse_map = registro.get("label_map")
+            for k in np.flatnonzero(sicuri):
+                categorie[conformi[k]] = _categoria_semantica(reverse_map, classi[k], conf[k])
+        incerti = [i for i, sicuro in zip(conformi, sicuri) if not sicuro]
+        if incerti:
+            # L'embedding del claim è già stato calcolato se la riga è passata dal modello documentale
+            mancanti = [i for i in incerti if i not in emb_claim]
+            if mancanti:
+                with span("embedding", elementi=len(mancanti)):
+                    emb_claim.update(zip(mancanti, embed_batch(
+                        [forms[i]["affermazione"] for i in mancanti], model_id=registro.model_id)))
+            emb_incerti = np.vstack([emb_claim[i] for i in incerti])
+            categorie.update(zip(incerti, _categorie_semantiche(registro, emb_incerti)))
+            for i, simili in zip(incerti, claim_simili(registro, "knn_sem", emb_incerti)):
+                risultati[i]["simili_sem"] = simili
+        with span("post_controlli", elementi=len(conformi)):
+            for i in conformi:
+                categoria, spiegazione, conf_sem = categorie[i]
+                risultato = risultati[i]
+                (risultato["categoria_sem"],
+                 risultato["motivazione_sem"],
+                 risultato["conf_sem"]) = controlli_semantici(
+                    forms[i], risultato["claim_test"], categoria, spiegazione, conf_sem, regole[i]
+                )
+    return risultati
+
+
+def valuta_claim(form):
+    return valuta_batch([form])[0]
@@ -0,0 +1,169 @@
+import argparse
+import io
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from forest_engine import FlatForest
+
+# === PROIEZIONE DELLE FEATURE (OPZIONALE) ===
+# Riduce gli embedding BERT (768 semantico, 1536 documentale) a poche
+# decine/centinaia di dimensioni prima delle RandomForest: modelli joblib più
+# piccoli e foreste più veloci da valutare quando i dataset crescono.
+# La proiezione è adattata dai training script e salvata accanto al modello
+# (proiezione_doc2.joblib, proiezione_sem2.joblib); la pipeline la applica da
+# sola all'inferenza. Le feature proiettate sono arrotondate a float16 sia in
+# training sia in inferenza, così le soglie degli alberi vedono gli stessi valori.
+#
+# GREEN_CLAIMS_PROIEZIONE: "nessuna" (default), "pca" o "random"
+# GREEN_CLAIMS_PROIEZIONE_DIM: dimensione di arrivo (default 128)
+
+METODI = ("nessuna", "pca", "random")
+METODO = os.environ.get("GREEN_CLAIMS_PROIEZIONE", "nessuna")
+DIM = int(os.environ.get("GREEN_CLAIMS_PROIEZIONE_DIM", "128"))
+
+PATH_DOC = "proiezione_doc2.joblib"
+PATH_SEM = "proiezione_sem2.joblib"
+
+
+class Proiezione:
+    def __init__(self, metodo, media, componenti, dtype="float16"):
+        self.metodo = metodo
+        self.media = media
+        self.componenti = componenti  # (dim_uscita, dim_ingresso)
+        self.dtype = dtype
+
+    @property
+    def dim_ingresso(self):
+        return self.componenti.shape[1]
+
+    @property
+    def dim_uscita(self):
+        return self.componenti.shape[0]
+
+    @classmethod
+    def adatta(cls, X, metodo=METODO, dim=DIM, seed=42):
+        if metodo not in METODI[1:]:
+            raise ValueError(f"Metodo di proiezione non supportato: {metodo!r} (disponibili: {', '.join(METODI[1:])})")
+        X = np.asarray(X, dtype=np.float32)
+        if metodo == "pca":
+            # Con pochi esempi le componenti utili sono al massimo n - 1
+            pca = PCA(n_components=min(dim, X.shape[0] - 1, X.shape[1]), random_state=seed).fit(X)
+            return cls(metodo, pca.mean_.astype(np.float32), pca.components_.astype(np.float32))
+        # Random projection gaussiana: non dipende dai dati, solo dal seed
+        rng = np.random.default_rng(seed)
+        componenti = rng.normal(0, 1 / np.sqrt(dim), (dim, X.shape[1])).astype(np.float32)
+        return cls(metodo, np.zeros(X.shape[1], dtype=np.float32), componenti)
+
+    def trasforma(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        return ((X - self.media) @ self.componenti.T).astype(self.dtype).astype(np.float32)
+
+
+def salva_proiezione(proiezione, path):
+    # Senza proiezione il file viene rimosso, così l'inferenza non applica
+    # quella di un training precedente
+    if proiezione is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    joblib.dump(proiezione, path)
+
+
+def adatta_se_richiesta(X, path, metodo=METODO, dim=DIM):
+    # Usato dai training script: ritorna le feature da dare alla foresta
+    if metodo == "nessuna":
+        salva_proiezione(None, path)
+        return X
+    proiezione = Proiezione.adatta(X, metodo, dim)
+    salva_proiezione(proiezione, path)
+    print(f"Proiezione {metodo}: {proiezione.dim_ingresso} → {proiezione.dim_uscita} feature, salvata in '{path}'")
+    return proiezione.trasforma(X)
+
+
+def carica_proiezione(path):
+    return joblib.load(path) if os.path.exists(path) else None
+
+
+# === CONFRONTO ACCURATEZZA / LATENZA / DIMENSIONE ===
+def _dimensione_joblib(oggetto):
+    buffer = io.BytesIO()
+    joblib.dump(oggetto, buffer)
+    return buffer.tell()
+
+
+def _latenza_ms(foresta, X, ripetizioni=200):
+    # Latenza di una singola riga sulla foresta compilata (come in pipeline)
+    tempi = []
+    for i in range(ripetizioni):
+        riga = X[i % len(X)][None, :]
+        inizio = time.perf_counter()
+        foresta.predict_proba(riga)
+        tempi.append(time.perf_counter() - inizio)
+    return float(np.median(tempi) * 1000)
+
+
+def confronta(X, y, configurazioni, n_estimators=100, seed=42):
+    X_train, X_test, y_train, y_test = train_test_split(
+        np.asarray(X, dtype=np.float32), np.asarray(y), test_size=0.25, random_state=seed, stratify=y)
+    risultati = []
+    for metodo, dim in configurazioni:
+        proiezione = None if metodo == "nessuna" else Proiezione.adatta(X_train, metodo, dim, seed)
+        A = X_train if proiezione is None else proiezione.trasforma(X_train)
+        B = X_test if proiezione is None else proiezione.trasforma(X_test)
+        inizio = time.perf_counter()
+        foresta = RandomForestClassifier(n_estimators=n_estimators, random_state=seed).fit(A, y_train)
+        secondi_training = time.perf_counter() - inizio
+        risultati.append({
+            "metodo": metodo,
+            "dim": A.shape[1],
+            "accuratezza": float((foresta.predict(B) == y_test).mean()),
+            "latenza_ms": _latenza_ms(FlatForest.da_sklearn(foresta), B),
+            "byte_modello": _dimensione_joblib(foresta) + (_dimensione_joblib(proiezione) if proiezione else 0),
+            "secondi_training": secondi_training,
+        })
+    return risultati
+
+
+def _feature_dataset(nome):
+    # Feature già calcolate dai training script (feature store) ed etichette dai CSV
+    from feature_store import carica_feature
+    if nome == "doc":
+        y = pd.read_csv("green_claims_training_dataset_doc2.csv")["Label"].values
+        return carica_feature("doc2"), y
+    label_map = {"Valido": 0, "Ambiguo": 1, "Ingannevole": 2, "Irrilevante": 3, "Marketing": 4}
+    df = pd.read_csv("green_claims_semantic_dataset_extended.csv", encoding="ISO-8859-1")
+    return carica_feature("semantic_extended"), df["categoria"].map(label_map).values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronta accuratezza, latenza e dimensione dei modelli con e senza proiezione")
+    parser.add_argument("--dataset", choices=["doc", "sem"], nargs="+", default=["doc", "sem"])
+    parser.add_argument("--metodi", choices=METODI[1:], nargs="+", default=["pca", "random"])
+    parser.add_argument("--dim", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("-o", "--output", help="salva il report in JSON")
+    args = parser.parse_args()
+
+    configurazioni = [("nessuna", None)] + [(m, d) for m in args.metodi for d in args.dim]
+    report = {}
+    for nome in args.dataset:
+        X, y = _feature_dataset(nome)
+        report[nome] = confronta(X, y, configurazioni)
+        print(f"\n{nome} ({X.shape[0]} righe, {X.shape[1]} feature)")
+        print(f"{'metodo':<8} {'dim':>5} {'accuratezza':>11} {'latenza_ms':>10} {'KB modello':>10}")
+        for r in report[nome]:
+            print(f"{r['metodo']:<8} {r['dim']:>5} {r['accuratezza']:>11.3f} {r['latenza_ms']:>10.3f} {r['byte_modello'] / 1024:>10.0f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# === TABELLA DELLE REGOLE SU PAROLE CHIAVE E CERTIFICAZIONI ===
+# Ogni regola scatta quando uno dei `termini` compare (come sottostringa, su
+# testo minuscolo) nel `campo` indicato e:
+#   - se c'è `richiede`: nessuno dei termini richiesti compare in `campo_richiesto`
+#     (un campo o una lista di campi)
+#   - se `richiede_prove` è True: non sono state caricate prove (PDF)
+# Campi disponibili: "affermazione" (claim scritto dall'azienda), "claim_test",
+# "doc_test" (testi generati dal form), "certificazioni" (certificazioni scelte),
+# "evidenze" (passaggi più rilevanti del PDF caricato, vedi evidenze_pdf.py).
+#
+# livello "documentale" → l'esito documentale diventa "Rischio di greenwashing"
+#                          (vale la prima regola che scatta, in ordine di tabella)
+# livello "semantico"   → sovrascrive la categoria del modello semantico
+#                          (vale l'ultima regola che scatta); con `blocca` la
+#                          categoria è definitiva e il modello non viene chiamato
+# `attiva: False` tiene la regola in tabella senza applicarla.
+#
+# Aggiungere una regola non aggiunge una scansione: tutti i termini della
+# tabella sono cercati insieme da rule_engine.MotoreRegole.
+
+# Certificazioni selezionabili nel form (app3.py), usate anche dai generatori
+# di dati sintetici e dai benchmark
+CERTIFICAZIONI = [
+    "ISO 14001", "ISO 14024", "ISO 14040", "ISO 14064", "ISO 14021",
+    "FSC", "Ecolabel", "EMAS", "PAS 2060", "EN 13432", "ASTM D6400", "GHG Protocol"
+]
+
+PAROLE_NONSENSE = [
+    "magico", "volante", "incantato", "miracolo",
+    "eco love", "super green", "mistico", "futuro perfetto"
+]
+
+REGOLE = [
+    # === CONTROLLO DOCUMENTALE: claim senza certificazione specifica ===
+    {
+        "id": "riciclabile_senza_iso_14021",
+        "livello": "documentale",
+        "campo": "claim_test",
+        "termini": ["riciclabile"],
+        "richiede": ["iso 14021"],
+        "campo_richiesto": ["doc_test", "evidenze"],
+        "motivo": "🔴 Claim ‘riciclabile’ senza certificazione ISO 14021 nel supporto.",
+    },
+    {
+        "id": "carbon_neutral_senza_iso_14064_pas_2060",
+        "livello": "documentale",
+        "campo": "claim_test",
+        "termini": ["carbon neutral"],
+        "richiede": ["iso 14064", "pas 2060"],
+        "campo_richiesto": ["doc_test", "evidenze"],
+        "motivo": "🔴 Claim ‘carbon neutral’ senza certificazione ISO 14064 o PAS 2060 nel supporto.",
+    },
+    {
+        "id": "biodegradabile_senza_en_13432",
+        "livello": "documentale",
+        "campo": "claim_test",
+        "termini": ["biodegradabile"],
+        "richiede": ["en 13432"],
+        "campo_richiesto": ["doc_test", "evidenze"],
+        "motivo": "🔴 Claim ‘biodegradabile’ senza certificazione EN 13432 nel supporto.",
+    },
+
+    # === CONTROLLO SEMANTICO ===
+    {
+        "id": "parole_nonsense",
+        "livello": "semantico",
+        "campo": "claim_test",
+        "termini": PAROLE_NONSENSE,
+        "categoria": "Ingannevole",
+        "blocca": True,
+        "motivo": "🔴 Claim contiene parole prive di senso ambientale ('nonsense'), classificato come ingannevole.",
+    },
+    {
+        "id": "riduzione_senza_confronto",
+        "livello": "semantico",
+        "campo": "affermazione",
+        "termini": ["riduzione", "ridotte", "abbattimento"],
+        "richiede": ["rispetto a", "baseline", "modello", "anno", "comparato"],
+        "campo_richiesto": "affermazione",
+        "categoria": "Ingannevole",
+        "motivo": "🔴 Claim sulla riduzione privo di riferimento comparativo, classificato come ingannevole.",
+    },
+    {
+        "id": "eco_naturale_senza_prove",
+        "livello": "semantico",
+        "campo": "affermazione",
+        "termini": ["eco", "ecologico", "naturale"],
+        "richiede_prove": True,
+        "categoria": "Ingannevole",
+        "motivo": "🔴 Claim con riferimenti a 'ecologico' o 'naturale' privo di prove scientifiche caricate.",
+    },
+
+    # === COERENZA CLAIM–CERTIFICAZIONI (ex certificazioni_richieste, non attive) ===
+    {
+        "id": "ecologico_senza_certificazioni",
+        "livello": "semantico",
+        "campo": "claim_test",
+        "termini": ["ecologico"],
+        "richiede": ["ecolabel", "iso 14024", "emas"],
+        "campo_richiesto": "certificazioni",
+        "categoria": "Ingannevole",
+        "motivo": "🔴 Claim 'ecologico' senza certificazioni coerenti: attese Ecolabel, ISO 14024, EMAS.",
+        "attiva": False,
+    },
+    {
+        "id": "carbon_senza_certificazioni",
+        "livello": "semantico",
+        "campo": "claim_test",
+        "termini": ["carbon"],
+        "richiede": ["iso 14064", "pas 2060"],
+        "campo_richiesto": "certificazioni",
+        "categoria": "Ingannevole",
+        "motivo": "🔴 Claim 'carbon' senza certificazioni coerenti: attese ISO 14064, PAS 2060.",
+        "attiva": False,
+    },
+    {
+        "id": "riciclabile_senza_certificazioni",
+        "livello": "semantico",
+        "campo": "claim_test",
+        "termini": ["riciclabile"],
+        "richiede": ["fsc", "iso 14021"],
+        "campo_richiesto": "certificazioni",
+        "categoria": "Ingannevole",
+        "motivo": "🔴 Claim 'riciclabile' senza certificazioni coerenti: attese FSC, ISO 14021.",
+        "attiva": False,
+    },
+    {
+        "id": "biodegradabile_senza_certificazioni",
+        "livello": "semantico",
+        "campo": "claim_test",
+        "termini": ["biodegradabile"],
+        "richiede": ["en 13432", "astm d6400"],
+        "campo_richiesto": "certificazioni",
+        "categoria": "Ingannevole",
+        "motivo": "🔴 Claim 'biodegradabile' senza certificazioni coerenti: attese EN 13432, ASTM D6400.",
+        "attiva": False,
+    },
+]
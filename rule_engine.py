@@ -0,0 +1,99 @@
+import re
+from bisect import bisect_right
+from collections import defaultdict
+
+from regole import REGOLE
+
+# === MOTORE DELLE REGOLE ===
+# Compila tutti i termini della tabella in regole.py in un'unica regex e
+# valuta un intero batch di claim con una sola scansione: i campi di tutte le
+# righe sono concatenati (separati da "\x00") e ogni occorrenza trovata viene
+# ricondotta alla sua riga e al suo campo. Il costo per claim dipende dal
+# numero di occorrenze, non dal numero di regole.
+
+_SEPARATORE = "\x00"
+
+
+class MotoreRegole:
+    def __init__(self, regole=REGOLE):
+        self.regole = [r for r in regole if r.get("attiva", True)]
+        # campo_richiesto può essere un campo o una lista di campi
+        self._campi_richiesti = []
+        for regola in self.regole:
+            richiesto = regola.get("campo_richiesto", regola["campo"])
+            self._campi_richiesti.append((richiesto,) if isinstance(richiesto, str) else tuple(richiesto))
+        self.campi = sorted({r["campo"] for r in self.regole} |
+                            {c for r, campi in zip(self.regole, self._campi_richiesti) if r.get("richiede") for c in campi})
+
+        # (campo, termine) → indici delle regole che fa scattare
+        self._trigger = defaultdict(list)
+        termini = set()
+        for i, regola in enumerate(self.regole):
+            for termine in regola["termini"]:
+                self._trigger[(regola["campo"], termine.lower())].append(i)
+                termini.add(termine.lower())
+            termini.update(t.lower() for t in regola.get("richiede", []))
+        self._richiesti = [frozenset(t.lower() for t in r.get("richiede", [])) for r in self.regole]
+
+        # Alternative dalla più lunga: in ogni posizione la regex riporta il
+        # termine più lungo che inizia lì; i termini più corti che iniziano
+        # nella stessa posizione sono i suoi prefissi, aggiunti da _prefissi.
+        # Il lookahead fa sì che vengano trovate anche occorrenze sovrapposte.
+        ordinati = sorted(termini, key=len, reverse=True)
+        self._regex = re.compile("(?=(" + "|".join(re.escape(t) for t in ordinati) + "))")
+        self._prefissi = {t: [p for p in ordinati if t.startswith(p)] for t in ordinati}
+
+    def _testo_campo(self, record, campo):
+        valore = record.get(campo) or ""
+        if isinstance(valore, (list, tuple)):
+            valore = "; ".join(valore)
+        return str(valore).lower().replace(_SEPARATORE, " ")
+
+    def _occorrenze(self, records):
+        # Per ogni riga: {campo: insieme dei termini presenti}
+        testi, inizi, segmenti = [], [], []
+        posizione = 0
+        for riga, record in enumerate(records):
+            for campo in self.campi:
+                testo = self._testo_campo(record, campo)
+                testi.append(testo)
+                inizi.append(posizione)
+                segmenti.append((riga, campo))
+                posizione += len(testo) + 1
+
+        trovati = [defaultdict(set) for _ in records]
+        for match in self._regex.finditer(_SEPARATORE.join(testi)):
+            riga, campo = segmenti[bisect_right(inizi, match.start()) - 1]
+            trovati[riga][campo].update(self._prefissi[match.group(1)])
+        return trovati
+
+    def valuta(self, records):
+        # records: lista di dict con i campi usati dalle regole (+ "prove_caricate").
+        # Ritorna per ogni record la lista di TUTTE le regole che scattano,
+        # in ordine di tabella: [{"id", "livello", "categoria", "motivo", "blocca"}, ...]
+        risultati = []
+        for record, presenti in zip(records, self._occorrenze(records)):
+            candidate = set()
+            for campo, termini in presenti.items():
+                for termine in termini:
+                    candidate.update(self._trigger.get((campo, termine), ()))
+
+            scattate = []
+            for i in sorted(candidate):
+                regola = self.regole[i]
+                if self._richiesti[i] and any(presenti[c] & self._richiesti[i] for c in self._campi_richiesti[i]):
+                    continue
+                if regola.get("richiede_prove") and record.get("prove_caricate"):
+                    continue
+                scattate.append({
+                    "id": regola["id"],
+                    "livello": regola["livello"],
+                    "categoria": regola.get("categoria"),
+                    "motivo": regola["motivo"],
+                    "blocca": regola.get("blocca", False),
+                })
+            risultati.append(scattate)
+        return risultati
+
+
+MOTORE = MotoreRegole()
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+from model_registry import avvia_sorveglianza, registro_modelli
+from pipeline import FormNonValido, form_da_record, valuta_batch
+from telemetria import TELEMETRIA
+
+# === SERVIZIO HTTP DI SCORING ===
+# Espone la pipeline di app3.py via HTTP (es. per il PIM). Le richieste
+# concorrenti vengono raccolte in micro-batch entro una piccola finestra di
+# attesa e valutate insieme: un solo forward BERT e una sola passata sulle
+# due RandomForest per batch, invece di una per richiesta.
+#
+#   python servizio.py --porta 8080 --max-batch 32 --max-attesa-ms 10
+#
+#   POST /valuta         body: un form JSON          → risultato
+#   POST /valuta/batch   body: lista di form JSON    → lista di risultati
+#   GET  /salute
+#   GET  /metriche       tempi per stadio in formato Prometheus (/metriche.json in JSON)
+
+MAX_BATCH = int(os.environ.get("GREEN_CLAIMS_MAX_BATCH", "32"))
+MAX_ATTESA_MS = float(os.environ.get("GREEN_CLAIMS_MAX_ATTESA_MS", "10"))
+MAX_CODA = int(os.environ.get("GREEN_CLAIMS_MAX_CODA", "1024"))
+
+
+class CodaPiena(Exception):
+    pass
+
+
+class ServizioInChiusura(Exception):
+    pass
+
+
+class MicroBatcher:
+    def __init__(self, funzione_batch, max_batch=MAX_BATCH, max_attesa_ms=MAX_ATTESA_MS, max_coda=MAX_CODA):
+        self.funzione_batch = funzione_batch
+        self.max_batch = max_batch
+        self.max_attesa = max_attesa_ms / 1000
+        self._coda = asyncio.Queue(maxsize=max_coda)
+        # Un solo worker: il modello usa già più thread per ogni forward
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._task = None
+        self._in_corso = []  # batch passato alla pipeline in questo momento
+
+    def avvia(self):
+        self._task = asyncio.get_running_loop().create_task(self._ciclo())
+
+    async def ferma(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # Nessuna richiesta resta in attesa per sempre: il batch in corso e
+        # quelle ancora in coda ricevono un errore
+        in_attesa = [fut for _, fut in self._in_corso]
+        while not self._coda.empty():
+            in_attesa.append(self._coda.get_nowait()[1])
+        for fut in in_attesa:
+            self._imposta(fut, errore=ServizioInChiusura())
+        self._executor.shutdown(wait=True)
+
+    async def sottometti(self, item):
+        return (await self.sottometti_tutti([item]))[0]
+
+    async def sottometti_tutti(self, items):
+        # Backpressure: se in coda non c'è posto per tutti gli elementi la
+        # richiesta viene rifiutata subito, prima di accodarne qualcuno
+        # (niente lavoro fatto per una risposta che sarà comunque un 503)
+        if self._coda.maxsize and len(items) > self._coda.maxsize - self._coda.qsize():
+            raise CodaPiena()
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in items]
+        for item, future in zip(items, futures):
+            self._coda.put_nowait((item, future))
+        return await asyncio.gather(*futures)
+
+    async def _raccogli(self):
+        # Attende il primo elemento, poi raccoglie gli altri fino a max_batch
+        # o fino alla scadenza della finestra di attesa
+        loop = asyncio.get_running_loop()
+        batch = [await self._coda.get()]
+        scadenza = loop.time() + self.max_attesa
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._coda.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            attesa = scadenza - loop.time()
+            if attesa <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._coda.get(), attesa))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _ciclo(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [(item, fut) for item, fut in await self._raccogli() if not fut.cancelled()]
+            if not batch:
+                continue
+            self._in_corso = batch
+            try:
+                risultati = await loop.run_in_executor(
+                    self._executor, self.funzione_batch, [item for item, _ in batch]
+                )
+            except Exception as e:
+                if len(batch) == 1:
+                    self._imposta(batch[0][1], errore=e)
+                    continue
+                # Un form che fa fallire il batch non deve far fallire gli
+                # altri: si rivaluta un elemento alla volta
+                for item, fut in batch:
+                    try:
+                        risultato = (await loop.run_in_executor(self._executor, self.funzione_batch, [item]))[0]
+                    except Exception as e_item:
+                        self._imposta(fut, errore=e_item)
+                    else:
+                        self._imposta(fut, risultato)
+            else:
+                for (_, fut), risultato in zip(batch, risultati):
+                    self._imposta(fut, risultato)
+            self._in_corso = []
+
+    @staticmethod
+    def _imposta(fut, risultato=None, errore=None):
+        if fut.done():
+            return
+        if errore is not None:
+            fut.set_exception(errore)
+        else:
+            fut.set_result(risultato)
+
+
+# === HANDLER HTTP ===
+async def _leggi_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Body JSON non valido")
+
+
+async def _valuta(request, forms):
+    batcher = request.app["batcher"]
+    try:
+        return await batcher.sottometti_tutti(forms)
+    except CodaPiena:
+        raise web.HTTPServiceUnavailable(text="Coda piena, riprova più tardi", headers={"Retry-After": "1"})
+    except ServizioInChiusura:
+        raise web.HTTPServiceUnavailable(text="Servizio in chiusura, riprova più tardi", headers={"Retry-After": "1"})
+
+
+async def valuta_handler(request):
+    body = await _leggi_json(request)
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Atteso un oggetto JSON con i campi del form")
+    try:
+        form = form_da_record(body)
+    except FormNonValido as e:
+        raise web.HTTPBadRequest(text=f"Form non valido: {e}")
+    risultati = await _valuta(request, [form])
+    return web.json_response(risultati[0])
+
+
+async def valuta_batch_handler(request):
+    body = await _leggi_json(request)
+    if not isinstance(body, list) or not all(isinstance(r, dict) for r in body):
+        raise web.HTTPBadRequest(text="Attesa una lista di oggetti JSON con i campi del form")
+    forms = []
+    for i, record in enumerate(body):
+        try:
+            forms.append(form_da_record(record))
+        except FormNonValido as e:
+            raise web.HTTPBadRequest(text=f"Form {i} non valido: {e}")
+    risultati = await _valuta(request, forms)
+    return web.json_response(risultati)
+
+
+async def salute_handler(request):
+    registro = registro_modelli()
+    return web.json_response({"stato": "ok", "bundle": registro.versione, "modelli": registro.metriche()})
+
+
+async def metriche_handler(request):
+    return web.Response(text=TELEMETRIA.esporta_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+async def metriche_json_handler(request):
+    return web.json_response(TELEMETRIA.esporta_json())
+
+
+def crea_app(funzione_batch=valuta_batch, max_batch=MAX_BATCH, max_attesa_ms=MAX_ATTESA_MS, max_coda=MAX_CODA):
+    # `funzione_batch` è iniettabile: nei test si può passare una pipeline finta
+    app = web.Application()
+
+    async def avvio(app):
+        app["batcher"] = MicroBatcher(funzione_batch, max_batch, max_attesa_ms, max_coda)
+        app["batcher"].avvia()
+
+    async def chiusura(app):
+        await app["batcher"].ferma()
+
+    app.on_startup.append(avvio)
+    app.on_cleanup.append(chiusura)
+    app.router.add_post("/valuta", valuta_handler)
+    app.router.add_post("/valuta/batch", valuta_batch_handler)
+    app.router.add_get("/salute", salute_handler)
+    app.router.add_get("/metriche", metriche_handler)
+    app.router.add_get("/metriche.json", metriche_json_handler)
+    return app
+
+
+@asynccontextmanager
+async def client_locale(app=None):
+    # Client in-process al posto di un client reale (es. il PIM) nei test:
+    #   async with client_locale(crea_app(finta_pipeline)) as client:
+    #       risposta = await client.post("/valuta", json={...})
+    from aiohttp.test_utils import TestClient, TestServer
+    async with TestClient(TestServer(app if app is not None else crea_app())) as client:
+        yield client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servizio HTTP di valutazione dei green claim")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--porta", type=int, default=8080)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-attesa-ms", type=float, default=MAX_ATTESA_MS)
+    parser.add_argument("--max-coda", type=int, default=MAX_CODA)
+    args = parser.parse_args()
+
+    # Modelli caricati prima di accettare richieste: niente picco sulla prima
+    registro_modelli().riscalda()
+    avvia_sorveglianza()  # i bundle pubblicati dopo l'avvio vengono attivati senza riavvio
+    app = crea_app(max_batch=args.max_batch, max_attesa_ms=args.max_attesa_ms, max_coda=args.max_coda)
+    web.run_app(app, host=args.host, port=args.porta)
+
+
+if __name__ == "__main__":
+    main()
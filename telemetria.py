@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# === TELEMETRIA PER STADIO ===
+# Span di tempo attorno a ogni stadio della pipeline (tokenizzazione, forward
+# dell'encoder, RandomForest, regole, ...), aggregati in istogrammi a bucket
+# fissi ed esportabili in formato Prometheus o JSON.
+# Ogni span costa un perf_counter, una bisect e un lock: si può lasciare
+# attivo in produzione (GREEN_CLAIMS_TELEMETRIA=0 per spegnerlo).
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ATTIVA = os.environ.get("GREEN_CLAIMS_TELEMETRIA", "1") != "0"
+
+
+class _Istogramma:
+    __slots__ = ("conteggi", "somma", "n", "elementi")
+
+    def __init__(self, n_bucket):
+        self.conteggi = [0] * (n_bucket + 1)  # l'ultimo è il bucket +Inf
+        self.somma = 0.0
+        self.n = 0
+        self.elementi = 0
+
+
+class Telemetria:
+    def __init__(self, buckets=BUCKETS, attiva=ATTIVA):
+        self.buckets = tuple(buckets)
+        self.attiva = attiva
+        self._istogrammi = {}
+        self._lock = threading.Lock()
+
+    def osserva(self, stadio, secondi, elementi=1):
+        with self._lock:
+            ist = self._istogrammi.get(stadio)
+            if ist is None:
+                ist = self._istogrammi[stadio] = _Istogramma(len(self.buckets))
+            ist.conteggi[bisect_left(self.buckets, secondi)] += 1
+            ist.somma += secondi
+            ist.n += 1
+            ist.elementi += elementi
+
+    @contextmanager
+    def _span(self, stadio, elementi):
+        inizio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.osserva(stadio, time.perf_counter() - inizio, elementi)
+
+    def span(self, stadio, elementi=1):
+        # with TELEMETRIA.span("clf_doc", elementi=len(X)): ...
+        if not self.attiva:
+            return nullcontext()
+        return self._span(stadio, elementi)
+
+    def azzera(self):
+        with self._lock:
+            self._istogrammi.clear()
+
+    def _copia(self):
+        with self._lock:
+            return {
+                stadio: (list(ist.conteggi), ist.somma, ist.n, ist.elementi)
+                for stadio, ist in sorted(self._istogrammi.items())
+            }
+
+    def _quantile(self, conteggi, n, q):
+        # Stima dal limite superiore del bucket (come histogram_quantile di Prometheus, senza interpolare)
+        soglia = q * n
+        cumulato = 0
+        for limite, conteggio in zip(self.buckets + (float("inf"),), conteggi):
+            cumulato += conteggio
+            if cumulato >= soglia:
+                return limite
+        return float("inf")
+
+    def esporta_json(self):
+        risultato = {}
+        for stadio, (conteggi, somma, n, elementi) in self._copia().items():
+            risultato[stadio] = {
+                "chiamate": n,
+                "elementi": elementi,
+                "secondi_totali": somma,
+                "media_ms": somma / n * 1000 if n else None,
+                "p50_ms": self._quantile(conteggi, n, 0.50) * 1000,
+                "p99_ms": self._quantile(conteggi, n, 0.99) * 1000,
+                "bucket": {str(b): c for b, c in zip(self.buckets + ("+Inf",), conteggi)},
+            }
+        return risultato
+
+    def esporta_prometheus(self):
+        righe = [
+            "# HELP green_claims_stage_seconds Durata di ogni stadio della pipeline",
+            "# TYPE green_claims_stage_seconds histogram",
+        ]
+        elementi_righe = [
+            "# HELP green_claims_stage_items_total Elementi elaborati da ogni stadio",
+            "# TYPE green_claims_stage_items_total counter",
+        ]
+        for stadio, (conteggi, somma, n, elementi) in self._copia().items():
+            cumulato = 0
+            for limite, conteggio in zip(self.buckets, conteggi):
+                cumulato += conteggio
+                righe.append(f'green_claims_stage_seconds_bucket{{stage="{stadio}",le="{limite}"}} {cumulato}')
+            righe.append(f'green_claims_stage_seconds_bucket{{stage="{stadio}",le="+Inf"}} {n}')
+            righe.append(f'green_claims_stage_seconds_sum{{stage="{stadio}"}} {somma}')
+            righe.append(f'green_claims_stage_seconds_count{{stage="{stadio}"}} {n}')
+            elementi_righe.append(f'green_claims_stage_items_total{{stage="{stadio}"}} {elementi}')
+        return "\n".join(righe + elementi_righe) + "\n"
+
+
+TELEMETRIA = Telemetria()
+span = TELEMETRIA.span
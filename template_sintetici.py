@@ -0,0 +1,118 @@
+from regole import CERTIFICAZIONI
+
+# === TEMPLATE PER I DATI SINTETICI ===
+# Tabelle usate da genera_sintetici.py. Ogni template ha dei segnaposto
+# ({p}, {cert}, {oggetto}, ...) riempiti con i valori di SLOT; aggiungere un
+# template o un valore moltiplica le combinazioni senza toccare il generatore.
+#
+# TEMPLATE_DOC   → coppie Claim/Support con Label (0 conforme, 1 rischio),
+#                  stesse colonne di green_claims_training_dataset_doc2.csv
+# TEMPLATE_SEM   → claim con categoria e spiegazione, stesse colonne di
+#                  green_claims_semantic_dataset_extended.csv
+# I form sintetici usano le affermazioni di TEMPLATE_DOC.
+# I nomi in "prodotto" sono maschili, così gli aggettivi concordano sempre.
+
+# Stesse opzioni del form di app3.py
+PARTI = ["Tutto il prodotto", "Solo l'imballaggio", "Altra parte"]
+BASI_NEUTRALITA = ["Riduzioni dirette", "Compensazioni", "Entrambi"]
+SI_NO = ["Sì", "No"]
+
+SLOT = {
+    "p": [str(p) for p in range(5, 101)],
+    "p_eccessiva": [str(p) for p in range(101, 201, 5)],
+    "anno": [str(a) for a in range(2010, 2024)],
+    "oggetto": ["Packaging", "Imballaggio", "Confezione", "Bottiglia", "Flacone", "Vaschetta", "Sacchetto", "Etichetta"],
+    "prodotto": ["Prodotto", "Articolo", "Detersivo", "Shampoo", "Caffè", "Snack", "Zaino", "Sapone"],
+    "materiale": ["carta riciclata", "plastica riciclata", "alluminio riciclato", "vetro riciclato",
+                  "cartone riciclato", "PET riciclato", "fibre riciclate"],
+    "riferimento": ["al modello precedente", "alla media di settore", "al prodotto standard", "alla versione 2020"],
+    "slogan": ["super green", "amico del pianeta", "eco al 100%", "green per natura", "a impatto positivo",
+               "il più verde di sempre", "sostenibilità totale", "pensato per la Terra"],
+    "irrilevante": ["Senza glutine", "Privo di BPA", "Cruelty free", "Made in Italy", "Senza OGM",
+                    "Vegano", "Dermatologicamente testato", "Senza parabeni"],
+}
+
+TEMPLATE_DOC = [
+    {
+        "famiglia": "compostabile",
+        "testi": ["{oggetto} compostabile", "{prodotto} compostabile", "Il prodotto può essere compostato",
+                  "{oggetto} interamente compostabile", "{prodotto} compostabile al 100%"],
+        "certificazioni_valide": ["EN 13432", "ASTM D6400"],
+    },
+    {
+        "famiglia": "riciclato",
+        "testi": ["{oggetto} con il {p}% di {materiale}", "{oggetto} in {materiale} al {p}%",
+                  "{oggetto}: {p}% {materiale}"],
+        "certificazioni_valide": ["ISO 14021", "FSC"],
+    },
+    {
+        "famiglia": "riciclabile",
+        "testi": ["{oggetto} {p}% riciclabile", "{prodotto} riciclabile al {p}%", "{oggetto} riciclabile"],
+        "certificazioni_valide": ["ISO 14021"],
+    },
+    {
+        "famiglia": "carbon_neutral",
+        "testi": ["{prodotto} carbon neutral", "{prodotto} a impatto climatico zero", "Neutrale per il clima"],
+        "certificazioni_valide": ["PAS 2060", "ISO 14064"],
+    },
+    {
+        "famiglia": "emissioni",
+        "testi": ["Riduce le emissioni di CO2 del {p}% rispetto {riferimento}",
+                  "Emissioni ridotte del {p}% rispetto all'anno {anno}",
+                  "{prodotto} con il {p}% di emissioni in meno rispetto {riferimento}"],
+        "certificazioni_valide": ["ISO 14064", "GHG Protocol", "ISO 14040"],
+    },
+    {
+        "famiglia": "ecologico",
+        "testi": ["{prodotto} ecologico", "{prodotto} a basso impatto ambientale", "{oggetto} a ridotto impatto ambientale"],
+        "certificazioni_valide": ["Ecolabel", "ISO 14024"],
+    },
+    {
+        # Claim vaghi: a rischio qualunque sia il supporto
+        "famiglia": "generico",
+        "testi": ["{prodotto} 100% sostenibile", "{prodotto} green", "{prodotto} rispettoso dell'ambiente",
+                  "{prodotto} {slogan}"],
+        "certificazioni_valide": [],
+    },
+]
+
+# "tipo": "valida"    → {cert} è una certificazione valida per la famiglia del claim
+#         "sbagliata" → {cert} è una certificazione non pertinente
+#         "nessuna"   → nessuna certificazione
+SUPPORTI = [
+    {"testo": "certificato {cert}", "tipo": "valida"},
+    {"testo": "certificato {cert} e {cert2}", "tipo": "valida"},
+    {"testo": "report certificato {cert}", "tipo": "valida"},
+    {"testo": "supportato da report LCA e certificazione {cert}", "tipo": "valida"},
+    {"testo": "certificato {cert}", "tipo": "sbagliata"},
+    {"testo": "report interno con riferimento a {cert}", "tipo": "sbagliata"},
+    {"testo": "non certificato", "tipo": "nessuna"},
+    {"testo": "Nessuna prova di laboratorio", "tipo": "nessuna"},
+    {"testo": "Solo autodichiarazione aziendale", "tipo": "nessuna"},
+    {"testo": "certificato report ufficiale", "tipo": "nessuna"},
+]
+
+TEMPLATE_SEM = [
+    {"testo": "{oggetto} con il {p}% di {materiale}, certificazione {cert}", "certificazioni": ["FSC", "ISO 14021"],
+     "categoria": "Valido", "spiegazione": "Specifico e quantificato e supportato da certificazione."},
+    {"testo": "Riduce le emissioni di CO2 del {p}% rispetto {riferimento}",
+     "categoria": "Valido", "spiegazione": "Quantificato e verificabile con benchmark di confronto"},
+    {"testo": "{oggetto} compostabile, certificazione {cert}", "certificazioni": ["EN 13432", "ASTM D6400"],
+     "categoria": "Valido", "spiegazione": "Certificazione terza parte riconosciuta"},
+    {"testo": "{oggetto} con il {p}% di {materiale}",
+     "categoria": "Ambiguo", "spiegazione": "Specifico ma manca certificazione"},
+    {"testo": "{oggetto} in parte riciclabile",
+     "categoria": "Ambiguo", "spiegazione": "Claim da chiarire e dimostrare"},
+    {"testo": "{oggetto} con il {p_eccessiva}% di {materiale}",
+     "categoria": "Ingannevole", "spiegazione": "Valore della percentuale maggiore del 100%."},
+    {"testo": "Riduce le emissioni di CO2 del {p}%",
+     "categoria": "Ingannevole", "spiegazione": "Manca riferimento comparativo"},
+    {"testo": "{prodotto} 100% sostenibile",
+     "categoria": "Ingannevole", "spiegazione": "Troppo generico e non misurabile"},
+    {"testo": "{irrilevante}",
+     "categoria": "Irrilevante", "spiegazione": "Non ha relazione con la sostenibilità."},
+    {"testo": "{prodotto}: {irrilevante}",
+     "categoria": "Irrilevante", "spiegazione": "Non ha relazione con la sostenibilità."},
+    {"testo": "{prodotto} {slogan}",
+     "categoria": "Marketing", "spiegazione": "Slogan privo di significato"},
+]
@@ -0,0 +1,64 @@
+import json
+
+import batch_score
+
+# === TEST DELLO SCORING IN BATCH ===
+# La pipeline vera è sostituita da una finta: si verifica che righe con campi
+# del tipo sbagliato o PDF illeggibili non interrompano il run e che la
+# ripresa dal checkpoint non rielabori le righe già scritte.
+#
+#   python -m pytest test_batch_score.py
+
+
+def _pipeline_finta(chiamate):
+    def valuta_batch(forms):
+        chiamate.append(len(forms))
+        return [{"affermazione": f["affermazione"], "prove_caricate": f["prove_caricate"]} for f in forms]
+    return valuta_batch
+
+
+def _scrivi_jsonl(path, righe):
+    with open(path, "w", encoding="utf-8") as f:
+        for riga in righe:
+            f.write(json.dumps(riga, ensure_ascii=False) + "\n")
+
+
+def _leggi_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_riga_non_valida_non_interrompe_il_run(tmp_path, monkeypatch):
+    chiamate = []
+    monkeypatch.setattr(batch_score, "valuta_batch", _pipeline_finta(chiamate))
+    ingresso, uscita = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _scrivi_jsonl(ingresso, [
+        {"id": "a", "affermazione": "Packaging riciclabile"},
+        {"id": "b", "affermazione": "Prodotto green", "certificazioni": 5},
+        {"id": "c", "affermazione": "Bottiglia compostabile", "pdf": str(tmp_path / "manca.pdf")},
+        {"id": "d", "affermazione": "x", "parte_prodotto": 5},
+    ])
+
+    assert batch_score.scora_file(str(ingresso), str(uscita), chunk_size=3) == 4
+    righe = _leggi_jsonl(uscita)
+    assert [r["id"] for r in righe] == ["a", "b", "c", "d"]
+    assert [r["riga"] for r in righe] == [0, 1, 2, 3]
+    assert righe[0]["affermazione"] == "Packaging riciclabile" and righe[0]["errore_form"] is None
+    assert "certificazioni" in righe[1]["errore_form"] and "affermazione" not in righe[1]
+    assert righe[2]["errore_form"] is None and righe[2]["errore_pdf"].startswith("FileNotFoundError")
+    assert righe[2]["prove_caricate"] is False
+    assert "parte_prodotto" in righe[3]["errore_form"]
+    # Il blocco con solo righe non valide non arriva alla pipeline
+    assert chiamate == [2]
+
+
+def test_ripresa_dal_checkpoint_csv(tmp_path, monkeypatch):
+    chiamate = []
+    monkeypatch.setattr(batch_score, "valuta_batch", _pipeline_finta(chiamate))
+    ingresso, uscita = tmp_path / "in.csv", tmp_path / "out.jsonl"
+    ingresso.write_text("id,affermazione\n" + "".join(f"{i},claim {i}\n" for i in range(10)), encoding="utf-8")
+    batch_score.scrivi_checkpoint(str(uscita), {"righe": 6, "offset": 0, "parti": 0})
+
+    assert batch_score.scora_file(str(ingresso), str(uscita), chunk_size=4) == 10
+    assert [r["id"] for r in _leggi_jsonl(uscita)] == ["6", "7", "8", "9"]
+    assert chiamate == [2, 2]
@@ -0,0 +1,82 @@
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+from forest_engine import FlatForest, carica_foresta
+
+# === TEST DI PARITÀ FLATFOREST / SKLEARN ===
+# FlatForest deve dare esattamente le stesse classi e probabilità di sklearn,
+# sia su una foresta piccola allenata qui sia sui due modelli del progetto.
+#
+#   python -m pytest test_forest_engine.py
+
+CARTELLA = os.path.dirname(os.path.abspath(__file__))
+MODELLI = ["document_clf2.joblib", "semantic_clf_5class2.joblib"]
+
+
+def _righe_sulle_soglie(forest, n, seed=0):
+    # Righe attorno alle soglie usate dagli alberi: ogni nodo è attraversato in
+    # entrambe le direzioni, anche con valori esattamente uguali alla soglia
+    rng = np.random.default_rng(seed)
+    soglie = np.concatenate([e.tree_.threshold[e.tree_.children_left != -1] for e in forest.estimators_])
+    X = rng.choice(soglie, size=(n, forest.n_features_in_))
+    X[n // 2:] += rng.normal(0, 1e-3, (n - n // 2, forest.n_features_in_))
+    return X
+
+
+def _assert_parita(flat, forest, X):
+    classi, proba = flat.valuta(X)
+    assert np.array_equal(classi, forest.predict(X))
+    assert np.array_equal(proba, forest.predict_proba(X))
+    assert np.array_equal(flat.predict(X), forest.predict(X))
+
+
+@pytest.fixture(scope="module")
+def foresta_piccola():
+    X, y = make_classification(n_samples=300, n_features=12, n_informative=6, n_classes=3, random_state=0)
+    forest = RandomForestClassifier(n_estimators=25, max_depth=None, random_state=0).fit(X, y)
+    return forest, X
+
+
+def test_parita_foresta_piccola(foresta_piccola):
+    forest, X = foresta_piccola
+    flat = FlatForest.da_sklearn(forest)
+    assert flat.n_features_in_ == forest.n_features_in_
+    _assert_parita(flat, forest, X)
+    _assert_parita(flat, forest, _righe_sulle_soglie(forest, 500))
+
+
+def test_carica_foresta_mappata_in_memoria(foresta_piccola, tmp_path):
+    forest, X = foresta_piccola
+    path = str(tmp_path / "foresta.joblib")
+    joblib.dump(forest, path)
+    # Primo caricamento: compila e salva accanto al joblib; secondo: legge gli .npy
+    for _ in range(2):
+        flat = carica_foresta(path, mmap_mode="r")
+        assert isinstance(flat.left, np.memmap) and isinstance(flat.value, np.memmap)
+        _assert_parita(flat, forest, X)
+    assert os.path.isdir(path + ".flat")
+
+    # Un joblib riallenato invalida la foresta compilata
+    altra = RandomForestClassifier(n_estimators=5, random_state=1).fit(X, X[:, 0] > 0)
+    joblib.dump(altra, path)
+    os.utime(path, ns=(0, os.stat(path + ".flat/meta.json").st_mtime_ns + 10**9))
+    _assert_parita(carica_foresta(path, mmap_mode="r"), altra, X)
+
+
+@pytest.mark.parametrize("nome", MODELLI)
+def test_parita_modelli_del_progetto(nome, tmp_path):
+    path = os.path.join(CARTELLA, nome)
+    if not os.path.exists(path):
+        pytest.skip(f"{nome} non presente")
+    forest = joblib.load(path)
+    X = _righe_sulle_soglie(forest, 1000)
+    _assert_parita(FlatForest.da_sklearn(forest), forest, X)
+    # Stessi output anche passando dai file compilati mappati in memoria
+    copia = str(tmp_path / nome)
+    joblib.dump(forest, copia)
+    _assert_parita(carica_foresta(copia, mmap_mode="r"), forest, X)
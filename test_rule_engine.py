@@ -0,0 +1,136 @@
+import random
+
+import pytest
+
+from regole import PAROLE_NONSENSE, REGOLE
+from rule_engine import MOTORE, MotoreRegole
+
+# === TEST DI PARITÀ MOTORE DELLE REGOLE / CONTROLLI ORIGINALI ===
+# MOTORE.valuta deve far scattare esattamente le regole che scattavano con i
+# controlli scritti a mano in pipeline.py prima della tabella in regole.py,
+# anche con lettere accentate, maiuscole e più certificazioni insieme.
+#
+#   python -m pytest test_rule_engine.py
+
+
+# Controlli originali di pipeline.py, riportati così com'erano
+def _documentale_originale(claim_test, doc_test):
+    claim_lower = claim_test.lower()
+    doc_lower = doc_test.lower()
+    scattate = []
+    if "riciclabile" in claim_lower and not ("iso 14021" in doc_lower):
+        scattate.append("riciclabile_senza_iso_14021")
+    if "carbon neutral" in claim_lower and not ("iso 14064" in doc_lower or "pas 2060" in doc_lower):
+        scattate.append("carbon_neutral_senza_iso_14064_pas_2060")
+    if "biodegradabile" in claim_lower and not "en 13432" in doc_lower:
+        scattate.append("biodegradabile_senza_en_13432")
+    return scattate
+
+
+def _semantico_originale(affermazione, claim_test, prove_caricate):
+    scattate = []
+    if any(term in claim_test.lower() for term in PAROLE_NONSENSE):
+        scattate.append("parole_nonsense")
+    if any(kw in affermazione.lower() for kw in ["riduzione", "ridotte", "abbattimento"]):
+        if not any(term in affermazione.lower() for term in ["rispetto a", "baseline", "modello", "anno", "comparato"]):
+            scattate.append("riduzione_senza_confronto")
+    if any(term in affermazione.lower() for term in ["eco", "ecologico", "naturale"]):
+        if not prove_caricate:
+            scattate.append("eco_naturale_senza_prove")
+    return scattate
+
+
+def _record(affermazione, certificazioni, prove_caricate=False):
+    # Stessi testi di genera_claim_e_doc per la parte che interessa alle regole
+    claim_test = affermazione + ":"
+    doc_test = ""
+    if certificazioni:
+        claim_test += " certificato " + ", ".join(certificazioni)
+        doc_test = "Certificato " + ", ".join(certificazioni) + "."
+    return {"affermazione": affermazione, "claim_test": claim_test, "doc_test": doc_test,
+            "certificazioni": certificazioni, "prove_caricate": prove_caricate}
+
+
+def _attese(record):
+    return (_documentale_originale(record["claim_test"], record["doc_test"]) +
+            _semantico_originale(record["affermazione"], record["claim_test"], record["prove_caricate"]))
+
+
+PEZZI = [
+    "Packaging", "riciclabile", "RICICLABILE", "Riciclabilè", "ricicl abile", "carbon neutral", "Carbon Neutral",
+    "CARBON  NEUTRAL", "carbon-neutral", "biodegradabile", "Biodegradabilé", "ecologico", "Ecologico", "ÉCO",
+    "eco", "economico", "naturale", "Naturale al 100%", "riduzione", "Riduzione del 30%", "ridotte",
+    "abbattimento", "rispetto a", "Rispetto A", "baseline", "modello", "anno", "comparato", "magico",
+    "Super Green", "eco love", "futuro perfetto", "Caffè", "È", "perché", "İ", "dell'imballaggio", "%",
+]
+CERTIFICAZIONI = [
+    "ISO 14001", "ISO 14024", "ISO 14040", "ISO 14064", "ISO 14021", "FSC", "Ecolabel", "EMAS",
+    "PAS 2060", "EN 13432", "ASTM D6400", "GHG Protocol", "iso 14021", "Iso 14064", "pas 2060",
+    "EN13432", "ISO 14021:2016", "İSO 14021",
+]
+
+CASI = [
+    ("Packaging riciclabile", ["ISO 14021"], False),
+    ("Packaging RICICLABILE", ["iso 14021"], False),
+    ("Packaging Riciclabile", ["FSC"], False),
+    ("Packaging riciclabile", ["İSO 14021"], False),
+    ("Prodotto Carbon Neutral", ["ISO 14001", "PAS 2060"], False),
+    ("Prodotto carbon neutral", ["ISO 14064", "PAS 2060", "EMAS"], False),
+    ("Prodotto CARBON NEUTRAL e biodegradabile", ["ISO 14064"], False),
+    ("Bottiglia riciclabile e biodegradabile", ["ISO 14021", "EN 13432"], False),
+    ("Bottiglia riciclabile e biodegradabile", ["EN 13432"], False),
+    ("Caffè ecologico è naturale", [], True),
+    ("Caffè ÉCOLOGICO", [], False),
+    ("Riduzione delle emissioni", [], False),
+    ("Emissioni RIDOTTE rispetto al modello 2020", [], False),
+    ("Abbattimento del 40% rispetto A un anno fa", [], False),
+    ("Prodotto magico e riciclabile", ["ISO 14021"], False),
+    ("Detersivo EcoLove", ["Ecolabel"], False),
+    ("Detersivo Eco Love", ["Ecolabel"], False),
+    ("", [], False),
+]
+
+
+def _ids(scattate):
+    return [r["id"] for r in scattate]
+
+
+@pytest.mark.parametrize("affermazione, certificazioni, prove", CASI)
+def test_casi_noti(affermazione, certificazioni, prove):
+    record = _record(affermazione, certificazioni, prove)
+    assert _ids(MOTORE.valuta([record])[0]) == _attese(record)
+
+
+def test_parita_su_record_casuali():
+    rng = random.Random(0)
+    records = []
+    for _ in range(3000):
+        affermazione = " ".join(rng.choices(PEZZI, k=rng.randint(1, 6)))
+        certificazioni = rng.sample(CERTIFICAZIONI, rng.randint(0, 4))
+        records.append(_record(affermazione, certificazioni, rng.random() < 0.3))
+    # Un solo batch: la concatenazione delle righe non deve far scattare regole tra righe vicine
+    for record, scattate in zip(records, MOTORE.valuta(records)):
+        assert _ids(scattate) == _attese(record), record
+
+
+def test_prima_regola_documentale_come_prima():
+    # Il controllo originale si fermava alla prima certificazione mancante
+    record = _record("Prodotto riciclabile, carbon neutral e biodegradabile", [])
+    scattate = MOTORE.valuta([record])[0]
+    assert [r["livello"] for r in scattate].index("documentale") == 0
+    assert scattate[0]["motivo"] == "🔴 Claim ‘riciclabile’ senza certificazione ISO 14021 nel supporto."
+
+
+def test_certificazione_nelle_evidenze_del_pdf():
+    record = _record("Packaging riciclabile", [])
+    assert _ids(MOTORE.valuta([record])[0]) == ["riciclabile_senza_iso_14021"]
+    record["evidenze"] = ["Imballaggio conforme alla norma ISO 14021 (pag. 31)"]
+    assert MOTORE.valuta([record])[0] == []
+
+
+def test_regole_non_attive_ignorate():
+    record = _record("Prodotto ecologico e riciclabile", ["ISO 14021"], True)
+    assert _ids(MOTORE.valuta([record])[0]) == []
+    # Le regole ex certificazioni_richieste restano in tabella ma non scattano
+    tutte = MotoreRegole([{**r, "attiva": True} for r in REGOLE])
+    assert _ids(tutte.valuta([record])[0]) == ["ecologico_senza_certificazioni"]
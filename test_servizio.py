@@ -0,0 +1,171 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from servizio import MicroBatcher, ServizioInChiusura, client_locale, crea_app
+
+# === TEST DEL SERVIZIO HTTP ===
+# La pipeline vera è sostituita da una finta: si verificano micro-batch,
+# backpressure e validazione dell'input senza caricare BERT.
+#
+#   python -m pytest test_servizio.py
+
+
+class PipelineFinta:
+    def __init__(self, blocca=False):
+        self.batch = []
+        self.valutate = []
+        self.iniziata = threading.Event()
+        self.sblocca = threading.Event()
+        if not blocca:
+            self.sblocca.set()
+
+    def __call__(self, forms):
+        self.batch.append(len(forms))
+        self.valutate += [f["affermazione"] for f in forms]
+        self.iniziata.set()
+        self.sblocca.wait(5)
+        if any(f["affermazione"] == "rompi" for f in forms):
+            raise RuntimeError("form rotto")
+        return [{"affermazione": f["affermazione"], "certificazioni": f["certificazioni"]} for f in forms]
+
+
+def _esegui(prova, funzione_batch, **opzioni):
+    async def corpo():
+        async with client_locale(crea_app(funzione_batch, **opzioni)) as client:
+            await prova(client)
+    asyncio.run(corpo())
+
+
+def test_richieste_concorrenti_in_un_solo_batch():
+    pipeline = PipelineFinta()
+
+    async def prova(client):
+        risposte = await asyncio.gather(*(client.post("/valuta", json={"affermazione": f"claim {i}"}) for i in range(5)))
+        assert [r.status for r in risposte] == [200] * 5
+        assert [(await r.json())["affermazione"] for r in risposte] == [f"claim {i}" for i in range(5)]
+
+    _esegui(prova, pipeline, max_batch=8, max_attesa_ms=200)
+    assert pipeline.batch == [5]
+
+
+def test_batch_mantiene_ordine_e_converte_certificazioni():
+    pipeline = PipelineFinta()
+
+    async def prova(client):
+        risposta = await client.post("/valuta/batch", json=[
+            {"affermazione": "a", "certificazioni": "FSC; ISO 14021"},
+            {"affermazione": "b"},
+        ])
+        assert risposta.status == 200
+        assert await risposta.json() == [
+            {"affermazione": "a", "certificazioni": ["FSC", "ISO 14021"]},
+            {"affermazione": "b", "certificazioni": []},
+        ]
+
+    _esegui(prova, pipeline, max_attesa_ms=50)
+
+
+def test_coda_piena_risponde_503():
+    pipeline = PipelineFinta(blocca=True)
+
+    async def prova(client):
+        prima = asyncio.ensure_future(client.post("/valuta", json={"affermazione": "1"}))
+        # La prima richiesta occupa il worker, la seconda riempie la coda
+        while not pipeline.iniziata.is_set():
+            await asyncio.sleep(0.01)
+        seconda = asyncio.ensure_future(client.post("/valuta", json={"affermazione": "2"}))
+        await asyncio.sleep(0.1)
+        terza = await client.post("/valuta", json={"affermazione": "3"})
+        assert terza.status == 503
+        assert terza.headers["Retry-After"] == "1"
+        pipeline.sblocca.set()
+        assert [r.status for r in await asyncio.gather(prima, seconda)] == [200, 200]
+
+    _esegui(prova, pipeline, max_batch=1, max_attesa_ms=0, max_coda=1)
+
+
+def test_batch_piu_grande_dello_spazio_in_coda_non_accoda_nulla():
+    pipeline = PipelineFinta(blocca=True)
+
+    async def prova(client):
+        prima = asyncio.ensure_future(client.post("/valuta", json={"affermazione": "1"}))
+        while not pipeline.iniziata.is_set():
+            await asyncio.sleep(0.01)
+        # Due posti liberi in coda, tre form: 503 senza valutarne nessuno
+        troppi = await client.post("/valuta/batch", json=[{"affermazione": f"t{i}"} for i in range(3)])
+        assert troppi.status == 503
+        giusti = asyncio.ensure_future(client.post("/valuta/batch", json=[{"affermazione": f"g{i}"} for i in range(2)]))
+        await asyncio.sleep(0.1)
+        pipeline.sblocca.set()
+        assert [r.status for r in await asyncio.gather(prima, giusti)] == [200, 200]
+
+    _esegui(prova, pipeline, max_batch=8, max_attesa_ms=0, max_coda=2)
+    assert sorted(pipeline.valutate) == ["1", "g0", "g1"]
+
+
+def test_ferma_chiude_le_richieste_in_attesa():
+    pipeline = PipelineFinta(blocca=True)
+
+    async def prova():
+        batcher = MicroBatcher(pipeline, max_batch=1, max_attesa_ms=0, max_coda=4)
+        batcher.avvia()
+        in_corso = asyncio.ensure_future(batcher.sottometti({"affermazione": "1"}))
+        while not pipeline.iniziata.is_set():
+            await asyncio.sleep(0.01)
+        in_coda = asyncio.ensure_future(batcher.sottometti_tutti([{"affermazione": "2"}, {"affermazione": "3"}]))
+        await asyncio.sleep(0.05)
+        pipeline.sblocca.set()
+        await batcher.ferma()
+        for richiesta in (in_corso, in_coda):
+            with pytest.raises(ServizioInChiusura):
+                await asyncio.wait_for(richiesta, 1)
+
+    asyncio.run(prova())
+
+
+@pytest.mark.parametrize("body", [
+    {"affermazione": "x", "parte_prodotto": 5},
+    {"affermazione": "x", "certificazioni": 5},
+    {"affermazione": "x", "certificazioni": [1, 2]},
+    {"affermazione": "x", "riguarda_carbon_neutral": "Sì", "base_neutralita": ["Compensazioni"]},
+    {"affermazione": "x", "percentuale": True},
+    ["non", "un", "oggetto"],
+])
+def test_form_non_valido_risponde_400(body):
+    pipeline = PipelineFinta()
+
+    async def prova(client):
+        risposta = await client.post("/valuta", json=body)
+        assert risposta.status == 400
+        risposta = await client.post("/valuta/batch", json=[{"affermazione": "ok"}, body])
+        assert risposta.status == 400
+
+    _esegui(prova, pipeline)
+    assert pipeline.batch == []
+
+
+def test_json_non_valido_risponde_400():
+    async def prova(client):
+        risposta = await client.post("/valuta", data=b"{non json", headers={"Content-Type": "application/json"})
+        assert risposta.status == 400
+
+    _esegui(prova, PipelineFinta())
+
+
+def test_un_form_rotto_non_fa_fallire_il_batch():
+    pipeline = PipelineFinta()
+
+    async def prova(client):
+        risposte = await asyncio.gather(*(
+            client.post("/valuta", json={"affermazione": a}) for a in ("buono 1", "rompi", "buono 2")
+        ))
+        assert [r.status for r in risposte] == [200, 500, 200]
+        assert (await risposte[2].json())["affermazione"] == "buono 2"
+
+    _esegui(prova, pipeline, max_batch=8, max_attesa_ms=200)
+    # Batch unico fallito, poi un elemento alla volta
+    assert pipeline.batch == [3, 1, 1, 1]
@@ -1,40 +1,69 @@
+import os
+
 import pandas as pd
 import numpy as np
-import torch
-from transformers import BertTokenizer, BertModel
 from sklearn.ensemble import RandomForestClassifier
 import joblib
 
-# 1. Carica e processa il CSV
-df = pd.read_csv("green_claims_training_dataset_doc2.csv")
+from bundle_modelli import pubblica_bundle
+from cascata import PATH_DOC as PATH_CASCATA_DOC
+from cascata import ModelloRapido, stampa_allenamento, testo_documentale
+from embedding import embed_batch
+from embedding_cache import get_cache
+from feature_store import aggiorna_feature
+from indice_knn import IndiceKNN
+from proiezione import PATH_DOC, adatta_se_richiesta
+
+# 1. Carica e processa il CSV (GREEN_CLAIMS_DATASET_DOC per allenare su un altro
+#    file con le stesse colonne, es. uno shard di genera_sintetici.py)
+DATASET = os.environ.get("GREEN_CLAIMS_DATASET_DOC", "green_claims_training_dataset_doc2.csv")
+NOME_FEATURE = "doc2" if "GREEN_CLAIMS_DATASET_DOC" not in os.environ else \
+    "doc2__" + os.path.splitext(os.path.basename(DATASET))[0]
+df = pd.read_csv(DATASET)
 
 # 2. Mappa Claim e Support nelle liste
 claims  = df["Claim"].tolist()
 support = df["Support"].tolist()
 labels  = df["Label"].values
 
-# 3. Carica BERT per gli embedding
-tokenizer = BertTokenizer.from_pretrained("dbmdz/bert-base-italian-uncased")
-model     = BertModel.from_pretrained("dbmdz/bert-base-italian-uncased")
-
-def get_embedding(text: str) -> np.ndarray:
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-    with torch.no_grad():
-        outputs = model(**inputs)
-    return outputs.last_hidden_state.mean(dim=1).squeeze().numpy()
+# 3. Embedding BERT in batch (claim e support in un'unica passata)
+def embedding_claim_support(righe):
+    n = len(righe)
+    emb = embed_batch([c for c, _ in righe] + [s for _, s in righe])
+    return np.hstack([emb[:n], emb[n:]])
 
 # 4. Costruisci X_doc (concatenazione embedding claim+support) e y_doc
-X_doc = []
-for c, s in zip(claims, support):
-    emb_c = get_embedding(c)
-    emb_s = get_embedding(s)
-    X_doc.append(np.concatenate([emb_c, emb_s]))
-
-X_doc = np.vstack(X_doc)  # shape = (numero_esempi, 1536)
+#    Solo le righe nuove o modificate passano da BERT, le altre sono già nel feature store
+X_doc = aggiorna_feature(NOME_FEATURE, list(zip(claims, support)), embedding_claim_support)  # shape = (numero_esempi, 1536)
 y_doc = labels             # shape = (numero_esempi,)
 
-# 5. Allena e salva il modello
+# 5. Proiezione opzionale (GREEN_CLAIMS_PROIEZIONE), allena e salva il modello
+X_clf = adatta_se_richiesta(X_doc, PATH_DOC)
 clf_doc = RandomForestClassifier(random_state=42, n_estimators=100)
-clf_doc.fit(X_doc, y_doc)
+clf_doc.fit(X_clf, y_doc)
 joblib.dump(clf_doc, "document_clf2.joblib")
 print("✅ Modello documentale salvato in 'document_clf2.joblib'")
+
+# 6. Indice dei claim etichettati per la ricerca dei più simili (e kNN di riserva)
+indice = IndiceKNN.costruisci(X_doc, y_doc, [f"{c} | {s}" for c, s in zip(claims, support)],
+                              meta={"dataset": DATASET})
+indice.salva("knn_documentale")
+print(f"✅ Indice kNN salvato in 'knn_documentale' ({indice.meta['n']} claim, {indice.meta['dtype']})")
+print(f"Cache embedding: {get_cache().stats()}")
+
+# 7. Primo stadio della cascata: TF-IDF su n-grammi di caratteri, soglia calibrata out-of-fold
+cascata_doc = ModelloRapido.allena([testo_documentale(c, s) for c, s in zip(claims, support)], y_doc)
+joblib.dump(cascata_doc, PATH_CASCATA_DOC)
+stampa_allenamento("documentale", cascata_doc)
+
+# 8. Bundle versionato con manifest (modello, proiezione, indice e cascata insieme)
+pubblica_bundle(
+    {
+        "clf_doc": "document_clf2.joblib",
+        "proiezione_doc": PATH_DOC if os.path.exists(PATH_DOC) else None,
+        "knn_doc": "knn_documentale",
+        "cascata_doc": PATH_CASCATA_DOC,
+    },
+    feature={"clf_doc": X_clf.shape[1]},
+    dim_encoder=X_doc.shape[1] // 2,
+)
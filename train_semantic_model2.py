@@ -1,13 +1,26 @@
+import os
+
 import pandas as pd
-import torch
 import numpy as np
-from transformers import AutoTokenizer, AutoModel
 from sklearn.ensemble import RandomForestClassifier
 import joblib
 
+from bundle_modelli import pubblica_bundle
+from cascata import PATH_SEM as PATH_CASCATA_SEM
+from cascata import ModelloRapido, stampa_allenamento
+from embedding import embed_batch
+from embedding_cache import get_cache
+from feature_store import aggiorna_feature
+from indice_knn import IndiceKNN
+from proiezione import PATH_SEM, adatta_se_richiesta
+
 # === Carica CSV con 5 classi di claim ===
 # df = pd.read_csv("green_claims_training_dataset2.csv", encoding="ISO-8859-1")
-df = pd.read_csv("green_claims_semantic_dataset_extended.csv", encoding="ISO-8859-1")
+# GREEN_CLAIMS_DATASET_SEM per allenare su un altro file con le stesse colonne (es. genera_sintetici.py)
+DATASET = os.environ.get("GREEN_CLAIMS_DATASET_SEM", "green_claims_semantic_dataset_extended.csv")
+NOME_FEATURE = "semantic_extended" if "GREEN_CLAIMS_DATASET_SEM" not in os.environ else \
+    "semantic__" + os.path.splitext(os.path.basename(DATASET))[0]
+df = pd.read_csv(DATASET, encoding="ISO-8859-1")
 
 
 label_map = {"Valido": 0, "Ambiguo": 1, "Ingannevole": 2, "Irrilevante": 3, "Marketing": 4}
@@ -21,25 +34,47 @@ if df["label"].isnull().any():
     print(df[df["label"].isnull()])
     exit()
 
-# === Carica modello BERT italiano ===
-tokenizer = AutoTokenizer.from_pretrained("dbmdz/bert-base-italian-uncased")
-model = AutoModel.from_pretrained("dbmdz/bert-base-italian-uncased")
-
-def get_embedding(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-    with torch.no_grad():
-        outputs = model(**inputs)
-    return outputs.last_hidden_state.mean(dim=1).squeeze().numpy()
-
-# === Estrai embedding e allena modello ===
-X = [get_embedding(c) for c in df["claim"]]
+# === Estrai embedding (in batch, solo righe nuove o modificate) e allena modello ===
+X = aggiorna_feature(
+    NOME_FEATURE,
+    [(c,) for c in df["claim"]],
+    lambda righe: embed_batch([c for (c,) in righe]),
+)
 y = df["label"].tolist()
 
+# Proiezione opzionale delle feature (GREEN_CLAIMS_PROIEZIONE)
+X_clf = adatta_se_richiesta(X, PATH_SEM)
 clf = RandomForestClassifier()
-clf.fit(X, y)
+clf.fit(X_clf, y)
 
 # === Salva il modello addestrato e la mappatura delle etichette ===
 joblib.dump(clf, "semantic_clf_5class2.joblib")
 joblib.dump(reverse_map, "label_map2.joblib")
 
 print("✅ Modello salvato con successo!")
+
+# === Indice dei claim etichettati per la ricerca dei più simili (e kNN di riserva) ===
+indice = IndiceKNN.costruisci(X, y, df["claim"].tolist(),
+                              meta={"dataset": DATASET})
+indice.salva("knn_semantico")
+print(f"✅ Indice kNN salvato in 'knn_semantico' ({indice.meta['n']} claim, {indice.meta['dtype']})")
+print(f"Cache embedding: {get_cache().stats()}")
+
+# === Primo stadio della cascata: TF-IDF su n-grammi di caratteri, soglia calibrata out-of-fold ===
+cascata_sem = ModelloRapido.allena(df["claim"].tolist(), y)
+joblib.dump(cascata_sem, PATH_CASCATA_SEM)
+stampa_allenamento("semantica", cascata_sem)
+
+# === Bundle versionato con manifest (modello, label map, proiezione, indice e cascata insieme) ===
+pubblica_bundle(
+    {
+        "semantic_clf": "semantic_clf_5class2.joblib",
+        "label_map": "label_map2.joblib",
+        "proiezione_sem": PATH_SEM if os.path.exists(PATH_SEM) else None,
+        "knn_sem": "knn_semantico",
+        "cascata_sem": PATH_CASCATA_SEM,
+    },
+    label_map=reverse_map,
+    feature={"semantic_clf": X_clf.shape[1]},
+    dim_encoder=X.shape[1],
+)